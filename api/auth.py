@@ -5,12 +5,11 @@ from datetime import datetime, timedelta
 import logging
 import base64
 
+from db import breaker
 from db.database import get_db_connection, get_or_create_user, update_user_last_active
 from models.schemas import UserCreate, User
 from models.messages import ERROR_MESSAGES, SUCCESS_MESSAGES
 
-# Настройка логирования
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -18,7 +17,7 @@ router = APIRouter()
 @router.post("/login")
 async def login(username: str = Form(...), response: Response = None):
     """Вход пользователя в систему по имени."""
-    logger.debug(f"Начало входа пользователя: {username}")
+    logger.debug("Начало входа пользователя: %s", username)
     if not username or username.strip() == "":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,17 +27,17 @@ async def login(username: str = Form(...), response: Response = None):
     # Получаем или создаем пользователя
     try:
         clean_username = username.strip()
-        logger.debug(f"Получаем или создаем пользователя: {clean_username}")
+        logger.debug("Получаем или создаем пользователя: %s", clean_username)
         user_id = get_or_create_user(clean_username)
-        logger.debug(f"Пользователь получен, ID: {user_id}")
+        logger.debug("Пользователь получен, ID: %s", user_id)
         
         # Обновляем время последней активности
-        logger.debug(f"Обновляем время последней активности для пользователя ID: {user_id}")
+        logger.debug("Обновляем время последней активности для пользователя ID: %s", user_id)
         update_user_last_active(user_id)
         
         # Кодируем имя пользователя в base64 для избежания проблем с кодировкой
         encoded_username = base64.b64encode(clean_username.encode('utf-8')).decode('ascii')
-        logger.debug(f"Закодированное имя пользователя: {encoded_username}")
+        logger.debug("Закодированное имя пользователя: %s", encoded_username)
         
         # Устанавливаем cookie
         logger.debug("Устанавливаем cookies для пользователя")
@@ -59,7 +58,7 @@ async def login(username: str = Form(...), response: Response = None):
         return {"status": "success", "userId": user_id, "username": clean_username}
         
     except Exception as e:
-        logger.error(f"Ошибка при входе пользователя: {str(e)}", exc_info=True)
+        logger.error("Ошибка при входе пользователя: %s", str(e), exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=ERROR_MESSAGES["general_error"]
@@ -91,8 +90,12 @@ async def get_current_user(
             # Если не удалось декодировать, используем как есть (для обратной совместимости)
             decoded_username = username
         
-        # Обновляем время последней активности
-        update_user_last_active(int(user_id))
+        # Обновляем время последней активности; недоступность базы не разлогинивает
+        try:
+            update_user_last_active(int(user_id))
+        except Exception as e:
+            if not breaker.is_outage(e):
+                raise
         
         return {
             "isLoggedIn": True,
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from starlette.responses import JSONResponse
+
+from core import startup
+
+router = APIRouter()
+
+@router.get("/live")
+async def live():
+    """Процесс жив и обслуживает цикл событий."""
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    """Процесс прогрет (core/startup.py): до конца прогрева - 503, балансировщику рано слать трафик."""
+    state = startup.status()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
@@ -1,20 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request, Response, Cookie, Form
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Response, Cookie, Form, Query
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List, Dict, Any
 import uuid
 import logging
 
-from db.database import (
-    get_db_connection, close_db_connection, get_or_create_user,
-    get_or_create_user_language, update_user_progress
-)
-from services.picker import select_words
+from db.database import get_or_create_user, get_or_create_user_language, update_user_progress
+from db import breaker
+from db.routing import read_only
+from core.responses import fast_response
+from services.picker import select_words, select_session_batch
 from services.onboarding import select_onboarding_words
 from services.session_evaluator import SessionEvaluator
-from models.schemas import WordSession, UserAnswer, AnswerResult, SessionComplete, SessionResult
+from services import answer_spool, degraded_picker, evaluation_queue
+from models.config import CONFIG
+from models.schemas import (
+    WordSession, SessionBatch, UserAnswer, AnswerResult, SessionComplete, SessionResult
+)
 from models.messages import ERROR_MESSAGES, SUCCESS_MESSAGES, RESULT_MESSAGES
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -40,20 +43,44 @@ async def start_session(
 
     try:
         user_id = int(user_id)
+        user_language_id = level = None
 
-        # Получаем или создаем связь пользователь-язык
-        user_language_id, level = get_or_create_user_language(user_id, target_language_id)
+        try:
+            # Получаем или создаем связь пользователь-язык
+            user_language_id, level = get_or_create_user_language(user_id, target_language_id)
 
-        # Сначала пробуем онбординг для новых пользователей
-        words = select_onboarding_words(
-            user_id, target_language_id, user_language_id, translation_language_id
-        )
+            # Подбор должен видеть уровень после оценки прошлых сессий из очереди
+            if evaluation_queue.ENABLED and await run_in_threadpool(evaluation_queue.settle, user_language_id):
+                user_language_id, level = await run_in_threadpool(
+                    get_or_create_user_language, user_id, target_language_id
+                )
+
+            # Подбор только читает - с реплики, если ученик не писал только что
+            with read_only(user_language_id):
+                # Сначала пробуем онбординг для новых пользователей
+                words = select_onboarding_words(
+                    user_id, target_language_id, user_language_id, translation_language_id
+                )
 
-        # Если пользователь не новый, используем основной подбор слов
-        if not words:
-            words = select_words(
-                user_id, target_language_id, user_language_id, level, translation_language_id
+                # Если пользователь не новый, используем основной подбор слов
+                if not words:
+                    words = select_words(
+                        user_id, target_language_id, user_language_id, level, translation_language_id
+                    )
+        except Exception as e:
+            if not breaker.is_outage(e):
+                raise
+            # База недоступна - сессия из словаря в памяти и последнего снимка прогресса
+            logger.warning("Database unavailable, serving degraded session: %s", e)
+            words = degraded_picker.select_words(
+                user_id, target_language_id, translation_language_id, user_language_id, level
             )
+            if not words:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=ERROR_MESSAGES["database_unavailable"],
+                    headers={"Retry-After": str(int(breaker.RESET_SECONDS))}
+                )
 
         if not words or len(words) == 0:
             raise HTTPException(
@@ -65,16 +92,98 @@ async def start_session(
         session_id = str(uuid.uuid4())
 
         # Сервисный метод для логирования
-        logger.info(f"Started session {session_id} for user {user_id}, level {level}")
+        logger.info("Started session %s for user %s, level %s", session_id, user_id, level)
 
-        return WordSession(
+        return fast_response(
+            WordSession,
             sessionId=session_id,
             words=words,
             totalWords=len(words)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error starting session: {e}")
+        logger.error("Error starting session: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=ERROR_MESSAGES["general_error"]
+        )
+
+def _compact_words(words: List[Dict[str, Any]]) -> List[list]:
+    """Слова сессии в компактном виде: [wordId, text, индекс правильного варианта, options]."""
+    return [
+        [word["wordId"], word["text"], word["options"].index(word["correctTranslation"]), word["options"]]
+        for word in words
+    ]
+
+@router.get("/session-batch", response_model=SessionBatch)
+async def session_batch(
+    user_id: Optional[str] = Cookie(None),
+    username: Optional[str] = Cookie(None),
+    count: int = Query(3, ge=1, le=CONFIG["SESSION_BATCH_MAX"]),
+    target_language_id: int = DEFAULT_TARGET_LANGUAGE_ID,
+    translation_language_id: int = DEFAULT_TRANSLATION_LANGUAGE_ID
+):
+    """
+    Выдаёт count сессий подряд для офлайн-режима. Слова не повторяются между
+    сессиями; ответы клиент отправляет после синхронизации через /submit-answer
+    и /finish-session с sessionId своей сессии.
+    """
+    if not user_id or not username:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=ERROR_MESSAGES["unauthorized"]
+        )
+
+    try:
+        user_id = int(user_id)
+
+        # Получаем или создаем связь пользователь-язык
+        user_language_id, level = get_or_create_user_language(user_id, target_language_id)
+
+        if evaluation_queue.ENABLED and await run_in_threadpool(evaluation_queue.settle, user_language_id):
+            user_language_id, level = await run_in_threadpool(
+                get_or_create_user_language, user_id, target_language_id
+            )
+
+        # Для новых пользователей первая сессия - онбординг, остальные подбираются без его слов
+        sessions = []
+        with read_only(user_language_id):
+            onboarding_words = select_onboarding_words(
+                user_id, target_language_id, user_language_id, translation_language_id
+            )
+            if onboarding_words:
+                sessions.append(onboarding_words)
+
+            if len(sessions) < count:
+                sessions.extend(select_session_batch(
+                    user_id, target_language_id, user_language_id, level, count - len(sessions),
+                    translation_language_id, exclude_ids=[word["wordId"] for word in onboarding_words or []]
+                ))
+
+        if not sessions:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=ERROR_MESSAGES["insufficient_words"]
+            )
+
+        batch = [
+            {"sessionId": str(uuid.uuid4()), "words": _compact_words(words)}
+            for words in sessions
+        ]
+        logger.info("Issued %s offline sessions for user %s, level %s", len(batch), user_id, level)
+
+        return fast_response(
+            SessionBatch,
+            sessions=batch,
+            totalSessions=len(batch)
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error issuing session batch: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=ERROR_MESSAGES["general_error"]
@@ -107,11 +216,17 @@ async def submit_answer(
         # Проверяем правильность ответа
         is_correct = answer.userAnswer == answer.correctTranslation
 
-        # Получаем связь пользователь-язык
-        user_language_id, level = get_or_create_user_language(user_id, target_language_id)
+        try:
+            # Получаем связь пользователь-язык
+            user_language_id, level = get_or_create_user_language(user_id, target_language_id)
 
-        # Обновляем прогресс
-        update_user_progress(user_language_id, answer.wordId, is_correct, answer.sessionId)
+            # Обновляем прогресс и пишем ответ в журнал (одной транзакцией)
+            update_user_progress(user_language_id, answer.wordId, is_correct, answer.sessionId)
+        except Exception as e:
+            if not answer_spool.accepts(e):
+                raise
+            # База недоступна - ответ дождётся её в очереди на диске
+            answer_spool.append_answer(user_id, target_language_id, answer.wordId, is_correct, answer.sessionId)
 
         # Формируем текст сообщения
         message = ""
@@ -120,13 +235,14 @@ async def submit_answer(
         else:
             message = RESULT_MESSAGES["wrong_answer"].format(answer.correctTranslation)
 
-        return AnswerResult(
+        return fast_response(
+            AnswerResult,
             isCorrect=is_correct,
             correctTranslation=answer.correctTranslation
         )
 
     except Exception as e:
-        logger.error(f"Error submitting answer: {e}")
+        logger.error("Error submitting answer: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=ERROR_MESSAGES["general_error"]
@@ -149,37 +265,35 @@ async def finish_session(
     try:
         user_id = int(user_id)
 
-        # Получаем связь пользователь-язык
-        user_language_id, level = get_or_create_user_language(user_id, target_language_id)
+        try:
+            # Получаем связь пользователь-язык
+            user_language_id, level = get_or_create_user_language(user_id, target_language_id)
 
-        # Оцениваем сессию и получаем информацию о patch-словах
-        increase_patch = evaluator.evaluate_session(user_id, user_language_id, level)
+            # Оценку выполнят потоки очереди; следующий start-session дождётся её результата
+            if evaluation_queue.ENABLED:
+                evaluation_queue.enqueue(user_id, user_language_id, session.sessionId)
+                return fast_response(SessionResult, status="queued")
+        except Exception as e:
+            if not answer_spool.accepts(e):
+                raise
+            # База недоступна - сессию оценят, когда очередь на диске дойдёт до базы
+            answer_spool.append_finish(user_id, target_language_id, session.sessionId)
+            return fast_response(SessionResult, status="queued")
 
-        # Получаем обновленный уровень пользователя
-        conn = get_db_connection()
-        new_level = level
-        try:
-            with conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT level FROM user_languages WHERE id = %s",
-                        (user_language_id,)
-                    )
-                    result = cur.fetchone()
-                    if result and result['level'] != level:
-                        new_level = result['level']
-        finally:
-            if conn:
-                close_db_connection(conn)
-
-        return SessionResult(
+        # Оцениваем сессию: оценка возвращает patch-слова и уровень после неё
+        increase_patch, new_level = await run_in_threadpool(
+            evaluator.evaluate_session, user_id, user_language_id
+        )
+
+        return fast_response(
+            SessionResult,
             status="completed",
             increasePatch=increase_patch,
-            newLevel=new_level if new_level != level else None
+            newLevel=new_level if new_level and new_level != level else None
         )
 
     except Exception as e:
-        logger.error(f"Error finishing session: {e}")
+        logger.error("Error finishing session: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=ERROR_MESSAGES["general_error"]
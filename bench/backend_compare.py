@@ -0,0 +1,91 @@
+"""
+Сравнение задержки сессии между бэкендами хранилища.
+
+В одном процессе, без HTTP, проходит полные сессии учеников из набора
+bench.dataset (подбор слов, ответы, оценка сессии) на каждом бэкенде по
+очереди и печатает p50/p95 по стадиям. Обе базы заполняются заранее:
+    python -m bench.dataset --reset
+    python -m bench.dataset --reset --backend sqlite --sqlite-path bench.db
+
+Запуск:
+    python -m bench.backend_compare --sessions 200 --sqlite-path bench.db
+"""
+import time
+import random
+import argparse
+import logging
+from typing import Dict, List
+
+from bench.dataset import TARGET_LANGUAGE_ID, TRANSLATION_LANGUAGE_ID, USERNAME_PREFIX
+from db import database
+from db.database import get_or_create_user, get_or_create_user_language, update_user_progress
+from services.picker import select_words
+from services.onboarding import select_onboarding_words
+from services.session_evaluator import SessionEvaluator
+
+STAGES = ["start-session", "answers", "finish-session", "total"]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_sessions(sessions: int, users: int, accuracy: float, seed: int) -> Dict[str, List[float]]:
+    """Проходит sessions сессий на текущем бэкенде, возвращает задержки стадий (мс)."""
+    random.seed(seed)
+    evaluator = SessionEvaluator()
+    timings = {stage: [] for stage in STAGES}
+
+    for num in range(sessions):
+        session_started = time.perf_counter()
+        user_id = get_or_create_user(f"{USERNAME_PREFIX}{random.randrange(users)}")
+        user_language_id, level = get_or_create_user_language(user_id, TARGET_LANGUAGE_ID)
+
+        started = time.perf_counter()
+        words = select_onboarding_words(user_id, TARGET_LANGUAGE_ID, user_language_id, TRANSLATION_LANGUAGE_ID)
+        if not words:
+            words = select_words(user_id, TARGET_LANGUAGE_ID, user_language_id, level, TRANSLATION_LANGUAGE_ID)
+        timings["start-session"].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        session_id = f"compare-{seed}-{num}"
+        for word in words:
+            is_correct = random.random() < accuracy
+            update_user_progress(user_language_id, word["wordId"], is_correct, session_id)
+        timings["answers"].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        evaluator.evaluate_session(user_id, user_language_id)
+        timings["finish-session"].append((time.perf_counter() - started) * 1000)
+
+        timings["total"].append((time.perf_counter() - session_started) * 1000)
+
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение задержки сессии между бэкендами хранилища")
+    parser.add_argument("--backends", default="postgres,sqlite", help="Бэкенды через запятую")
+    parser.add_argument("--sqlite-path", default="bench.db")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--users", type=int, default=200, help="Сколько учеников набора использовать")
+    parser.add_argument("--accuracy", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Подборщик пишет предупреждения о fallback-уровнях на каждой сессии - в отчёте они мешают
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'backend':<10}{'stage':<16}{'p50':>9}{'p95':>9}{'mean':>9}")
+    for backend in args.backends.split(","):
+        database.configure_backend(backend.strip(), args.sqlite_path)
+        timings = run_sessions(args.sessions, args.users, args.accuracy, args.seed)
+        for stage in STAGES:
+            values = timings[stage]
+            print(f"{backend:<10}{stage:<16}{_percentile(values, 50):>9.1f}"
+                  f"{_percentile(values, 95):>9.1f}{sum(values) / len(values):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Генератор синтетического набора данных для нагрузочных тестов и бенчмарков.
+
+Заполняет базу (параметры подключения берутся из db.database) языками,
+словами всех уровней, переводами на русский, пользователями и историей
+ответов, похожей на реальную: счётчики user_progress и журнал answer_events.
+
+Запуск:
+    python -m bench.dataset --users 200 --words-per-level 2000
+    python -m bench.dataset --backend sqlite --sqlite-path bench.db
+"""
+import os
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List
+from psycopg2.extras import execute_values
+
+from db import answer_events, database
+from db.database import get_db_connection, close_db_connection
+from db.migrations import apply_migrations
+from models.config import LEVEL_ORDER, LEVEL_TO_DIFFICULTY
+from models.schedule import next_review_at
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
+
+# Язык переводов и основной изучаемый язык, как в api/words.py
+TRANSLATION_LANGUAGE_ID = 2  # русский
+TARGET_LANGUAGE_ID = 3  # сербский
+
+# Базовые языки; дополнительные изучаемые языки получают id начиная с 4
+BASE_LANGUAGES = [
+    (1, "en", "English"),
+    (2, "ru", "Русский"),
+    (3, "sr", "Srpski"),
+]
+
+# Префикс имён пользователей набора - по нему load-генератор логинится
+USERNAME_PREFIX = "bench_user_"
+
+
+def apply_schema(conn) -> None:
+    """Создаёт таблицы набора данных, если их ещё нет, и применяет миграции."""
+    # SQLite-бэкенд создаёт базовую схему сам при первом соединении
+    if database.DB_BACKEND != "sqlite":
+        with open(SCHEMA_PATH, encoding="utf-8") as f:
+            ddl = f.read()
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(ddl)
+    apply_migrations()
+
+
+def reset_dataset(conn) -> None:
+    """Удаляет все данные из таблиц набора."""
+    with conn:
+        with conn.cursor() as cur:
+            if database.DB_BACKEND == "sqlite":
+                for table in ("answer_events", "user_progress", "user_languages", "users", "word_senses", "words",
+                              "languages"):
+                    cur.execute(f"DELETE FROM {table}")
+                return
+            cur.execute("""
+                TRUNCATE answer_events, user_progress, user_languages, users,
+                         word_senses, words, languages
+                RESTART IDENTITY CASCADE
+            """)
+
+
+def _insert_rows(cur, table: str, columns: str, rows: list, suffix: str = "") -> None:
+    """Пакетная вставка: execute_values для Postgres, executemany для SQLite."""
+    if database.DB_BACKEND == "sqlite":
+        placeholders = ", ".join(["%s"] * len(rows[0])) if rows else ""
+        cur.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) {suffix}", rows)
+    else:
+        execute_values(cur, f"INSERT INTO {table} ({columns}) VALUES %s {suffix}", rows, page_size=1000)
+
+
+def _seed_languages(cur, extra_languages: int) -> List[int]:
+    """Создаёт языки и возвращает id изучаемых языков."""
+    languages = list(BASE_LANGUAGES)
+    for i in range(extra_languages):
+        language_id = len(BASE_LANGUAGES) + 1 + i
+        languages.append((language_id, f"x{language_id}", f"Bench language {language_id}"))
+
+    _insert_rows(cur, "languages", "id, code, name", languages, "ON CONFLICT (id) DO NOTHING")
+    if database.DB_BACKEND == "postgres":
+        cur.execute("SELECT setval('languages_id_seq', (SELECT MAX(id) FROM languages))")
+
+    return [TARGET_LANGUAGE_ID] + [lang[0] for lang in languages[len(BASE_LANGUAGES):]]
+
+
+def _seed_words(cur, language_id: int, words_per_level: int) -> Dict[int, List[int]]:
+    """Создаёт слова всех уровней для языка и их переводы. Возвращает id слов по сложности."""
+    rows = []
+    for difficulty in LEVEL_TO_DIFFICULTY.values():
+        for i in range(words_per_level):
+            rank = (difficulty - 1) * words_per_level + i + 1
+            rows.append((f"w{language_id}_{difficulty}_{i}", language_id, difficulty, rank))
+
+    # Вставленные строки читаем обратно: SQLite не возвращает RETURNING из executemany
+    cur.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM words")
+    max_id = cur.fetchone()["max_id"]
+    _insert_rows(cur, "words", "text, language_id, difficulty, frequency_rank", rows)
+    cur.execute("SELECT id, difficulty, text FROM words WHERE id > %s ORDER BY id", (max_id,))
+    inserted = cur.fetchall()
+
+    words_by_difficulty = {}
+    senses = []
+    for row in inserted:
+        words_by_difficulty.setdefault(row["difficulty"], []).append(row["id"])
+        senses.append((row["id"], TRANSLATION_LANGUAGE_ID, f"перевод {row['text']}"))
+
+    _insert_rows(cur, "word_senses", "word_id, language_id, translation", senses)
+
+    return words_by_difficulty
+
+
+def _seed_users(cur, users: int, progress_per_user: int, target_language_id: int,
+                words_by_difficulty: Dict[int, List[int]]) -> None:
+    """Создаёт пользователей с уровнем и историей ответов на близких к уровню словах."""
+    now = datetime.now()
+
+    for user_num in range(users):
+        username = f"{USERNAME_PREFIX}{user_num}"
+        cur.execute("""
+            INSERT INTO users (username, base_language_id, created_at)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (username) DO UPDATE SET username = EXCLUDED.username
+            RETURNING id
+        """, (username, TRANSLATION_LANGUAGE_ID, now))
+        user_id = cur.fetchone()["id"]
+
+        level = random.choice(LEVEL_ORDER[:5])
+        cur.execute("""
+            INSERT INTO user_languages (user_id, target_language_id, level, is_active, started_at)
+            VALUES (%s, %s, %s, TRUE, %s)
+            RETURNING id
+        """, (user_id, target_language_id, level, now - timedelta(days=90)))
+        user_language_id = cur.fetchone()["id"]
+
+        # Большая часть истории на текущем уровне, остальное - на соседних
+        difficulty = LEVEL_TO_DIFFICULTY[level]
+        pool = list(words_by_difficulty.get(difficulty, []))
+        for neighbour in (difficulty - 1, difficulty + 1):
+            pool.extend(random.sample(
+                words_by_difficulty.get(neighbour, []),
+                min(progress_per_user // 5, len(words_by_difficulty.get(neighbour, [])))
+            ))
+        word_ids = random.sample(pool, min(progress_per_user, len(pool)))
+
+        rows = []
+        events = []
+        for word_id in word_ids:
+            repeats = random.randint(1, 12)
+            successes = random.randint(0, repeats)
+            last_seen = now - timedelta(minutes=random.randint(10, 60 * 24 * 60))
+            # Повторные ответы - не в одну секунду, иначе у журнала ответов нет порядка
+            first_seen = last_seen - timedelta(days=random.randint(0 if repeats == 1 else 1, 30))
+            last_answer_wrong = random.random() < 0.3
+            session_id = f"bench-{user_num}-{random.randint(0, 50)}"
+            rows.append((
+                user_language_id, word_id, repeats, successes, successes / repeats,
+                first_seen, last_seen, last_answer_wrong, session_id,
+                next_review_at(repeats, successes, last_answer_wrong, last_seen)
+            ))
+            events.extend(_answer_events(user_num, user_language_id, word_id, repeats, successes,
+                                         first_seen, last_seen, session_id))
+
+        if rows:
+            _insert_rows(cur, "user_progress", (
+                "user_language_id, word_id, repeats, successes, success_rate, "
+                "first_seen, last_seen, last_answer_wrong, session_id, next_review_at"
+            ), rows)
+            _insert_rows(cur, "answer_events", "user_language_id, word_id, session_id, is_correct, answered_at",
+                         events)
+
+
+def _answer_events(user_num: int, user_language_id: int, word_id: int, repeats: int, successes: int,
+                   first_seen: datetime, last_seen: datetime, session_id: str) -> list:
+    """Журнал ответов на слово, согласованный с его счётчиками: последний ответ - в last_seen."""
+    outcomes = [True] * successes + [False] * (repeats - successes)
+    random.shuffle(outcomes)
+    span = int((last_seen - first_seen).total_seconds())
+    moments = sorted(first_seen + timedelta(seconds=second) for second in random.sample(range(span), repeats - 1))
+    moments.append(last_seen)
+    sessions = [f"bench-{user_num}-{random.randint(0, 50)}" for _ in range(repeats - 1)] + [session_id]
+    return [
+        (user_language_id, word_id, session, is_correct, moment)
+        for session, is_correct, moment in zip(sessions, outcomes, moments)
+    ]
+
+
+def seed_dataset(users: int = 200, words_per_level: int = 2000, progress_per_user: int = 300,
+                 extra_languages: int = 0, reset: bool = False, seed: int = 42) -> None:
+    """Создаёт схему и заполняет базу синтетическими данными."""
+    random.seed(seed)
+    conn = get_db_connection()
+    try:
+        apply_schema(conn)
+        if reset:
+            reset_dataset(conn)
+
+        with conn:
+            with conn.cursor() as cur:
+                language_ids = _seed_languages(cur, extra_languages)
+
+                words_by_language = {}
+                for language_id in language_ids:
+                    words_by_language[language_id] = _seed_words(cur, language_id, words_per_level)
+                    logger.info("Seeded %s words for language %s", words_per_level * len(LEVEL_ORDER), language_id)
+
+                # Секции журнала ответов на всю историю набора (не старше 90 дней)
+                if database.DB_BACKEND == "postgres":
+                    now = datetime.now()
+                    answer_events.ensure_partitions(cur, now - timedelta(days=90), now)
+
+                _seed_users(
+                    cur, users, progress_per_user, TARGET_LANGUAGE_ID,
+                    words_by_language[TARGET_LANGUAGE_ID]
+                )
+                logger.info("Seeded %s users with up to %s progress rows each", users, progress_per_user)
+
+                cur.execute("ANALYZE")
+    finally:
+        close_db_connection(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заполняет базу данными для бенчмарков")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--words-per-level", type=int, default=2000)
+    parser.add_argument("--progress-per-user", type=int, default=300)
+    parser.add_argument("--extra-languages", type=int, default=0,
+                        help="Сколько дополнительных изучаемых языков создать")
+    parser.add_argument("--reset", action="store_true", help="Очистить таблицы перед заполнением")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=["postgres", "sqlite"], default=database.DB_BACKEND)
+    parser.add_argument("--sqlite-path", default=None, help="Файл базы для --backend sqlite")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    database.configure_backend(args.backend, args.sqlite_path)
+    seed_dataset(
+        users=args.users,
+        words_per_level=args.words_per_level,
+        progress_per_user=args.progress_per_user,
+        extra_languages=args.extra_languages,
+        reset=args.reset,
+        seed=args.seed,
+    )
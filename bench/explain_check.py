@@ -0,0 +1,337 @@
+"""
+Проверка планов запросов горячего пути на регрессии.
+
+Для каждого запроса из реестра db.queries выполняет EXPLAIN (ANALYZE, BUFFERS)
+на наборе данных из bench.dataset и отмечает:
+  - последовательное сканирование больших таблиц (seq_scan:<таблица>);
+  - сортировки, вышедшие на диск или обработавшие слишком много строк (sort:<ключ>);
+  - рост стоимости плана относительно сохранённого базового уровня.
+
+Новые отметки и рост стоимости считаются регрессией (код возврата 1).
+Каждый запрос выполняется в своей транзакции с откатом, поэтому изменяющие
+запросы не меняют данные. Базовый уровень (bench/plan_baseline.json) снят на наборе
+данных с параметрами bench.dataset по умолчанию после ANALYZE: на устаревшей статистике
+планы заметно расходятся, поэтому перед --update-baseline статистику нужно обновить.
+
+Запуск:
+    python -m bench.explain_check                    # сравнить с базовым уровнем
+    python -m bench.explain_check --update-baseline  # сохранить текущие планы как базовые
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from psycopg2.extras import RealDictCursor
+
+from db import queries
+from db.database import get_db_connection, close_db_connection
+from models.config import CONFIG, LEVEL_TO_DIFFICULTY
+from services.session_evaluator import REEVALUATION_SESSIONS, SESSION_EVENTS_WINDOW
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "plan_baseline.json")
+
+# Таблицы, последовательное сканирование которых считаем проблемой
+WATCHED_TABLES = {"user_progress", "words", "word_senses", "user_languages", "users"}
+
+# Сканирование меньшего числа строк не отмечаем - на маленьких таблицах это нормально
+SEQ_SCAN_MIN_ROWS = 1000
+
+# Сортировка большего числа строк или использующая диск отмечается
+SORT_MAX_ROWS = 5000
+
+# Допустимый рост стоимости плана относительно базового уровня
+COST_TOLERANCE = 0.5
+
+
+def build_sample_context(cur) -> Dict[str, Any]:
+    """Подбирает реальные значения параметров: пользователя с самой длинной историей и т.п."""
+    cur.execute("""
+        SELECT ul.id AS user_language_id, ul.user_id, ul.level, ul.target_language_id,
+               COUNT(up.id) AS progress
+        FROM user_languages ul
+        JOIN user_progress up ON up.user_language_id = ul.id
+        GROUP BY ul.id
+        ORDER BY progress DESC
+        LIMIT 1
+    """)
+    user = cur.fetchone()
+    if not user:
+        raise RuntimeError("Benchmark dataset is empty, run python -m bench.dataset first")
+
+    cur.execute("""
+        SELECT up.word_id, u.username
+        FROM user_progress up
+        JOIN user_languages ul ON ul.id = up.user_language_id
+        JOIN users u ON u.id = ul.user_id
+        WHERE up.user_language_id = %s
+        ORDER BY up.last_seen DESC
+        LIMIT 5
+    """, (user["user_language_id"],))
+    recent = cur.fetchall()
+
+    # Слово без прогресса у пользователя - для вставки новой записи
+    cur.execute("""
+        SELECT w.id FROM words w
+        WHERE w.language_id = %s
+        AND NOT EXISTS (
+            SELECT 1 FROM user_progress up
+            WHERE up.word_id = w.id AND up.user_language_id = %s
+        )
+        LIMIT 1
+    """, (user["target_language_id"], user["user_language_id"]))
+    unseen = cur.fetchone()
+
+    difficulty = LEVEL_TO_DIFFICULTY[user["level"]]
+    return {
+        "user_id": user["user_id"],
+        "username": recent[0]["username"],
+        "user_language_id": user["user_language_id"],
+        "target_language_id": user["target_language_id"],
+        "translation_language_id": 2,
+        "difficulty": difficulty,
+        "stretch_difficulty": min(difficulty + 1, 6),
+        "patch_difficulty": max(difficulty - 1, 1),
+        "word_id": recent[0]["word_id"],
+        "unseen_word_id": unseen["id"] if unseen else recent[0]["word_id"],
+        "exclude_ids": [row["word_id"] for row in recent],
+        "now": datetime.now(),
+    }
+
+
+def _ago(c: Dict[str, Any], days_key: str) -> datetime:
+    return c["now"] - timedelta(days=CONFIG[days_key])
+
+
+# Имя запроса -> построитель параметров из контекста
+SAMPLE_PARAMS: Dict[str, Callable[[Dict[str, Any]], tuple]] = {
+    "users.upsert": lambda c: (c["username"], 2, c["now"]),
+    "user_languages.get_active": lambda c: (c["user_id"], c["target_language_id"]),
+    "user_languages.insert": lambda c: (c["user_id"], c["target_language_id"], "A2", True, c["now"]),
+    "users.touch_last_active": lambda c: (c["now"], c["user_id"]),
+    "user_languages.increase_patch": lambda c: (c["user_language_id"],),
+    "progress.get": lambda c: (c["user_language_id"], c["word_id"]),
+    "progress.update": lambda c: (
+        2, 1, 0.5, c["now"], False, "explain", c["now"], c["user_language_id"], c["word_id"]
+    ),
+    "progress.insert": lambda c: (
+        c["user_language_id"], c["unseen_word_id"], 1, 1, 1.0, c["now"], False, "explain", c["now"]
+    ),
+    "progress.recent_success_rate": lambda c: (c["user_language_id"], 20, c["user_language_id"], 20),
+    "answer_events.insert": lambda c: (c["user_language_id"], c["word_id"], "explain", True, c["now"]),
+    "answer_events.partitions": lambda c: (),
+    "answer_events.prune": lambda c: (c["now"] - timedelta(days=365),),
+    "translations.correct": lambda c: (c["word_id"], c["translation_language_id"]),
+    "translations.correct_many": lambda c: (c["exclude_ids"], c["translation_language_id"]),
+    "translations.distractors": lambda c: (
+        c["translation_language_id"], c["difficulty"], c["word_id"], 3
+    ),
+    "vocabulary.translations": lambda c: (c["translation_language_id"],),
+    "vocabulary.distractors": lambda c: (c["translation_language_id"], c["difficulty"]),
+    "vocabulary.words": lambda c: (),
+    "vocabulary_file.words": lambda c: (),
+    "vocabulary_file.senses": lambda c: (),
+    "words.difficulty": lambda c: (c["word_id"],),
+    "words.any_excluding": lambda c: (c["exclude_ids"], c["target_language_id"], 3),
+    "picker.due": lambda c: (
+        c["user_language_id"], c["target_language_id"], c["difficulty"], CONFIG["REVIEW_QUEUE_WINDOW"]
+    ),
+    "picker.new": lambda c: (c["user_language_id"], c["target_language_id"], c["difficulty"], c["exclude_ids"], 4),
+    "picker.new_or_stale": lambda c: (
+        c["user_language_id"], c["target_language_id"], c["stretch_difficulty"],
+        _ago(c, "LAST_SEEN_DAYS_MEDIUM"), c["exclude_ids"], 2
+    ),
+    "picker.seen_before": lambda c: (
+        c["user_language_id"], c["target_language_id"], c["patch_difficulty"],
+        _ago(c, "LAST_SEEN_DAYS_LONG"), c["exclude_ids"], 1
+    ),
+    "picker.snapshot": lambda c: (c["user_language_id"], 20, c["user_language_id"]),
+    "picker.fallback": lambda c: (c["user_language_id"], c["exclude_ids"], c["target_language_id"], 2),
+    "onboarding.progress_count": lambda c: (c["user_language_id"],),
+    "onboarding.a1_frequent": lambda c: (c["target_language_id"],),
+    "onboarding.a2_random": lambda c: (c["target_language_id"],),
+    "onboarding.previous_words": lambda c: (c["user_language_id"],),
+    "onboarding.a2_new": lambda c: (c["target_language_id"], c["exclude_ids"], 4),
+    "onboarding.a1_frequent_excluding": lambda c: (c["target_language_id"], c["exclude_ids"], 3),
+    "evaluator.inputs": lambda c: (c["user_language_id"], c["now"], SESSION_EVENTS_WINDOW, c["now"]),
+    "evaluator.apply": lambda c: ("A2", 0, 0, False, "A2", c["user_language_id"]),
+    "evaluations.enqueue": lambda c: (c["user_language_id"], c["user_id"], "explain", c["now"]),
+    "evaluations.next": lambda c: (c["user_language_id"],),
+    "evaluations.wait_next": lambda c: (c["user_language_id"],),
+    "evaluations.retry_at": lambda c: (c["now"], c["now"], 0),
+    "evaluations.lock_timeout": lambda c: ("100ms",),
+    "evaluations.done": lambda c: (0,),
+    "evaluations.orphaned": lambda c: (c["now"], c["now"], 100),
+    "reevaluation.learner_ids": lambda c: (),
+    "reevaluation.learners": lambda c: (c["user_language_id"], c["user_language_id"] + 1000),
+    "reevaluation.recent_sessions": lambda c: (
+        SESSION_EVENTS_WINDOW, c["user_language_id"], c["user_language_id"] + 1000,
+        c["user_language_id"], c["user_language_id"] + 1000, REEVALUATION_SESSIONS, REEVALUATION_SESSIONS
+    ),
+    "reevaluation.apply": lambda c: ((c["user_language_id"], "A2", 0, 0, False),),
+    "schema.ping": lambda c: (),
+    "schema.has_increase_patch": lambda c: (),
+    "schema.has_evaluation_columns": lambda c: (),
+    "schema.has_next_review_at": lambda c: (),
+    "schema.has_seen_words": lambda c: (),
+    "schema.has_words_language_index": lambda c: (),
+    "schema.has_session_evaluations": lambda c: (),
+    "schema.has_evaluation_retry_at": lambda c: (),
+    "schema.has_answer_events": lambda c: (),
+    "seen_words.version": lambda c: (c["user_language_id"],),
+    "seen_words.get": lambda c: (c["user_language_id"],),
+    "seen_words.lock": lambda c: (c["user_language_id"],),
+    "seen_words.set": lambda c: (bytes(1), c["user_language_id"]),
+    "seen_words.progress": lambda c: (c["user_language_id"],),
+}
+
+# Запросы, которые нельзя объяснить (DDL) или незачем проверять (разовые миграции)
+SKIPPED = {
+    "schema.add_evaluation_columns", "schema.add_next_review_at",
+    "schema.backfill_next_review_at", "schema.create_review_index",
+    "schema.add_seen_words", "schema.add_seen_words_version", "schema.create_words_language_index",
+    "schema.create_session_evaluations", "schema.create_session_evaluations_index", "schema.add_evaluation_retry_at",
+    "schema.create_answer_events", "schema.create_answer_events_index",
+}
+
+
+def _walk(node: Dict[str, Any]):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def analyze_plan(plan: Dict[str, Any]) -> List[str]:
+    """Возвращает отметки о проблемных узлах плана."""
+    flags = []
+    for node in _walk(plan["Plan"]):
+        node_type = node.get("Node Type")
+        loops = node.get("Actual Loops", 1) or 1
+        if node_type == "Seq Scan" and node.get("Relation Name") in WATCHED_TABLES:
+            scanned = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+            if scanned >= SEQ_SCAN_MIN_ROWS:
+                flags.append(f"seq_scan:{node['Relation Name']}")
+        elif node_type in ("Sort", "Incremental Sort"):
+            sorted_rows = 0
+            for child in node.get("Plans", []):
+                sorted_rows += child.get("Actual Rows", 0) * (child.get("Actual Loops", 1) or 1)
+            external = "external" in str(node.get("Sort Method", "")).lower()
+            if external or sorted_rows > SORT_MAX_ROWS:
+                flags.append(f"sort:{','.join(node.get('Sort Key', []))}")
+    return sorted(set(flags))
+
+
+def explain_all(names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Выполняет EXPLAIN ANALYZE для запросов реестра и возвращает сводку по каждому."""
+    results = {}
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            context = build_sample_context(cur)
+        conn.rollback()
+
+        for name, query in sorted(queries.QUERIES.items()):
+            if names and name not in names:
+                continue
+            if name in SKIPPED:
+                continue
+            if name not in SAMPLE_PARAMS:
+                logger.warning("No sample parameters for query %s, skipping", name)
+                continue
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(
+                        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.sql,
+                        SAMPLE_PARAMS[name](context)
+                    )
+                    plan = cur.fetchone()["QUERY PLAN"][0]
+                results[name] = {
+                    "total_cost": plan["Plan"]["Total Cost"],
+                    "execution_ms": plan.get("Execution Time", 0.0),
+                    "planning_ms": plan.get("Planning Time", 0.0),
+                    "flags": analyze_plan(plan),
+                }
+            except Exception as e:
+                results[name] = {"error": str(e).strip()}
+            finally:
+                conn.rollback()
+    finally:
+        close_db_connection(conn)
+    return results
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]],
+                          baseline: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Возвращает регрессии по запросам: новые отметки и рост стоимости."""
+    regressions = {}
+    for name, result in results.items():
+        problems = []
+        if "error" in result:
+            problems.append(f"error: {result['error']}")
+        else:
+            base = baseline.get(name)
+            if base is None:
+                problems.extend(f"new query with {flag}" for flag in result["flags"])
+            else:
+                problems.extend(f"new {flag}" for flag in result["flags"] if flag not in base["flags"])
+                limit = base["total_cost"] * (1 + COST_TOLERANCE)
+                if result["total_cost"] > limit:
+                    problems.append(f"cost {base['total_cost']:.1f} -> {result['total_cost']:.1f}")
+        if problems:
+            regressions[name] = problems
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка планов запросов горячего пути")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Сохранить текущие планы как базовый уровень")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--query", action="append", help="Проверить только указанные запросы")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = explain_all(args.query)
+
+    print(f"{'query':<42}{'cost':>10}{'exec ms':>10}{'plan ms':>10}  flags")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<42}{'error':>10}  {result['error']}")
+            continue
+        print(f"{name:<42}{result['total_cost']:>10.1f}{result['execution_ms']:>10.2f}"
+              f"{result['planning_ms']:>10.2f}  {', '.join(result['flags'])}")
+
+    if args.update_baseline:
+        baseline = {
+            name: {"total_cost": round(r["total_cost"], 2), "flags": r["flags"]}
+            for name, r in results.items() if "error" not in r
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}, run with --update-baseline")
+        return 1
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare_with_baseline(results, baseline)
+    if not regressions:
+        print("\nNo plan regressions")
+        return 0
+    print("\nPlan regressions:")
+    for name, problems in regressions.items():
+        for problem in problems:
+            print(f"  {name}: {problem}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
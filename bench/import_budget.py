@@ -0,0 +1,107 @@
+"""
+Проверка бюджета времени импорта приложения.
+
+Всё, что main.py и его модули делают при импорте, воркер платит при каждом
+запуске и перезапуске после --max-requests (serve.py), поэтому работа с базой и
+кешами вынесена в прогрев (core/startup.py), а импорт должен оставаться дешёвым.
+Проверка запускает `python -X importtime -c "import main"` в отдельных процессах
+(медиана по --runs) и сравнивает с двумя бюджетами:
+  - весь импорт main, вместе с FastAPI, pydantic и NumPy;
+  - собственное время модулей приложения (api, core, db, models, services, main) -
+    его рост почти всегда значит новую работу на уровне модуля.
+Печатает самые тяжёлые модули приложения и сторонние пакеты. Превышение бюджета -
+код возврата 1.
+
+Запуск:
+    python -m bench.import_budget
+    python -m bench.import_budget --total-ms 1500 --app-ms 300 --runs 5
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Пакеты приложения
+APP_PACKAGES = {"api", "core", "db", "models", "services", "main"}
+
+# Бюджеты по умолчанию, мс; запас около полутора раз к замеру на машине разработчика
+TOTAL_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+APP_BUDGET_MS = float(os.environ.get("IMPORT_APP_BUDGET_MS", "300"))
+
+
+def measure() -> List[Tuple[str, int, int]]:
+    """Один импорт main в новом процессе: (модуль, собственное время мкс, с зависимостями мкс)."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, int]]) -> Dict[str, object]:
+    app = {name: self_us for name, self_us, _ in rows if name.split(".")[0] in APP_PACKAGES}
+    # Стороннему пакету засчитывается самый тяжёлый импорт его модулей (вложенные входят в него)
+    packages: Dict[str, int] = {}
+    for name, _, cumulative_us in rows:
+        package = name.split(".")[0]
+        if package not in APP_PACKAGES:
+            packages[package] = max(packages.get(package, 0), cumulative_us)
+    return {
+        "total_ms": next(cumulative_us for name, _, cumulative_us in rows if name == "main") / 1000,
+        "app_ms": sum(app.values()) / 1000,
+        "app_modules": app,
+        "packages": packages,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка бюджета времени импорта приложения")
+    parser.add_argument("--total-ms", type=float, default=TOTAL_BUDGET_MS, help="Бюджет всего импорта main")
+    parser.add_argument("--app-ms", type=float, default=APP_BUDGET_MS,
+                        help="Бюджет собственного времени модулей приложения")
+    parser.add_argument("--runs", type=int, default=5, help="Запусков, по которым берётся медиана")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [summarize(measure()) for _ in range(args.runs)]
+    total_ms = statistics.median(run["total_ms"] for run in runs)
+    app_ms = statistics.median(run["app_ms"] for run in runs)
+    # Разбивка - по запуску с медианным временем
+    typical = sorted(runs, key=lambda run: run["total_ms"])[len(runs) // 2]
+
+    print(f"{'app module':<42}{'self ms':>10}")
+    for name, self_us in sorted(typical["app_modules"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<42}{self_us / 1000:>10.1f}")
+    print(f"\n{'package':<42}{'cumul ms':>10}")
+    for name, cumulative_us in sorted(typical["packages"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<42}{cumulative_us / 1000:>10.1f}")
+
+    print(f"\nimport main: {total_ms:.0f} ms (budget {args.total_ms:.0f}), "
+          f"app modules: {app_ms:.0f} ms (budget {args.app_ms:.0f}), median of {args.runs}")
+    over = []
+    if total_ms > args.total_ms:
+        over.append(f"import main {total_ms:.0f} ms > {args.total_ms:.0f} ms")
+    if app_ms > args.app_ms:
+        over.append(f"app modules {app_ms:.0f} ms > {args.app_ms:.0f} ms")
+    if not over:
+        print("Import time within budget")
+        return 0
+    print("Import time over budget:")
+    for problem in over:
+        print(f"  {problem}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
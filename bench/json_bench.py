@@ -0,0 +1,90 @@
+"""
+Микробенчмарк сериализации ответа start-session.
+
+Сравнивает путь через pydantic-модель (конструирование WordSession, повторная
+проверка FastAPI по response_model, jsonable_encoder и JSONResponse) с быстрым
+путём core.responses (готовые словари сразу в JSON). Печатает время CPU на
+ответ и разницу. База и сервер не нужны.
+
+Запуск:
+    python -m bench.json_bench --iterations 20000
+"""
+import time
+import uuid
+import random
+import argparse
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import JSONResponse
+
+from core.responses import FastJSONResponse, orjson
+from models.config import CONFIG
+from models.schemas import WordSession
+
+
+def build_payload() -> dict:
+    """Сессия такого же размера и состава, как у services.picker."""
+    words = []
+    for i in range(CONFIG["SESSION_SIZE"]):
+        options = [f"перевод слова {i}-{j}" for j in range(4)]
+        random.shuffle(options)
+        words.append({
+            "wordId": 100000 + i,
+            "text": f"реч{i}",
+            "correctTranslation": options[0],
+            "options": options,
+        })
+    return {"sessionId": str(uuid.uuid4()), "words": words, "totalWords": len(words)}
+
+
+def model_path(payload: dict, field) -> bytes:
+    """То, что происходит сейчас: модель в эндпоинте, затем обработка ответа в FastAPI."""
+    model = WordSession(**payload)
+    return JSONResponse(_serialize_sync(field, model)).body
+
+
+def _serialize_sync(field, model):
+    # serialize_response - корутина без реальных ожиданий; прогоняем её без event loop
+    coro = serialize_response(field=field, response_content=model, is_coroutine=True)
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("serialize_response suspended unexpectedly")
+
+
+def fast_path(payload: dict, field) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def measure(func, payload: dict, field, iterations: int) -> float:
+    """Среднее время CPU на вызов (мкс)."""
+    for _ in range(min(1000, iterations)):
+        func(payload, field)
+    started = time.process_time()
+    for _ in range(iterations):
+        func(payload, field)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарк сериализации ответа start-session")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    payload = build_payload()
+    field = create_response_field(name="Response_start_session", type_=WordSession, mode="serialization")
+
+    model_us = measure(model_path, payload, field, args.iterations)
+    fast_us = measure(fast_path, payload, field, args.iterations)
+
+    print(f"Кодировщик быстрого пути: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"Размер ответа: {len(fast_path(payload, field))} байт")
+    print(f"pydantic + FastAPI: {model_us:8.1f} мкс CPU на ответ")
+    print(f"быстрый путь:       {fast_us:8.1f} мкс CPU на ответ")
+    print(f"экономия:           {model_us - fast_us:8.1f} мкс ({model_us / fast_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
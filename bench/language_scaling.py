@@ -0,0 +1,68 @@
+"""
+Задержка подбора слов в зависимости от числа языков в словаре.
+
+Запросы кандидатов подборщика ограничены языком изучения (индекс
+words (language_id, difficulty)), каталог словаря в памяти разложен по языку
+и уровню, поэтому слова других языков не должны влиять на подбор. Бенчмарк
+пересоздаёт набор bench.dataset с разным числом дополнительных языков и для
+каждого печатает задержку подбора во всех режимах bench.picker_compare.
+Ученики и их прогресс во всех прогонах одни и те же, меняется только словарь.
+
+Набор стирается (как bench.dataset --reset); в конце он пересоздаётся без
+дополнительных языков.
+
+Запуск:
+    python -m bench.language_scaling --extra-languages 0,4,9
+"""
+import argparse
+import logging
+from typing import Dict, List
+
+from bench.dataset import seed_dataset
+from bench.picker_compare import ENGINES, _percentile, pick_learners, run_engines
+from db import database, seen_words, vocabulary
+from services import snapshot_picker
+
+
+def measure(extra_languages: int, sessions: int, seed: int) -> Dict[str, List[float]]:
+    """Пересоздаёт набор с extra_languages дополнительными языками и замеряет подбор."""
+    seed_dataset(extra_languages=extra_languages, reset=True, seed=seed)
+    # id слов и учеников после пересоздания другие - кеши процесса больше не годятся
+    vocabulary.clear()
+    snapshot_picker.clear()
+    seen_words.clear()
+    results = run_engines(pick_learners(sessions, 200, seed))
+    return {engine: result["ms"] for engine, result in results.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Задержка подбора слов в зависимости от числа языков")
+    parser.add_argument("--extra-languages", default="0,4,9",
+                        help="Числа дополнительных языков через запятую")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    if snapshot_picker.np is None:
+        raise SystemExit("numpy is required for the snapshot engine")
+    if database.DB_BACKEND == "postgres":
+        database.init_pool(2, prewarm=True)
+
+    counts = [int(value) for value in args.extra_languages.split(",")]
+    try:
+        rows = [(count, measure(count, args.sessions, args.seed)) for count in counts]
+    finally:
+        seed_dataset(reset=True, seed=args.seed)
+
+    print(f"{'languages':<11}" + "".join(f"{engine + ' p50':>15}{'mean':>8}" for engine in ENGINES))
+    for count, results in rows:
+        print(f"{count + 1:<11}" + "".join(
+            f"{_percentile(results[engine], 50):>15.1f}{sum(results[engine]) / len(results[engine]):>8.1f}"
+            for engine in ENGINES
+        ))
+    print("Время подбора одной сессии, мс")
+
+
+if __name__ == "__main__":
+    main()
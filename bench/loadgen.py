@@ -0,0 +1,332 @@
+"""
+Асинхронный генератор нагрузки на API изучения слов.
+
+Каждый виртуальный ученик повторяет сценарий LearningSession из static/js/app.js:
+вход, start-session, ответы на все слова сессии с паузой "на подумать",
+finish-session и снова start-session. В конце выводится пропускная способность,
+гистограммы задержек по эндпоинтам, доля ошибок и загрузка соединений БД.
+
+Запуск против уже работающего сервера:
+    python -m bench.loadgen --users 50 --duration 60 --base-url http://127.0.0.1:8000
+
+Или с запуском локального uvicorn (без reload):
+    python -m bench.loadgen --users 50 --duration 60 --start-server
+
+--reloaders N добавляет N учеников, которые без пауз перезагружают страницу
+(/api/auth/user и start-session, как checkAuth() при загрузке) - всплеск, от которого
+защищает допуск запросов (core/admission.py). Их запросы учитываются отдельно
+(reload:...), задержки ответов учеников в сессии остаются в своих строках.
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.dataset import USERNAME_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек (мс)
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+@dataclass
+class EndpointStats:
+    """Задержки и ошибки одного эндпоинта."""
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=dict)
+
+    def record(self, latency_ms: float, status_code: Optional[int]) -> None:
+        self.latencies_ms.append(latency_ms)
+        if status_code is None or status_code >= 400:
+            self.errors += 1
+        key = status_code if status_code is not None else 0
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def histogram(self) -> List[int]:
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for latency in self.latencies_ms:
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return counts
+
+
+@dataclass
+class LoadStats:
+    """Сводная статистика прогона."""
+    endpoints: Dict[str, EndpointStats] = field(default_factory=dict)
+    sessions_completed: int = 0
+    db_connections: List[int] = field(default_factory=list)
+    db_max_connections: Optional[int] = None
+
+    def record(self, endpoint: str, latency_ms: float, status_code: Optional[int]) -> None:
+        self.endpoints.setdefault(endpoint, EndpointStats()).record(latency_ms, status_code)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+
+class VirtualLearner:
+    """Один ученик, проходящий сессии так же, как фронтенд."""
+
+    def __init__(self, num: int, client: httpx.AsyncClient, stats: LoadStats,
+                 think_time: float, accuracy: float):
+        self.username = f"{USERNAME_PREFIX}{num}"
+        self.client = client
+        self.stats = stats
+        self.think_time = think_time
+        self.accuracy = accuracy
+
+    async def _request(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.record(endpoint, (time.perf_counter() - started) * 1000, None)
+            logger.debug("%s: %s failed: %s", self.username, endpoint, e)
+            return None
+        self.stats.record(endpoint, (time.perf_counter() - started) * 1000, response.status_code)
+        return response
+
+    async def _think(self) -> None:
+        if self.think_time > 0:
+            # Экспоненциальное распределение пауз вокруг заданного среднего
+            await asyncio.sleep(random.expovariate(1 / self.think_time))
+
+    async def login(self) -> bool:
+        # Отклонённый допуском вход (429/503) повторяется через Retry-After, как повторное нажатие
+        for _ in range(10):
+            response = await self._request(
+                "login", "POST", "/api/auth/login", data={"username": self.username}
+            )
+            if response is None or response.status_code not in (429, 503):
+                return response is not None and response.status_code == 200
+            await asyncio.sleep(_retry_after(response))
+        return False
+
+    async def run_session(self) -> bool:
+        """Проходит одну сессию: start-session, ответы, finish-session."""
+        response = await self._request("start-session", "GET", "/api/words/start-session")
+        if response is None or response.status_code != 200:
+            return False
+
+        data = response.json()
+        session_id = data["sessionId"]
+
+        for word in data["words"]:
+            await self._think()
+            if random.random() < self.accuracy:
+                answer = word["correctTranslation"]
+            else:
+                answer = random.choice(word["options"])
+            await self._request("submit-answer", "POST", "/api/words/submit-answer", json={
+                "wordId": word["wordId"],
+                "userAnswer": answer,
+                "sessionId": session_id,
+                "correctTranslation": word["correctTranslation"],
+            })
+
+        response = await self._request(
+            "finish-session", "POST", "/api/words/finish-session", json={"sessionId": session_id}
+        )
+        if response is None or response.status_code != 200:
+            return False
+
+        self.stats.sessions_completed += 1
+        return True
+
+    async def reload_loop(self, deadline: float) -> None:
+        """Перезагружает страницу без пауз: проверка входа и новая сессия."""
+        if not await self.login():
+            return
+        while time.monotonic() < deadline:
+            await self._request("reload:auth-user", "GET", "/api/auth/user")
+            await self._request("reload:start-session", "GET", "/api/words/start-session")
+
+    async def run(self, deadline: float, max_sessions: Optional[int]) -> None:
+        if not await self.login():
+            return
+        sessions = 0
+        while time.monotonic() < deadline and (max_sessions is None or sessions < max_sessions):
+            if not await self.run_session():
+                # Не молотим сервер при ошибках - пауза как при ручной перезагрузке
+                await asyncio.sleep(1)
+            sessions += 1
+
+
+async def sample_db_connections(stats: LoadStats, deadline: float, interval: float) -> None:
+    """Периодически снимает число открытых соединений к базе приложения."""
+    from db.database import get_db_connection, close_db_connection
+
+    def _sample() -> None:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT COUNT(*) AS connections,
+                           current_setting('max_connections')::int AS max_connections
+                    FROM pg_stat_activity
+                    WHERE datname = current_database()
+                """)
+                row = cur.fetchone()
+                # Не считаем соединение самого сэмплера
+                stats.db_connections.append(row["connections"] - 1)
+                stats.db_max_connections = row["max_connections"]
+        finally:
+            close_db_connection(conn)
+
+    while time.monotonic() < deadline:
+        try:
+            await asyncio.to_thread(_sample)
+        except Exception as e:
+            logger.warning("Could not sample DB connections: %s", e)
+            return
+        await asyncio.sleep(interval)
+
+
+def print_report(stats: LoadStats, elapsed: float, users: int) -> None:
+    """Печатает итоговый отчёт прогона."""
+    total_requests = sum(len(s.latencies_ms) for s in stats.endpoints.values())
+    total_errors = sum(s.errors for s in stats.endpoints.values())
+
+    print(f"\nПользователей: {users}, длительность: {elapsed:.1f} с")
+    print(f"Запросов: {total_requests} ({total_requests / elapsed:.1f} rps), "
+          f"ошибок: {total_errors} ({100 * total_errors / max(total_requests, 1):.2f}%)")
+    print(f"Завершённых сессий: {stats.sessions_completed} ({stats.sessions_completed / elapsed:.2f} в секунду)")
+
+    print(f"\n{'endpoint':<16}{'count':>8}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, s in stats.endpoints.items():
+        count = len(s.latencies_ms)
+        print(f"{name:<16}{count:>8}{100 * s.errors / max(count, 1):>7.2f}%"
+              f"{s.percentile(50):>9.1f}{s.percentile(95):>9.1f}{s.percentile(99):>9.1f}"
+              f"{max(s.latencies_ms, default=0):>9.1f}")
+
+    print("\nГистограммы задержек (мс):")
+    labels = [f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+    for name, s in stats.endpoints.items():
+        buckets = ", ".join(f"{label}: {count}" for label, count in zip(labels, s.histogram()) if count)
+        print(f"  {name}: {buckets}")
+        codes = ", ".join(f"{code}: {count}" for code, count in sorted(s.status_codes.items()))
+        print(f"  {name} статусы: {codes}")
+
+    if stats.db_connections:
+        peak = max(stats.db_connections)
+        avg = sum(stats.db_connections) / len(stats.db_connections)
+        print(f"\nСоединения БД: среднее {avg:.1f}, пик {peak}", end="")
+        if stats.db_max_connections:
+            print(f" из {stats.db_max_connections} ({100 * peak / stats.db_max_connections:.0f}% насыщения)")
+        else:
+            print()
+
+
+async def run_load(base_url: str, users: int, duration: float, max_sessions: Optional[int],
+                   think_time: float, accuracy: float, ramp_up: float,
+                   sample_db: bool = True, reloaders: int = 0) -> LoadStats:
+    """Запускает нагрузку и возвращает собранную статистику."""
+    stats = LoadStats()
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+
+    async def _learner(num: int) -> None:
+        # Постепенный разгон, чтобы не начинать с одновременного логина всех
+        if ramp_up > 0:
+            await asyncio.sleep(ramp_up * num / users)
+        async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+            await VirtualLearner(num, client, stats, think_time, accuracy).run(deadline, max_sessions)
+
+    async def _reloader(num: int) -> None:
+        # Всплеск начинается после разгона, когда ученики уже в сессиях
+        await asyncio.sleep(ramp_up)
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            await VirtualLearner(num, client, stats, think_time, accuracy).reload_loop(deadline)
+
+    tasks = [asyncio.create_task(_learner(num)) for num in range(users)]
+    tasks += [asyncio.create_task(_reloader(users + num)) for num in range(reloaders)]
+    if sample_db:
+        tasks.append(asyncio.create_task(sample_db_connections(stats, deadline, interval=1.0)))
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def start_server(host: str, port: int) -> subprocess.Popen:
+    """Запускает локальный uvicorn без reload и ждёт, пока он начнёт отвечать."""
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", host, "--port", str(port), "--log-level", "warning"
+    ])
+    url = f"http://{host}:{port}/api/auth/user"
+    for _ in range(100):
+        try:
+            httpx.get(url, timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Server at {host}:{port} did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API изучения слов")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="Число одновременных учеников")
+    parser.add_argument("--duration", type=float, default=60, help="Длительность прогона (с)")
+    parser.add_argument("--sessions", type=int, default=None,
+                        help="Максимум сессий на ученика (по умолчанию - до конца прогона)")
+    parser.add_argument("--think-time", type=float, default=1.0,
+                        help="Средняя пауза перед ответом (с)")
+    parser.add_argument("--accuracy", type=float, default=0.7, help="Доля правильных ответов")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Время разгона (с)")
+    parser.add_argument("--reloaders", type=int, default=0,
+                        help="Учеников, перезагружающих страницу без пауз")
+    parser.add_argument("--no-db-sampling", action="store_true",
+                        help="Не опрашивать pg_stat_activity")
+    parser.add_argument("--start-server", action="store_true",
+                        help="Запустить локальный uvicorn на время прогона")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    server = None
+    if args.start_server:
+        url = httpx.URL(args.base_url)
+        server = start_server(url.host, url.port or 8000)
+
+    try:
+        started = time.monotonic()
+        stats = asyncio.run(run_load(
+            args.base_url, args.users, args.duration, args.sessions,
+            args.think_time, args.accuracy, args.ramp_up,
+            sample_db=not args.no_db_sampling, reloaders=args.reloaders
+        ))
+        print_report(stats, time.monotonic() - started, args.users + args.reloaders)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Сравнение режимов подбора слов: анти-join запросами, запросы с картой виденных
+слов (db/seen_words.py) и снимок прогресса в памяти.
+
+Для одних и тех же учеников набора bench.dataset вызывает services.picker.select_words
+в каждом режиме и печатает задержку подбора, число запросов к базе на сессию и
+долю сессий, в которых слова разошлись по категориям так же, как при анти-join.
+Подбор пишет только карты виденных слов (при первом обращении к ученику), поэтому
+все режимы видят одни данные.
+
+Запуск:
+    python -m bench.picker_compare --sessions 200
+С --memory печатает ещё процессорное время и пик памяти Python на подбор
+(tracemalloc; задержки при этом выше обычных).
+Для учеников с длинной историей набор пересоздаётся с другими размерами
+(--reset стирает текущий набор):
+    python -m bench.dataset --reset --users 5 --words-per-level 12000 --progress-per-user 25000
+    python -m bench.picker_compare --users 5
+"""
+import time
+import random
+import argparse
+import logging
+import tracemalloc
+from typing import Dict, List
+
+from bench.dataset import TARGET_LANGUAGE_ID, TRANSLATION_LANGUAGE_ID, USERNAME_PREFIX
+from core.metrics import DB_QUERIES, PICKER_WORDS
+from db import database, seen_words
+from services import picker, snapshot_picker
+
+CATEGORIES = ["Weak", "Review", "New-L", "Stretch+1", "Patch-1", "Fallback"]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _category_counts() -> Dict[str, float]:
+    return {category: PICKER_WORDS.labels(category).value for category in CATEGORIES}
+
+
+# Режим -> (карта виденных слов, снимок)
+ENGINES = {
+    "antijoin": (False, False),
+    "seen_map": (True, False),
+    "snapshot": (False, True),
+}
+
+
+def run_engine(engine: str, learners: List[tuple]) -> Dict[str, list]:
+    """Подбирает слова для каждого ученика, возвращает задержки, число запросов и категории."""
+    seen_words.ENABLED, snapshot_picker.ENABLED = ENGINES[engine]
+    result = {"ms": [], "cpu_ms": [], "peak_kb": [], "queries": [], "categories": []}
+    for user_id, user_language_id, level in learners:
+        queries_before = DB_QUERIES.labels().value
+        categories_before = _category_counts()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        picker.select_words(user_id, TARGET_LANGUAGE_ID, user_language_id, level, TRANSLATION_LANGUAGE_ID)
+        result["ms"].append((time.perf_counter() - started) * 1000)
+        result["cpu_ms"].append((time.process_time() - cpu_started) * 1000)
+        if tracemalloc.is_tracing():
+            result["peak_kb"].append((tracemalloc.get_traced_memory()[1] - traced_before) / 1024)
+        result["queries"].append(DB_QUERIES.labels().value - queries_before)
+        after = _category_counts()
+        result["categories"].append(tuple(after[c] - categories_before[c] for c in CATEGORIES))
+    return result
+
+
+def pick_learners(sessions: int, users: int, seed: int) -> List[tuple]:
+    """Случайные ученики набора bench.dataset: (user_id, user_language_id, level) на каждую сессию."""
+    random.seed(seed)
+    learners = []
+    for _ in range(sessions):
+        user_id = database.get_or_create_user(f"{USERNAME_PREFIX}{random.randrange(users)}")
+        user_language_id, level = database.get_or_create_user_language(user_id, TARGET_LANGUAGE_ID)
+        learners.append((user_id, user_language_id, level))
+    return learners
+
+
+def run_engines(learners: List[tuple]) -> Dict[str, Dict[str, list]]:
+    """Прогоняет всех учеников в каждом режиме после прогрева."""
+    # Прогрев: каталог слов, кеш словаря и карты виденных слов загружаются при первом обращении
+    for engine in ENGINES:
+        run_engine(engine, learners)
+    return {engine: run_engine(engine, learners) for engine in ENGINES}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение режимов подбора слов")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--users", type=int, default=200, help="Сколько учеников набора использовать")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--memory", action="store_true", help="Процессорное время и пик памяти на подбор")
+    args = parser.parse_args()
+
+    # Подборщик пишет предупреждения о fallback-уровнях на каждой сессии - в отчёте они мешают
+    logging.basicConfig(level=logging.ERROR)
+    if snapshot_picker.np is None:
+        raise SystemExit("numpy is required for the snapshot engine")
+
+    # Как в воркерах serve.py: без пула в задержке подбора преобладает открытие соединений
+    if database.DB_BACKEND == "postgres":
+        database.init_pool(2, prewarm=True)
+
+    learners = pick_learners(args.sessions, args.users, args.seed)
+    if args.memory:
+        tracemalloc.start()
+    results = run_engines(learners)
+    memory_header = f"{'cpu ms':>9}{'peak kB':>9}" if args.memory else ""
+    print(f"{'engine':<10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'queries':>9}{'same':>10}{memory_header}")
+    baseline = results["antijoin"]["categories"]
+    for engine, result in results.items():
+        values = result["ms"]
+        same = sum(1 for a, b in zip(baseline, result["categories"]) if a == b)
+        memory = ""
+        if args.memory:
+            memory = (f"{sum(result['cpu_ms']) / len(values):>9.2f}"
+                      f"{sum(result['peak_kb']) / len(values):>9.1f}")
+        print(f"{engine:<10}{_percentile(values, 50):>9.1f}{_percentile(values, 95):>9.1f}"
+              f"{sum(values) / len(values):>9.1f}{sum(result['queries']) / len(values):>9.1f}"
+              f"{f'{same}/{len(values)}':>10}{memory}")
+    print("same - сессии с тем же распределением по категориям, что при анти-join")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Горячие запросы реестра: обычное выполнение против подготовленного (db/prepared.py).
+
+На одном соединении пула выполняет каждый запрос с prepare=True с параметрами
+bench.explain_check (пользователь набора bench.dataset с самой длинной историей)
+сначала как обычный текст, затем подготовленным, и печатает медианную задержку
+выполнения. Каждое выполнение - в своей транзакции с откатом, поэтому изменяющие
+запросы не меняют данные.
+
+Запуск:
+    python -m bench.prepared_statements --repeat 200
+"""
+import time
+import argparse
+import logging
+import statistics
+from typing import Dict, List
+
+from psycopg2.extras import RealDictCursor
+
+from bench.explain_check import SAMPLE_PARAMS, build_sample_context
+from db import database, queries
+
+
+def _measure(conn, name: str, params: tuple, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            cur.execute(queries.QUERIES[name].sql, params)
+            if cur.description is not None:
+                cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+    return timings
+
+
+def run(repeat: int) -> Dict[str, Dict[str, float]]:
+    """Медианы задержки каждого горячего запроса (мс): plain - текстом, prepared - подготовленным."""
+    database.init_pool(1, prewarm=True)
+    conn = database.get_db_connection()
+    try:
+        if getattr(conn, "prepared", None) is None:
+            raise SystemExit("prepared statements are disabled (DB_PREPARED_STATEMENTS=0)")
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            context = build_sample_context(cur)
+        conn.rollback()
+
+        results = {}
+        for name, query in sorted(queries.QUERIES.items()):
+            if not query.prepare or name not in SAMPLE_PARAMS:
+                continue
+            params = SAMPLE_PARAMS[name](context)
+            row = {}
+            for mode in ("plain", "prepared"):
+                # Без множества подготовленных запросов соединение выполняет их текстом
+                conn.prepared = set() if mode == "prepared" else None
+                _measure(conn, name, params, 5)  # прогрев: подготовка и кеши
+                row[mode] = statistics.median(_measure(conn, name, params, repeat))
+            results[name] = row
+        conn.prepared = set()
+        with conn.cursor() as cur:
+            cur.execute("DEALLOCATE ALL")
+    finally:
+        database.close_db_connection(conn)
+        database.close_pool()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обычные и подготовленные горячие запросы")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if database.DB_BACKEND != "postgres":
+        raise SystemExit("prepared statements are used with Postgres only")
+    results = run(args.repeat)
+    print(f"{'query':<34}{'plain ms':>10}{'prepared ms':>13}{'saved':>8}")
+    for name, row in results.items():
+        saved = 1 - row["prepared"] / row["plain"] if row["plain"] else 0.0
+        print(f"{name:<34}{row['plain']:>10.3f}{row['prepared']:>13.3f}{saved:>8.0%}")
+    plain = sum(row["plain"] for row in results.values())
+    prepared = sum(row["prepared"] for row in results.values())
+    print(f"{'total':<34}{plain:>10.3f}{prepared:>13.3f}{1 - prepared / plain:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Память и прогрев словаря в воркерах: кеш запросами против файла словаря.
+
+Запускает несколько процессов, как serve.py, и в каждом прогревает словарь так
+же, как прогрев воркера (core/startup.py): кеш словаря и каталог подборщика (если есть NumPy) -
+запросами или из файла словаря (db/vocabulary_file.py). Печатает время прогрева
+и прирост личной памяти процесса (Private в /proc/self/smaps_rollup, только Linux);
+страницы файла словаря - общие для всех воркеров и в личную память не входят.
+
+Запуск (файл собирается во временный каталог):
+    python -m bench.vocabulary_workers --workers 4
+"""
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+from typing import Dict
+
+from api.words import DEFAULT_TRANSLATION_LANGUAGE_ID
+from bench.dataset import TARGET_LANGUAGE_ID
+from db import database, vocabulary, vocabulary_file
+from models.config import LEVEL_TO_DIFFICULTY
+from services import snapshot_picker
+
+
+def _private_kb() -> int:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def _worker(file_path: str, ready, done, results) -> None:
+    vocabulary.FILE_PATH = file_path
+    before = _private_kb()
+    started = time.perf_counter()
+    conn = database.get_db_connection()
+    try:
+        vocabulary.warm(conn, [DEFAULT_TRANSLATION_LANGUAGE_ID], sorted(set(LEVEL_TO_DIFFICULTY.values())))
+        vocabulary.ensure_words(conn)
+        if snapshot_picker.np is not None:
+            snapshot_picker.load_catalog(conn)
+    finally:
+        database.close_db_connection(conn)
+    warm_ms = (time.perf_counter() - started) * 1000
+
+    # Обращаемся ко всем словам, как подборщик за время работы воркера
+    for difficulty in set(LEVEL_TO_DIFFICULTY.values()):
+        for word_id in vocabulary.word_ids_at(TARGET_LANGUAGE_ID, difficulty):
+            vocabulary.word_text(word_id)
+            vocabulary.get_translation(word_id, DEFAULT_TRANSLATION_LANGUAGE_ID)
+
+    # Замер, когда все воркеры прогреты и отобразили файл
+    ready.wait()
+    results.put((warm_ms, _private_kb() - before))
+    done.wait()
+
+
+def run(workers: int, file_path: str) -> Dict[str, float]:
+    ctx = multiprocessing.get_context("fork")
+    ready, done, results = ctx.Barrier(workers), ctx.Barrier(workers + 1), ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(file_path, ready, done, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    return {
+        "warm_ms": sum(m[0] for m in measured) / workers,
+        "private_kb": sum(m[1] for m in measured) / workers,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Память и прогрев словаря в воркерах")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vocabulary.bin")
+        conn = database.get_db_connection()
+        try:
+            stats = vocabulary_file.build(conn, path)
+        finally:
+            database.close_db_connection(conn)
+        print(f"vocabulary file: {stats['words']} words, {stats['translations']} translations, {stats['bytes']} bytes")
+        print(f"{'mode':<10}{'warm ms':>10}{'private kB':>12}   (per worker, {args.workers} workers)")
+        for mode, file_path in (("queries", ""), ("file", path)):
+            result = run(args.workers, file_path)
+            print(f"{mode:<10}{result['warm_ms']:>10.1f}{result['private_kb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
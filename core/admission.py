@@ -0,0 +1,180 @@
+"""
+Допуск запросов API: ограничение одновременных запросов и частоты запросов ученика.
+
+Всплеск /start-session (перезагрузки страницы, checkAuth() при каждой загрузке) занимал
+соединения БД у всех остальных, и ответы внутри сессии ждали вместе с ним. Пути API
+делятся на классы (CLASSES): для каждого класса в процессе ограничено число
+одновременных запросов, а у каждого вошедшего ученика (cookie user_id) есть корзина
+токенов на класс. Запросы без входа (вход, проверка входа на странице логина)
+ограничены только числом одновременных: за прокси и NAT у многих учеников один адрес.
+Лишнее отклоняется сразу, не дожидаясь БД:
+- 429 - ученик превысил свою частоту; Retry-After - когда появится токен;
+- 503 - класс занят; Retry-After - ADMISSION_RETRY_AFTER секунд.
+Отклонённый запрос не выполнен, и клиент повторяет его не раньше Retry-After
+(static/js/app.js - fetchWithRetry).
+
+Подбор сессий (session) ограничен строже всего, а у ответов (answer) и завершений
+сессий (finish) свой запас одновременных запросов, поэтому всплеск подборов не
+задерживает submit-answer. Корзины ответов и завершений вмещают пакет офлайн-клиента
+целиком: SESSION_BATCH_MAX сессий по SESSION_SIZE ответов и завершение каждой.
+
+Лимиты - на процесс: при N воркерах общий предел в N раз больше. Middleware работает
+в цикле событий, поэтому счётчики и корзины меняются без блокировок.
+
+Настройка - ADMISSION_<КЛАСС>_CONCURRENCY, _RATE (токенов в секунду), _BURST (ёмкость
+корзины), например ADMISSION_SESSION_RATE=0.5; 0 - без ограничения. ADMISSION_CONTROL=0 -
+выключить. Метрики: flowcado_admission_rejections_total{endpoint_class, reason} и
+flowcado_admission_in_flight{endpoint_class}.
+"""
+import os
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse
+
+from core.metrics import ADMISSION_IN_FLIGHT, ADMISSION_REJECTIONS
+from models.config import CONFIG
+from models.messages import ERROR_MESSAGES
+
+ENABLED = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+
+# Retry-After для 503, секунды
+RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+
+# Сколько корзин учеников держать в памяти; вытесняются давно не обращавшиеся
+MAX_BUCKETS = int(os.environ.get("ADMISSION_MAX_BUCKETS", "100000"))
+
+
+class Limits(NamedTuple):
+    """Лимиты класса путей: одновременных запросов на процесс и корзина токенов ученика."""
+    concurrency: int
+    rate: float
+    burst: float
+
+
+def _limits(name: str, concurrency: int, rate: float, burst: float) -> Limits:
+    prefix = f"ADMISSION_{name.upper()}_"
+    return Limits(
+        int(os.environ.get(prefix + "CONCURRENCY", concurrency)),
+        float(os.environ.get(prefix + "RATE", rate)),
+        float(os.environ.get(prefix + "BURST", burst)),
+    )
+
+
+# Класс -> лимиты
+CLASSES: Dict[str, Limits] = {
+    # Подбор слов - самый тяжёлый запрос; пачка сессий - тот же подбор
+    "session": _limits("session", concurrency=8, rate=0.5, burst=5),
+    # Ответы - короткие записи по ходу сессии; офлайн-клиент досылает ответы всего пакета сразу
+    "answer": _limits("answer", concurrency=32, rate=5,
+                      burst=CONFIG["SESSION_BATCH_MAX"] * CONFIG["SESSION_SIZE"]),
+    # Завершение сессии: постановка оценки в очередь; после офлайна - по одному на сессию пакета
+    "finish": _limits("finish", concurrency=16, rate=1, burst=CONFIG["SESSION_BATCH_MAX"]),
+    # Вход и проверка входа при каждой загрузке страницы
+    "auth": _limits("auth", concurrency=8, rate=1, burst=10),
+}
+
+# Префикс пути -> класс; пути вне списка не ограничиваются
+ROUTES: List[Tuple[str, str]] = [
+    ("/api/words/start-session", "session"),
+    ("/api/words/session-batch", "session"),
+    ("/api/words/submit-answer", "answer"),
+    ("/api/words/finish-session", "finish"),
+    ("/api/auth/", "auth"),
+]
+
+_in_flight: Dict[str, int] = {name: 0 for name in CLASSES}
+
+# (класс, ученик) -> [токены, время пополнения]; в конце - недавно обращавшиеся
+_buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+
+def endpoint_class(path: str) -> Optional[str]:
+    for prefix, name in ROUTES:
+        if path.startswith(prefix):
+            return name
+    return None
+
+
+def _user_id(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"cookie":
+            return cookie_parser(value.decode("latin-1")).get("user_id") or None
+    return None
+
+
+def take_token(name: str, user_id: str, now: float) -> float:
+    """
+    Берёт токен из корзины ученика user_id в классе name. Возвращает 0, если токен взят,
+    иначе - сколько секунд ждать следующего.
+    """
+    limits = CLASSES[name]
+    if limits.rate <= 0:
+        return 0.0
+    bucket = _buckets.get((name, user_id))
+    if bucket is None:
+        bucket = _buckets[(name, user_id)] = [limits.burst, now]
+        if len(_buckets) > MAX_BUCKETS:
+            _buckets.popitem(last=False)
+    else:
+        _buckets.move_to_end((name, user_id))
+        bucket[0] = min(limits.burst, bucket[0] + (now - bucket[1]) * limits.rate)
+        bucket[1] = now
+    if bucket[0] >= 1:
+        bucket[0] -= 1
+        return 0.0
+    return (1 - bucket[0]) / limits.rate
+
+
+def return_token(name: str, user_id: str) -> None:
+    """Возвращает токен запроса, который не был выполнен (класс занят)."""
+    bucket = _buckets.get((name, user_id))
+    if bucket is not None:
+        bucket[0] = min(CLASSES[name].burst, bucket[0] + 1)
+
+
+def _reject(status_code: int, message: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": ERROR_MESSAGES[message]},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: отклоняет запросы сверх частоты ученика (429) и загрузки класса (503)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = endpoint_class(scope["path"]) if scope["type"] == "http" and ENABLED else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        user_id = _user_id(scope)
+        wait = take_token(name, user_id, time.monotonic()) if user_id else 0.0
+        if wait:
+            ADMISSION_REJECTIONS.labels(name, "rate_limited").inc()
+            await _reject(429, "rate_limited", wait)(scope, receive, send)
+            return
+
+        limit = CLASSES[name].concurrency
+        if limit > 0 and _in_flight[name] >= limit:
+            if user_id:
+                return_token(name, user_id)
+            ADMISSION_REJECTIONS.labels(name, "overloaded").inc()
+            await _reject(503, "overloaded", RETRY_AFTER)(scope, receive, send)
+            return
+
+        _in_flight[name] += 1
+        ADMISSION_IN_FLIGHT.labels(name).inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight[name] -= 1
+            ADMISSION_IN_FLIGHT.labels(name).dec()
@@ -0,0 +1,177 @@
+"""
+Статические файлы: сборка с отпечатками и предсжатием, раздача и сжатие JSON.
+
+Сборка (один раз при деплое):
+    python -m core.assets
+копирует static/css/*.css и static/js/*.js в static/dist/ под именами с хешем
+содержимого (styles.3f2a9c1b7d.css), рядом кладёт .gz и .br (brotli - если
+установлен пакет brotli), переписывает ссылки в index.html и пишет manifest.json.
+
+PrecompressedStaticFiles отдаёт готовый .br/.gz по Accept-Encoding, а файлам
+с хешем в имени - заголовок Cache-Control: immutable на год: при изменении
+файла меняется имя, поэтому браузер не перезапрашивает старое.
+ApiGZipMiddleware сжимает JSON-ответы API больше порога.
+"""
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+from typing import Dict
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него собираются только .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+STATIC_URL = "/static/"
+
+# Какие исходники собирать (относительно static/)
+ASSET_DIRS = {"css": ".css", "js": ".js"}
+
+# Файлы с отпечатком: имя.<10 hex>.расширение
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{10}\.[a-z0-9]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Суффикс предсжатого варианта по кодировке, в порядке предпочтения
+ENCODING_SUFFIXES = [("br", ".br"), ("gzip", ".gz")]
+
+# Порог сжатия JSON-ответов API (байт)
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
+
+
+def _write_compressed(path: str, data: bytes) -> None:
+    # mtime=0 - одинаковый результат при повторной сборке
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_assets(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> Dict[str, str]:
+    """Собирает static/dist и возвращает манифест: исходный путь -> путь с отпечатком."""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for subdir, extension in ASSET_DIRS.items():
+        source_dir = os.path.join(static_dir, subdir)
+        if not os.path.isdir(source_dir):
+            continue
+        os.makedirs(os.path.join(dist_dir, subdir), exist_ok=True)
+        for name in sorted(os.listdir(source_dir)):
+            if not name.endswith(extension):
+                continue
+            with open(os.path.join(source_dir, name), "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            stem, ext = os.path.splitext(name)
+            hashed = f"{subdir}/{stem}.{digest}{ext}"
+            target = os.path.join(dist_dir, hashed)
+            with open(target, "wb") as f:
+                f.write(data)
+            _write_compressed(target, data)
+            manifest[f"{subdir}/{name}"] = hashed
+
+    # index.html ссылается на исходные пути - подменяем на пути с отпечатками
+    with open(os.path.join(static_dir, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for source, hashed in manifest.items():
+        html = html.replace(f"{STATIC_URL}{source}", f"{STATIC_URL}dist/{hashed}")
+    index_path = os.path.join(dist_dir, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    _write_compressed(index_path, html.encode("utf-8"))
+
+    with open(os.path.join(dist_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info("Built %s assets into %s (brotli: %s)", len(manifest), dist_dir, brotli is not None)
+    return manifest
+
+
+def index_url() -> str:
+    """Адрес главной страницы: собранной, если сборка есть."""
+    if os.path.exists(os.path.join(DIST_DIR, "index.html")):
+        return f"{STATIC_URL}dist/index.html"
+    return f"{STATIC_URL}index.html"
+
+
+def _accepted_encodings(scope) -> set:
+    accept = Headers(scope=scope).get("accept-encoding", "")
+    encodings = set()
+    for item in accept.split(","):
+        name, _, params = item.strip().partition(";")
+        # q=0 означает явный отказ от кодировки
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.lower())
+    return encodings
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles, отдающий предсжатые варианты и заголовки кеширования."""
+
+    async def get_response(self, path: str, scope):
+        response = None
+        accepted = _accepted_encodings(scope)
+        for encoding, suffix in ENCODING_SUFFIXES:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is not None and os.path.isfile(full_path):
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["content-encoding"] = encoding
+                content_type = mimetypes.guess_type(path)[0]
+                if content_type:
+                    if content_type.startswith("text/") or content_type == "application/javascript":
+                        content_type += "; charset=utf-8"
+                    response.headers["content-type"] = content_type
+                break
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if FINGERPRINT_RE.search(path):
+            response.headers["cache-control"] = IMMUTABLE_CACHE
+        else:
+            response.headers["cache-control"] = REVALIDATE_CACHE
+        response.headers.add_vary_header("Accept-Encoding")
+        return response
+
+
+class ApiGZipMiddleware:
+    """ASGI middleware: gzip для ответов /api/ больше GZIP_MIN_SIZE байт."""
+
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE, compresslevel: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        # Уровень 6: почти тот же размер, что у 9, при заметно меньшей цене на запрос
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] == "http" and scope["path"].startswith("/api/")
+                and "gzip" in _accepted_encodings(scope)):
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for source, hashed in build_assets().items():
+        print(f"{source} -> dist/{hashed}")
@@ -0,0 +1,160 @@
+"""
+Настройка логирования приложения.
+
+Вызывается один раз при старте процесса (main.py) вместо logging.basicConfig
+в каждом модуле. Записи уходят в очередь и пишутся в stderr фоновым потоком
+QueueListener, поэтому обработчик запроса не ждёт записи в поток вывода.
+
+Переменные окружения:
+    LOG_LEVEL=INFO                    (уровень корневого логгера)
+    LOG_FORMAT=text|json              (по умолчанию text)
+    LOG_LEVELS=api.auth=DEBUG,...     (уровни отдельных логгеров)
+    LOG_SAMPLING=services.picker=0.1  (доля пропускаемых записей ниже WARNING)
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Dict, Optional
+
+from core.tracing import current_trace_id
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Служебные атрибуты LogRecord, которые не надо дублировать в JSON как extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - один JSON-объект в строке, с id трассы текущего запроса."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + ".%03dZ" % record.msecs,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "trace_id":
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю записей ниже WARNING для логгеров из таблицы.
+    Предупреждения и ошибки не отбрасываются никогда.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            # Ищем самый длинный префикс: services.picker покрывает services.picker.*
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который запоминает id трассы в потоке запроса:
+    контекст запроса недоступен в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.trace_id = current_trace_id()
+        # Форматирование сообщения остаётся ленивым: getMessage() вызовет
+        # форматтер уже в фоновом потоке. Аргументы фиксируем строкой только
+        # если в них изменяемые объекты, которые запрос может успеть поменять.
+        if record.args and any(isinstance(arg, (dict, list, set)) for arg in record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # Трейсбек с кадрами нельзя безопасно передавать между потоками
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        name, sep, setting = item.strip().partition("=")
+        if sep and name:
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def configure_logging() -> None:
+    """Настраивает корневой логгер по переменным окружения. Повторный вызов ничего не делает."""
+    global _listener
+    if _listener is not None:
+        return
+
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    log_format = os.environ.get("LOG_FORMAT", "text").lower()
+
+    stream_handler = logging.StreamHandler()
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = _ContextQueueHandler(queue.SimpleQueue())
+    sampling = {name: float(rate) for name, rate in _parse_pairs(os.environ.get("LOG_SAMPLING", "")).items()}
+    if sampling:
+        # Фильтр на стороне запроса: отброшенная запись не попадает в очередь
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name, logger_level in _parse_pairs(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
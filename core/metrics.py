@@ -0,0 +1,357 @@
+"""
+Метрики приложения в формате Prometheus.
+
+Небольшой реестр счётчиков, gauge и гистограмм без внешних зависимостей,
+ASGI middleware для задержек по маршрутам и учёт обращений к БД на запрос.
+Обновление метрики - это поиск в словаре и сложение под блокировкой,
+поэтому их можно держать включёнными постоянно.
+"""
+import time
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Границы корзин по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Границы корзин для числа запросов/соединений к БД на HTTP-запрос
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Базовый класс метрики с метками."""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *values: str):
+        """Возвращает дочернюю метрику для набора значений меток."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _ValueChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self, name: str, labelnames, values) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+    type_name = "counter"
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Значение, которое может расти и уменьшаться."""
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name: str, labelnames, values) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+
+def render_metrics() -> str:
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "flowcado_http_requests_total", "HTTP requests by route, method and status",
+    ("route", "method", "status")
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "flowcado_http_request_duration_seconds", "HTTP request latency by route",
+    ("route", "method")
+)
+HTTP_IN_FLIGHT = Gauge("flowcado_http_requests_in_flight", "HTTP requests being processed")
+
+# Прогрев при старте
+STARTUP_PHASE_SECONDS = Gauge(
+    "flowcado_startup_phase_seconds", "Duration of process warm-up phases", ("phase",)
+)
+STARTUP_READY = Gauge("flowcado_ready", "1 once the process has finished warming up")
+
+# Допуск запросов
+ADMISSION_REJECTIONS = Counter(
+    "flowcado_admission_rejections_total", "Requests shed by admission control by endpoint class and reason",
+    ("endpoint_class", "reason")
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "flowcado_admission_in_flight", "Admitted requests being processed by endpoint class", ("endpoint_class",)
+)
+
+# База данных
+DB_CONNECTIONS_OPENED = Counter("flowcado_db_connections_opened_total", "Database connections opened")
+DB_QUERIES = Counter("flowcado_db_queries_total", "Database queries executed")
+DB_QUERY_DURATION = Histogram("flowcado_db_query_duration_seconds", "Database query latency")
+DB_SLOW_QUERIES = Counter(
+    "flowcado_db_slow_queries_total", "Queries slower than SLOW_QUERY_MS by registry name", ("query",)
+)
+DB_PREPARED_STATEMENTS = Counter(
+    "flowcado_db_prepared_statements_total",
+    "Hot registry queries run as prepared statements on pooled connections by outcome", ("result",)
+)
+DB_READ_ROUTES = Counter(
+    "flowcado_db_read_routes_total", "Read-only blocks by target database and reason for primary",
+    ("target", "reason")
+)
+DB_BREAKER = Counter(
+    "flowcado_db_breaker_total", "Database circuit breaker transitions and rejected calls", ("event",)
+)
+DB_BREAKER_OPEN = Gauge("flowcado_db_breaker_open", "1 while the database circuit breaker is open")
+REQUEST_DB_TIME = Histogram(
+    "flowcado_request_db_seconds", "Time spent in the database per HTTP request", ("route",)
+)
+REQUEST_DB_QUERIES = Histogram(
+    "flowcado_request_db_queries", "Database queries per HTTP request", ("route",),
+    buckets=COUNT_BUCKETS
+)
+REQUEST_DB_CONNECTIONS = Histogram(
+    "flowcado_request_db_connections", "Database connections opened per HTTP request", ("route",),
+    buckets=COUNT_BUCKETS
+)
+
+# Очередь оценки сессий
+SESSION_EVALUATIONS = Counter(
+    "flowcado_session_evaluations_total", "Queued session evaluations by outcome", ("result",)
+)
+SESSION_EVALUATION_LAG = Histogram(
+    "flowcado_session_evaluation_lag_seconds", "Time from finish-session to the applied evaluation"
+)
+
+# Деградированный режим
+DEGRADED_SESSIONS = Counter(
+    "flowcado_degraded_sessions_total", "Sessions served from memory while the database is unavailable by source",
+    ("source",)
+)
+ANSWER_SPOOL = Counter(
+    "flowcado_answer_spool_total", "Answers and session finishes spooled to local disk and replayed by outcome",
+    ("result",)
+)
+
+# Подбор слов
+PICKER_WORDS = Counter(
+    "flowcado_picker_words_total", "Words selected by the picker by category", ("category",)
+)
+PICKER_FALLBACK_TIERS = Counter(
+    "flowcado_picker_fallback_tiers_total", "Picker fallback tiers used by category",
+    ("category", "tier")
+)
+
+
+class RequestDbStats:
+    """Счётчики обращений к БД в рамках одного HTTP-запроса."""
+    __slots__ = ("connections", "queries", "seconds")
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def record_db_connection(seconds: float) -> None:
+    """Учитывает открытие соединения с БД."""
+    DB_CONNECTIONS_OPENED.inc()
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.connections += 1
+        stats.seconds += seconds
+
+
+def record_db_query(seconds: float) -> None:
+    """Учитывает выполненный запрос к БД."""
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(seconds)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += seconds
+
+
+def record_picker_categories(categories_count: Dict[str, int]) -> None:
+    """Учитывает итоговое распределение слов сессии по категориям."""
+    for category, count in categories_count.items():
+        if count:
+            PICKER_WORDS.labels(category).inc(count)
+
+
+_route_paths: Dict[int, Dict[object, str]] = {}
+
+
+def route_template(scope) -> str:
+    """
+    Возвращает шаблон пути маршрута ("/api/words/start-session"), а не сырой путь,
+    чтобы число рядов метрик не зависело от запросов. Вызывать после маршрутизации.
+    """
+    app = scope.get("app")
+    paths = _route_paths.get(id(app))
+    if paths is None:
+        paths = {}
+        for route in getattr(app, "routes", []):
+            endpoint = getattr(route, "endpoint", None) or getattr(route, "app", None)
+            if endpoint is not None:
+                paths[endpoint] = route.path
+        _route_paths[id(app)] = paths
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    return paths.get(endpoint, "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI middleware: задержка, статус и обращения к БД для каждого HTTP-запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestDbStats()
+        token = _request_db_stats.set(stats)
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            _request_db_stats.reset(token)
+
+            route = route_template(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.labels(route, method, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(route, method).observe(elapsed)
+            REQUEST_DB_TIME.labels(route).observe(stats.seconds)
+            REQUEST_DB_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_DB_CONNECTIONS.labels(route).observe(stats.connections)
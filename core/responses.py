@@ -0,0 +1,47 @@
+"""
+Быстрый путь JSON-ответов.
+
+Ответы API собираются на сервере из уже проверенных данных (словари подборщика,
+флаги оценщика). Если вернуть из эндпоинта pydantic-модель, FastAPI проверит её
+ещё раз по response_model, прогонит через jsonable_encoder и только потом через
+json.dumps. fast_response() отдаёт те же поля сразу готовым JSON (orjson, если
+установлен); pydantic-модели остаются для проверки входящих данных и схемы в /docs.
+Отключается переменной окружения FAST_JSON=0 - тогда возвращаются модели, как раньше.
+"""
+import os
+import json
+from typing import Any, Type
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # без orjson - stdlib json в компактном виде
+    orjson = None
+
+FAST_JSON = os.environ.get("FAST_JSON", "1") != "0"
+
+
+def dumps(content: Any) -> bytes:
+    """Сериализует ответ в JSON (UTF-8, без пробелов)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с быстрым кодировщиком."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_response(model: Type[BaseModel], **fields):
+    """
+    Ответ с полями model. Поля должны уже иметь типы модели: в быстром режиме
+    они не проверяются, а сериализуются как есть.
+    """
+    if FAST_JSON:
+        return FastJSONResponse(fields)
+    return model(**fields)
@@ -0,0 +1,170 @@
+"""
+Прогрев процесса при старте приложения (lifespan в main.py).
+
+Раньше пул соединений, кеш словаря и каталог подборщика прогревал только serve.py,
+а при запуске через uvicorn или run.py их загружали первые запросы - со своей
+задержкой. Теперь прогрев - часть запуска приложения, по фазам:
+- pool - пул соединений (DB_POOL_SIZE, все соединения сразу) и проверочный запрос;
+- schema - миграции (db/migrations.py) и возможности схемы (db/schema.py);
+- vocabulary - каталог слов, переводы и пулы неправильных вариантов (db/vocabulary.py);
+- catalog - каталог подборщика по снимку (PICKER_ENGINE=snapshot).
+Время каждой фазы пишется в журнал и в метрику flowcado_startup_phase_seconds{phase}.
+
+uvicorn начинает принимать соединения только после lifespan, так что трафик
+попадает в прогретый процесс. Если база недоступна, фаза и следующие за ней
+повторяются в фоне раз в STARTUP_RETRY_SECONDS, а процесс тем временем отвечает
+как без прогрева (деградированный режим, db/breaker.py). Другие ошибки фазы
+(например, нет прав на миграцию) пишутся в журнал и прогрев продолжается - как
+было при старте раньше. GET /ready (api/health.py) отвечает 200 только после
+прогрева всех фаз, до того - 503; метрика flowcado_ready.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from api.words import DEFAULT_TRANSLATION_LANGUAGE_ID
+from core.metrics import STARTUP_PHASE_SECONDS, STARTUP_READY
+from db import breaker, database, queries, schema, vocabulary
+from db.migrations import apply_migrations
+from models.config import LEVEL_TO_DIFFICULTY
+from services import snapshot_picker
+
+logger = logging.getLogger(__name__)
+
+# Период повтора прогрева, пока база недоступна
+RETRY_SECONDS = float(os.environ.get("STARTUP_RETRY_SECONDS", "5"))
+
+
+def _with_connection(action: Callable) -> None:
+    conn = database.get_db_connection()
+    try:
+        action(conn)
+    finally:
+        database.close_db_connection(conn)
+
+
+def _ping(conn) -> None:
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(queries.PING)
+            cur.fetchone()
+
+
+def _warm_pool() -> None:
+    if database.DB_BACKEND == "postgres" and database.DB_POOL_SIZE > 0:
+        database.init_pool(prewarm=True)
+    _with_connection(_ping)
+
+
+def _detect_schema(conn) -> None:
+    with conn:
+        with conn.cursor() as cur:
+            schema.detect(cur)
+
+
+def _warm_schema() -> None:
+    try:
+        apply_migrations()
+    except Exception as e:
+        if breaker.is_outage(e):
+            raise
+        logger.error("Ошибка применения миграций: %s", e)
+    _with_connection(_detect_schema)
+
+
+def _warm_vocabulary() -> None:
+    if vocabulary.ENABLED:
+        _with_connection(lambda conn: vocabulary.warm(
+            conn, [DEFAULT_TRANSLATION_LANGUAGE_ID], sorted(set(LEVEL_TO_DIFFICULTY.values()))
+        ))
+
+
+def _warm_catalog() -> None:
+    if snapshot_picker.ENABLED:
+        _with_connection(snapshot_picker.load_catalog)
+
+
+# Фазы по порядку: каждой следующей нужна база, проверенная предыдущими
+PHASES: List[Tuple[str, Callable[[], None]]] = [
+    ("pool", _warm_pool),
+    ("schema", _warm_schema),
+    ("vocabulary", _warm_vocabulary),
+    ("catalog", _warm_catalog),
+]
+
+# Фаза -> {"ms": длительность, "status": ok или error}; фаз, которые не завершились, нет
+_phases: Dict[str, Dict[str, object]] = {}
+_ready = False
+_lock = threading.Lock()
+_stopping = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def warm_up() -> bool:
+    """Выполняет незавершённые фазы прогрева; True - процесс прогрет."""
+    global _ready
+    with _lock:
+        started = time.perf_counter()
+        for name, phase in PHASES:
+            if name in _phases:
+                continue
+            phase_started = time.perf_counter()
+            try:
+                phase()
+                status = "ok"
+            except Exception as e:
+                if breaker.is_outage(e):
+                    logger.warning("Warm-up phase %s postponed, database unavailable: %s", name, e)
+                    return False
+                logger.error("Warm-up phase %s failed: %s", name, e)
+                status = "error"
+            seconds = time.perf_counter() - phase_started
+            _phases[name] = {"ms": round(seconds * 1000, 1), "status": status}
+            STARTUP_PHASE_SECONDS.labels(name).set(seconds)
+            logger.info("Warm-up phase %s: %s in %.0f ms", name, status, seconds * 1000)
+        _ready = True
+        STARTUP_READY.set(1)
+    logger.info("Process %s warmed up in %.0f ms", os.getpid(), (time.perf_counter() - started) * 1000)
+    return True
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def status() -> Dict[str, object]:
+    """Состояние прогрева для /ready: готовность и завершённые фазы."""
+    return {"ready": _ready, "phases": dict(_phases)}
+
+
+def _retry_loop() -> None:
+    while not _stopping.wait(RETRY_SECONDS):
+        if breaker.is_open():
+            continue
+        try:
+            if warm_up():
+                return
+        except Exception as e:
+            logger.warning("Warm-up retry failed: %s", e)
+
+
+def start() -> None:
+    """Прогревает процесс; если база недоступна - дожидается её в фоновом потоке."""
+    global _thread
+    if warm_up() or _thread is not None:
+        return
+    _stopping.clear()
+    _thread = threading.Thread(target=_retry_loop, name="warm-up", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Останавливает повтор прогрева."""
+    global _thread
+    if _thread is None:
+        return
+    _stopping.set()
+    _thread.join(timeout)
+    _thread = None
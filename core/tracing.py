@@ -0,0 +1,389 @@
+"""
+Трассировка запросов: спаны, экспорт и заголовок Server-Timing.
+
+Каждый HTTP-запрос получает корневой спан; вложенные спаны создаются в роутерах,
+подборщике слов, онбординге, оценщике сессий и слое БД. Спаны с ключом timing
+суммируются по этому ключу и попадают в заголовок Server-Timing ответа, поэтому
+медленную сессию можно разобрать прямо во вкладке Network браузера.
+
+Экспорт настраивается переменными окружения:
+    TRACING_EXPORTER=file|otlp|none   (по умолчанию none)
+    TRACING_FILE=traces.jsonl         (для file)
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318   (для otlp, OTLP/HTTP JSON)
+    TRACING_SAMPLE_RATE=1.0           (доля экспортируемых трасс)
+"""
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import functools
+import urllib.request
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from core.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "flowcado"
+
+# Порядок стадий в заголовке Server-Timing
+SERVER_TIMING_ORDER = [
+    "onboarding", "recent-rate", "candidates", "fallback", "translations",
+    "evaluate", "db", "db-connect",
+]
+
+
+class Span:
+    """Отрезок работы внутри трассы."""
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "timing", "error", "_token")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str],
+                 timing: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.timing = timing
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self, **attributes) -> None:
+        """Завершает спан; атрибуты можно дописать в момент завершения."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if attributes:
+            self.attributes.update(attributes)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.trace.on_finish(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = repr(exc)
+        self.finish()
+        return False
+
+
+class Trace:
+    """Все спаны одного запроса и суммы для Server-Timing."""
+
+    def __init__(self, trace_id: Optional[str] = None, sampled: bool = True):
+        self.trace_id = trace_id or "%032x" % random.getrandbits(128)
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.timings: Dict[str, float] = {}
+        self.timing_counts: Dict[str, int] = {}
+
+    def on_finish(self, span: Span) -> None:
+        if self.sampled:
+            self.spans.append(span)
+        if span.timing:
+            self.timings[span.timing] = self.timings.get(span.timing, 0.0) + span.duration_ms
+            self.timing_counts[span.timing] = self.timing_counts.get(span.timing, 0) + 1
+
+    def server_timing(self, total_ms: float) -> str:
+        """Формирует значение заголовка Server-Timing."""
+        parts = []
+        names = SERVER_TIMING_ORDER + sorted(set(self.timings) - set(SERVER_TIMING_ORDER))
+        for name in names:
+            if name in self.timings:
+                count = self.timing_counts[name]
+                parts.append(f'{name};dur={self.timings[name]:.1f};desc="{count}x"')
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    """Заглушка для кода, выполняющегося вне HTTP-запроса."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def finish(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_span(name: str, timing: Optional[str] = None, **attributes):
+    """
+    Открывает спан внутри текущей трассы и делает его текущим.
+    Вне запроса возвращает заглушку, поэтому вызывать можно откуда угодно.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    parent = _current_span.get()
+    span = Span(trace, name, parent.span_id if parent else None, timing, attributes)
+    span._token = _current_span.set(span)
+    return span
+
+
+def current_trace_id() -> Optional[str]:
+    """Возвращает id трассы текущего запроса (для связи логов с трассами)."""
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def traced(name: str, timing: Optional[str] = None):
+    """Декоратор: выполняет функцию внутри спана."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(name, timing):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _BatchExporter:
+    """Экспортирует завершённые трассы пачками в фоновом потоке."""
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 512, interval: float = 2.0):
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._interval = interval
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, spans: List[Span]) -> None:
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                # Трассировка не должна тормозить запросы - лишнее отбрасываем
+                return
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = []
+            deadline = time.monotonic() + self._interval
+            while len(batch) < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    span = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if span is None:
+                    # flush() будит поток, чтобы он дописал пачку и завершился
+                    break
+                batch.append(span)
+            if batch:
+                try:
+                    self.export(batch)
+                except Exception as e:
+                    logger.warning("Trace export failed: %s", e)
+
+    def flush(self) -> None:
+        """
+        Синхронно экспортирует всё, что осталось в очереди (при остановке процесса).
+        Фоновый поток сначала дописывает собранную пачку и завершается.
+        """
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(self._interval + 5)
+        batch = []
+        while True:
+            try:
+                span = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if span is not None:
+                batch.append(span)
+        if batch:
+            try:
+                self.export(batch)
+            except Exception as e:
+                logger.warning("Trace export failed: %s", e)
+
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+
+class FileExporter(_BatchExporter):
+    """Пишет спаны в файл, по одному JSON-объекту на строку."""
+
+    def __init__(self, path: str):
+        self.path = path
+        super().__init__()
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps({
+                    "trace_id": span.trace.trace_id,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "start_ns": span.start_ns,
+                    "duration_ms": round(span.duration_ms, 3),
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }, ensure_ascii=False, default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter(_BatchExporter):
+    """Отправляет спаны в OTLP-коллектор по HTTP в JSON-кодировке."""
+
+    def __init__(self, endpoint: str):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        super().__init__()
+
+    def export(self, spans: List[Span]) -> None:
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span.trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                # 2 - SERVER для корневого спана запроса, 1 - INTERNAL
+                "kind": 2 if span.parent_id is None else 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()
+                ],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+            ]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": otlp_spans}],
+        }]}
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload, default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+
+_exporter: Optional[_BatchExporter] = None
+_sample_rate = 1.0
+
+
+def configure_tracing() -> None:
+    """Настраивает экспорт трасс по переменным окружения."""
+    global _exporter, _sample_rate
+    kind = os.environ.get("TRACING_EXPORTER", "none").lower()
+    _sample_rate = float(os.environ.get("TRACING_SAMPLE_RATE", "1.0"))
+
+    if kind == "file":
+        _exporter = FileExporter(os.environ.get("TRACING_FILE", "traces.jsonl"))
+    elif kind == "otlp":
+        _exporter = OtlpExporter(os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"))
+    else:
+        _exporter = None
+    logger.info("Tracing exporter: %s, sample rate: %s", kind, _sample_rate)
+
+
+def shutdown_tracing() -> None:
+    """Дописывает накопленные спаны перед остановкой процесса."""
+    if _exporter is not None:
+        _exporter.flush()
+
+
+def _parse_traceparent(headers) -> Optional[tuple]:
+    """Извлекает trace_id и id родителя из заголовка W3C traceparent."""
+    for key, value in headers:
+        if key == b"traceparent":
+            parts = value.decode("latin-1").split("-")
+            if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                return parts[1], parts[2]
+    return None
+
+
+class TracingMiddleware:
+    """ASGI middleware: корневой спан запроса и заголовок Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = _parse_traceparent(scope.get("headers", []))
+        sampled = _exporter is not None and random.random() < _sample_rate
+        trace = Trace(parent[0] if parent else None, sampled=sampled)
+        trace_token = _current_trace.set(trace)
+
+        root = Span(trace, f"{scope['method']} {scope['path']}", parent[1] if parent else None,
+                    None, {"http.method": scope["method"], "http.target": scope["path"]})
+        root._token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing(root.duration_ms).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            root.error = repr(e)
+            raise
+        finally:
+            route = route_template(scope)
+            root.name = f"{scope['method']} {route}"
+            root.set_attribute("http.route", route)
+            root.finish()
+            _current_trace.reset(trace_token)
+            if sampled and _exporter is not None:
+                _exporter.submit(trace.spans)
@@ -0,0 +1,185 @@
+"""
+Журнал ответов: таблица answer_events, строка на каждый ответ.
+
+user_progress - сводка по слову (счётчики, last_answer_wrong), и по ней нельзя
+восстановить ни последние ответы, ни состав прошлых сессий: recent_success_rate
+усреднял флаг последнего ответа по 20 недавно виденным словам, а итоги сессии
+собирались по session_id последнего ответа на слово. Журнал только дописывается;
+из него считаются успеваемость последних ответов (progress.recent_success_rate,
+снимок подборщика) и итоги последних сессий (evaluator.inputs,
+reevaluation.recent_sessions). Успеваемость учеников без событий считается по
+user_progress, как раньше, а сессии до журнала, которых не хватает до трёх последних,
+оценка дополняет из user_progress.
+
+Запись: событие вставляется в транзакции записи прогресса (db.database.update_user_progress)
+подготовленным запросом, поэтому событие есть в журнале ровно тогда, когда учтён и
+ответ в user_progress, - и в любом воркере, как только ответ подтверждён. Оценке
+сессии не нужно дожидаться записи: итоги сессии уже в журнале. Раньше события
+копились в буфере процесса и писались пачками, но тогда оценка не могла убедиться,
+что в журнале все ответы сессии (буферы других воркеров, неудачная запись, переполнение).
+
+Хранение: в Postgres таблица секционирована по месяцам answered_at
+(answer_events_ГГГГ_ММ). maintain() создаёт секции на ANSWER_EVENTS_MONTHS_AHEAD
+месяцев вперёд и удаляет целиком секции старше ANSWER_EVENTS_RETENTION_MONTHS
+(0 - хранить всё) - без DELETE и последующего вакуума. Он выполняется при старте,
+раз в час в фоновом потоке и вручную. В SQLite таблица обычная, старые события
+удаляются DELETE.
+
+Запуск вручную:
+    python -m db.answer_events
+"""
+import os
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from db import database, queries
+
+logger = logging.getLogger(__name__)
+
+# На сколько месяцев вперёд держать готовые секции
+MONTHS_AHEAD = int(os.environ.get("ANSWER_EVENTS_MONTHS_AHEAD", "2"))
+
+# Сколько месяцев хранить события (0 - не удалять)
+RETENTION_MONTHS = int(os.environ.get("ANSWER_EVENTS_RETENTION_MONTHS", "0"))
+
+# Период обслуживания секций в фоновом потоке
+_MAINTAIN_SECONDS = 3600
+
+_PARTITION_PREFIX = "answer_events_"
+
+_stopping = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def month_of(moment) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{_PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def ensure_partitions(cur, first: date, last: date) -> List[str]:
+    """Создаёт недостающие месячные секции с first по last включительно; возвращает созданные."""
+    cur.execute(queries.ANSWER_EVENTS_PARTITIONS)
+    existing = {row['name'] for row in cur.fetchall()}
+    created = []
+    month = month_of(first)
+    while month <= month_of(last):
+        name = partition_name(month)
+        if name not in existing:
+            # Имя секции составлено из даты, подставлять его в текст безопасно
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF answer_events FOR VALUES FROM (%s) TO (%s)",
+                (str(month), str(add_months(month, 1)))
+            )
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def drop_partitions(cur, before: date) -> List[str]:
+    """Удаляет секции месяцев раньше before; возвращает удалённые."""
+    cur.execute(queries.ANSWER_EVENTS_PARTITIONS)
+    dropped = []
+    for row in cur.fetchall():
+        name = row['name']
+        if name.startswith(_PARTITION_PREFIX) and name < partition_name(before):
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+    return dropped
+
+
+def maintain(now: Optional[datetime] = None) -> Dict[str, List[str]]:
+    """Секции на MONTHS_AHEAD месяцев вперёд и удаление событий старше RETENTION_MONTHS."""
+    current = month_of(now or datetime.now())
+    result: Dict[str, List[str]] = {"created": [], "dropped": []}
+    conn = database.get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                if database.DB_BACKEND == "sqlite":
+                    if RETENTION_MONTHS:
+                        cur.execute(queries.ANSWER_EVENTS_PRUNE, (add_months(current, -RETENTION_MONTHS),))
+                    return result
+                result["created"] = ensure_partitions(cur, current, add_months(current, MONTHS_AHEAD))
+                if RETENTION_MONTHS:
+                    result["dropped"] = drop_partitions(cur, add_months(current, -RETENTION_MONTHS))
+    finally:
+        database.close_db_connection(conn)
+    for name in result["created"]:
+        logger.info("Created answer_events partition %s", name)
+    for name in result["dropped"]:
+        logger.info("Dropped answer_events partition %s", name)
+    return result
+
+
+def record(cur, user_language_id: int, word_id: int, is_correct: bool, session_id: Optional[str],
+           answered_at: datetime) -> None:
+    """Дописывает ответ в журнал в транзакции вызывающего (записи прогресса)."""
+    cur.execute(queries.ANSWER_EVENTS_INSERT, (user_language_id, word_id, session_id, is_correct, answered_at))
+
+
+def ensure_month(moment: datetime) -> List[str]:
+    """
+    Создаёт секцию месяца moment, если её нет: обслуживание отстало от часов, и вставка
+    события отклонена (CheckViolation). Возвращает созданные секции.
+    """
+    if database.DB_BACKEND == "sqlite":
+        return []
+    conn = database.get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                created = ensure_partitions(cur, moment, moment)
+    finally:
+        database.close_db_connection(conn)
+    for name in created:
+        logger.info("Created answer_events partition %s", name)
+    return created
+
+
+def _maintain_loop() -> None:
+    while not _stopping.wait(_MAINTAIN_SECONDS):
+        try:
+            maintain()
+        except Exception as e:
+            logger.warning("Answer events maintenance failed: %s", e)
+
+
+def start() -> None:
+    """Обслуживает секции и запускает их ежечасное обслуживание (при старте приложения)."""
+    global _thread
+    try:
+        maintain()
+    except Exception as e:
+        logger.warning("Answer events maintenance failed: %s", e)
+    if _thread is not None:
+        return
+    _stopping.clear()
+    _thread = threading.Thread(target=_maintain_loop, name="answer-events", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Останавливает поток обслуживания секций."""
+    global _thread
+    if _thread is None:
+        return
+    _stopping.set()
+    _thread.join(timeout)
+    _thread = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    result = maintain()
+    print("Created:", ", ".join(result["created"]) or "nothing")
+    print("Dropped:", ", ".join(result["dropped"]) or "nothing")
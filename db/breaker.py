@@ -0,0 +1,130 @@
+"""
+Автомат защиты базы (circuit breaker) для соединений Postgres.
+
+Когда база недоступна или не успевает, каждый запрос ждёт таймаута соединения или
+запроса и затем повторяет попытку - так сотни запросов добивают базу, которая
+пытается подняться. После DB_BREAKER_FAILURES ошибок доступности подряд (соединение,
+разрыв, отмена по statement_timeout) автомат размыкается: DB_BREAKER_RESET_SECONDS
+get_db_connection() сразу бросает DatabaseUnavailable, не обращаясь к базе. Потом
+пропускается один пробный вызов: успешный запрос замыкает автомат, ошибка снова
+размыкает его на тот же срок.
+
+Ошибки данных, конфликты транзакций (deadlock, serialization failure) и истёкшее
+ожидание блокировки (lock_timeout) доступность не характеризуют и не учитываются, как и ошибки реплик (db/routing.py). Пока автомат
+разомкнут, запросы обслуживаются в деградированном режиме: сессии - из памяти
+(services/degraded_picker.py), ответы - через очередь на диске (services/answer_spool.py).
+
+Состояние - на процесс. DB_BREAKER=0 - выключить. Метрики: flowcado_db_breaker_total
+{event} (opened, closed, rejected) и flowcado_db_breaker_open.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Optional
+
+import psycopg2
+from psycopg2.errors import LockNotAvailable
+from psycopg2.extensions import TransactionRollbackError
+
+from core.metrics import DB_BREAKER, DB_BREAKER_OPEN
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("DB_BREAKER", "1") != "0"
+
+# Ошибок доступности подряд, после которых автомат размыкается
+FAILURES = int(os.environ.get("DB_BREAKER_FAILURES", "5"))
+
+# Сколько автомат разомкнут до пробного вызова (и сколько ждать результата пробы)
+RESET_SECONDS = float(os.environ.get("DB_BREAKER_RESET_SECONDS", "5"))
+
+
+class DatabaseUnavailable(psycopg2.OperationalError):
+    """База недоступна: автомат разомкнут, соединение не открывалось."""
+
+
+_failures = 0
+# Момент размыкания (time.monotonic); None - автомат замкнут
+_opened_at: Optional[float] = None
+# Момент начала пробного вызова; None - проба не идёт
+_probe_at: Optional[float] = None
+_lock = threading.Lock()
+
+
+def is_outage(error: BaseException) -> bool:
+    """Ошибка говорит о недоступности базы (а не о запросе или данных)."""
+    return (
+        isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        and not isinstance(error, (TransactionRollbackError, LockNotAvailable))
+    )
+
+
+def is_open() -> bool:
+    """Автомат разомкнут и пробный вызов пока не положен."""
+    opened_at = _opened_at
+    if opened_at is None or not ENABLED:
+        return False
+    now = time.monotonic()
+    probe_at = _probe_at
+    return now - opened_at < RESET_SECONDS or (probe_at is not None and now - probe_at < RESET_SECONDS)
+
+
+def check() -> None:
+    """Пропускает обращение к базе или бросает DatabaseUnavailable, пока автомат разомкнут."""
+    global _probe_at
+    if _opened_at is None or not ENABLED:
+        return
+    with _lock:
+        if _opened_at is None:
+            return
+        now = time.monotonic()
+        probing = _probe_at is not None and now - _probe_at < RESET_SECONDS
+        if now - _opened_at >= RESET_SECONDS and not probing:
+            # Пробный вызов; его результат замкнёт или снова разомкнёт автомат
+            _probe_at = now
+            return
+    DB_BREAKER.labels("rejected").inc()
+    raise DatabaseUnavailable("database circuit breaker is open")
+
+
+def record_success() -> None:
+    """Успешный запрос к базе: сбрасывает счётчик ошибок и замыкает автомат."""
+    global _failures, _opened_at, _probe_at
+    if not _failures and _opened_at is None:
+        return
+    with _lock:
+        closed = _opened_at is not None
+        _failures = 0
+        _opened_at = _probe_at = None
+    if closed:
+        logger.warning("Database circuit breaker closed")
+        DB_BREAKER.labels("closed").inc()
+        DB_BREAKER_OPEN.set(0)
+
+
+def record_failure(error: BaseException) -> None:
+    """Ошибка доступности базы; после FAILURES подряд (или на пробе) размыкает автомат."""
+    global _failures, _opened_at, _probe_at
+    if not ENABLED:
+        return
+    with _lock:
+        _failures += 1
+        if _opened_at is None and _failures < FAILURES:
+            return
+        reopened = _opened_at is not None
+        _opened_at = time.monotonic()
+        _probe_at = None
+    if not reopened:
+        logger.error("Database circuit breaker opened after %s failures: %s", _failures, error)
+        DB_BREAKER.labels("opened").inc()
+        DB_BREAKER_OPEN.set(1)
+
+
+def reset() -> None:
+    """Замыкает автомат и сбрасывает счётчик (тесты, ручное восстановление)."""
+    global _failures, _opened_at, _probe_at
+    with _lock:
+        _failures = 0
+        _opened_at = _probe_at = None
+    DB_BREAKER_OPEN.set(0)
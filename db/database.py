@@ -1,12 +1,21 @@
 import os
+import time
 import logging
+import threading
+from collections import OrderedDict
 import psycopg2
+import psycopg2.errors
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, cursor as _cursor
 from psycopg2.extras import RealDictCursor
-from typing import Dict, List, Optional, Any
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+from core.metrics import DB_READ_ROUTES, DB_SLOW_QUERIES, record_db_connection, record_db_query
+from core.tracing import start_span, traced
+from db import answer_events, breaker, prepared, queries, routing, schema, seen_words, sqlite_backend, vocabulary
+from models.schedule import next_review_at
+
 logger = logging.getLogger(__name__)
 
 # Параметры подключения к базе данных из оригинального приложения
@@ -21,19 +30,251 @@ DB_PARAMS = {
 # Строка подключения
 DATABASE_URL = os.environ.get("DATABASE_URL", f"postgresql://{DB_PARAMS['user']}:{DB_PARAMS['password']}@{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['dbname']}")
 
+# Бэкенд хранилища: postgres (по умолчанию) или sqlite - встроенная база в файле,
+# для небольших инсталляций на одном узле и быстрых локальных прогонов без сервера БД
+DB_BACKEND = os.environ.get("DB_BACKEND", "postgres").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "flowcado.db")
+
+# Таймауты Postgres: соединения (с) и запроса (мс, 0 - настройка сервера). По ним медленная
+# или недоступная база становится ошибкой, которую замечает автомат защиты (db/breaker.py)
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+_TIMEOUTS: Dict[str, Any] = {"connect_timeout": DB_CONNECT_TIMEOUT}
+if DB_STATEMENT_TIMEOUT_MS:
+    _TIMEOUTS["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+# Размер пула соединений Postgres на процесс; 0 - соединение на каждый вызов, как раньше
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "0"))
+
+# Порог журнала медленных запросов (мс); 0 - журнал выключен
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "500"))
+
+# Отдельный логгер, чтобы медленные запросы можно было направить в свой файл
+slow_query_logger = logging.getLogger("db.slow_queries")
+
+class _InstrumentedMixin:
+    """Учёт числа и времени запросов курсора в метриках и трассах."""
+
+    def execute(self, query, vars=None):
+        name = queries.query_name(query)
+        span = start_span("db.query", timing="db", **{"db.statement": name or _statement_summary(query)})
+        # Горячий запрос на соединении пула выполняется подготовленным (db/prepared.py)
+        statement = prepared.rewrite(self.connection, name, query, vars)
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = super().execute(statement or query, vars)
+            succeeded = True
+            return result
+        except Exception as e:
+            if breaker.is_outage(e) and not routing.is_replica(self.connection):
+                breaker.record_failure(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            record_db_query(elapsed)
+            span.finish()
+            if succeeded:
+                breaker.record_success()
+            if statement is not None:
+                if succeeded:
+                    prepared.executed(self.connection, name)
+                else:
+                    prepared.failed(self.connection)
+            if succeeded and SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+                _log_slow_query(self.connection, name, query, vars, elapsed)
+
+    def executemany(self, query, vars_list):
+        name = queries.query_name(query)
+        span = start_span("db.query", timing="db", **{"db.statement": name or _statement_summary(query)})
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_db_query(time.perf_counter() - started)
+            span.finish()
+
+class InstrumentedCursor(_InstrumentedMixin, RealDictCursor):
+    """RealDictCursor, учитывающий число и время запросов в метриках и трассах."""
+
+class InstrumentedTupleCursor(_InstrumentedMixin, _cursor):
+    """Курсор кортежей для типов строк db/rows.py, с тем же учётом запросов."""
+
+def tuple_cursor(conn):
+    """Курсор соединения conn, возвращающий строки кортежами (см. db/rows.py)."""
+    if isinstance(conn, sqlite_backend.SqliteConnection):
+        return conn.cursor(tuples=True)
+    return conn.cursor(cursor_factory=InstrumentedTupleCursor)
+
+def _statement_summary(query) -> str:
+    """Сжатый текст SQL-запроса для атрибутов спана."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    return " ".join(str(query).split())[:120]
+
+def _log_slow_query(conn, name: Optional[str], query, vars, elapsed: float) -> None:
+    """Пишет медленный запрос в журнал вместе с его планом."""
+    DB_SLOW_QUERIES.labels(name or "adhoc").inc()
+    plan = "plan not captured"
+
+    # EXPLAIN без ANALYZE не выполняет запрос повторно; DDL и прочее не объясняем
+    statement = str(query).lstrip().split(None, 1)[0].upper() if query else ""
+    if statement in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Точка сохранения защищает транзакцию вызывающего кода от ошибки EXPLAIN
+                cur.execute("SAVEPOINT slow_query_explain")
+                try:
+                    cur.execute("EXPLAIN " + query, vars)
+                    plan = "\n".join(row["QUERY PLAN"] for row in cur.fetchall())
+                finally:
+                    cur.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        except Exception as e:
+            plan = f"plan not captured: {e}"
+
+    slow_query_logger.warning(
+        "Slow query %s: %.1f ms, params %.200r\n%s",
+        name or _statement_summary(query), elapsed * 1000, vars, plan
+    )
+
+class _InstrumentedPool(ThreadedConnectionPool):
+    """
+    Пул, учитывающий открытие новых физических соединений в метриках. Его
+    соединения живут долго и готовят горячие запросы (db/prepared.py).
+    """
+
+    def _connect(self, key=None):
+        started = time.perf_counter()
+        conn = super()._connect(key)
+        record_db_connection(time.perf_counter() - started)
+        prepared.attach(conn)
+        return conn
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# Пулы реплик (db/routing.py): DSN -> пул того же размера, что у основной базы
+_replica_pools: Dict[str, ThreadedConnectionPool] = {}
+
+def _replica_params(dsn: str) -> dict:
+    return {
+        "dsn": dsn,
+        "options": routing.REPLICA_OPTIONS,
+        "connect_timeout": DB_CONNECT_TIMEOUT,
+        "connection_factory": routing.ReplicaConnection,
+        "cursor_factory": InstrumentedCursor,
+    }
+
+def init_pool(size: Optional[int] = None, prewarm: bool = False) -> None:
+    """Создаёт пулы соединений (основной базы и реплик); с prewarm сразу открывает все size соединений."""
+    global _pool
+    size = size or DB_POOL_SIZE
+    with _pool_lock:
+        if _pool is None and size > 0:
+            _pool = _InstrumentedPool(
+                size if prewarm else 1, size, **DB_PARAMS, **_TIMEOUTS,
+                connection_factory=prepared.PreparedConnection, cursor_factory=InstrumentedCursor
+            )
+            for dsn in routing.REPLICA_DSNS:
+                try:
+                    _replica_pools[dsn] = _InstrumentedPool(size if prewarm else 1, size, **_replica_params(dsn))
+                except psycopg2.Error as e:
+                    # Реплика недоступна при старте - её чтения пойдут отдельными соединениями
+                    logger.warning("Replica pool not created: %s", e)
+            logger.info("Connection pool ready: %s connections max, %s replica pool(s)", size, len(_replica_pools))
+
+def close_pool() -> None:
+    """Закрывает все соединения пулов (при остановке воркера)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        for pool in _replica_pools.values():
+            pool.closeall()
+        _replica_pools.clear()
+
+def configure_backend(backend: str, sqlite_path: Optional[str] = None) -> None:
+    """Переключает бэкенд хранилища (для бенчмарков; в приложении задаётся через DB_BACKEND)."""
+    global DB_BACKEND, SQLITE_PATH
+    if backend not in ("postgres", "sqlite"):
+        raise ValueError(f"Unknown storage backend: {backend}")
+    DB_BACKEND = backend
+    if sqlite_path:
+        SQLITE_PATH = sqlite_path
+    # Возможности схемы у другой базы могут быть другими
+    schema.clear()
+
+def _get_replica_connection(dsn: str):
+    """Соединение с репликой dsn: из её пула или новое."""
+    pool = _replica_pools.get(dsn)
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.getconn()
+        except PoolError:
+            pass
+    if conn is None:
+        started = time.perf_counter()
+        conn = psycopg2.connect(**_replica_params(dsn))
+        record_db_connection(time.perf_counter() - started)
+    conn.replica_dsn = dsn
+    return conn
+
 def get_db_connection():
-    """Возвращает соединение с базой данных."""
+    """
+    Возвращает соединение с базой данных выбранного бэкенда. Внутри
+    routing.read_only() - соединение с репликой, если она выбрана для блока.
+    """
+    if DB_BACKEND == "sqlite":
+        return sqlite_backend.connect(SQLITE_PATH)
+    # Пока автомат защиты разомкнут, база не получает даже попыток соединения
+    breaker.check()
     try:
-        conn = psycopg2.connect(**DB_PARAMS, cursor_factory=RealDictCursor)
+        with start_span("db.connect", timing="db-connect"):
+            if _pool is None and DB_POOL_SIZE > 0:
+                init_pool()
+            replica_dsn = routing.current_replica()
+            if replica_dsn is not None:
+                try:
+                    return _get_replica_connection(replica_dsn)
+                except psycopg2.Error as e:
+                    # Реплика недоступна - чтение с основной базы надёжнее, чем ошибка запроса
+                    logger.warning("Replica unavailable, reading from primary: %s", e)
+                    DB_READ_ROUTES.labels("primary", "replica_error").inc()
+                    routing.mark_unavailable(replica_dsn)
+            if _pool is not None:
+                try:
+                    return _pool.getconn()
+                except PoolError:
+                    # Пул исчерпан - не ждём, открываем обычное соединение
+                    pass
+            started = time.perf_counter()
+            conn = psycopg2.connect(**DB_PARAMS, **_TIMEOUTS, cursor_factory=InstrumentedCursor)
+            record_db_connection(time.perf_counter() - started)
         return conn
     except Exception as e:
-        logger.error(f"Ошибка подключения к базе данных: {e}")
+        if breaker.is_outage(e):
+            breaker.record_failure(e)
+        logger.error("Ошибка подключения к базе данных: %s", e)
         raise
 
 def close_db_connection(conn):
-    """Закрывает соединение с БД."""
-    if conn:
-        conn.close()
+    """Возвращает соединение в пул или закрывает его."""
+    if not conn:
+        return
+    pool = _replica_pools.get(conn.replica_dsn) if routing.is_replica(conn) else _pool
+    if pool is not None:
+        try:
+            if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                # Незавершённая транзакция не должна достаться следующему запросу
+                conn.rollback()
+            pool.putconn(conn, close=bool(conn.closed))
+            return
+        except PoolError:
+            # Соединение открыто в обход пула
+            pass
+    conn.close()
 
 def get_db_session():
     """Генератор для сессии БД с автоматическим закрытием соединения."""
@@ -45,55 +286,63 @@ def get_db_session():
         if conn:
             close_db_connection(conn)
 
+# Последние известные связи ученик-язык: (user_id, target_language_id) -> (id, уровень).
+# По ним деградированный режим (services/degraded_picker.py) узнаёт ученика без базы
+_LEARNERS_CACHE_SIZE = 10000
+_learners: "OrderedDict[Tuple[int, int], Tuple[int, str]]" = OrderedDict()
+_learners_lock = threading.Lock()
+
+def _remember_learner(user_id: int, target_language_id: int, user_language_id: int, level: str) -> None:
+    with _learners_lock:
+        _learners[(user_id, target_language_id)] = (user_language_id, level)
+        _learners.move_to_end((user_id, target_language_id))
+        while len(_learners) > _LEARNERS_CACHE_SIZE:
+            _learners.popitem(last=False)
+
+def last_known_user_language(user_id: int, target_language_id: int) -> Optional[Tuple[int, str]]:
+    """Связь ученик-язык (id, уровень) по последнему обращению в этом процессе или None."""
+    with _learners_lock:
+        return _learners.get((user_id, target_language_id))
+
 # Функции для работы с пользователями
 def get_or_create_user(username: str) -> int:
     """Возвращает ID существующего пользователя или создает нового."""
+    conn = None
     try:
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
                 # Создаём или получаем существующего пользователя
-                cur.execute("""
-                    INSERT INTO users (username, base_language_id, created_at)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (username) DO UPDATE SET username = EXCLUDED.username
-                    RETURNING id
-                """, (username, 2, datetime.now()))  # base_language_id=2 (русский)
+                cur.execute(queries.USER_UPSERT, (username, 2, datetime.now()))  # base_language_id=2 (русский)
                 user_id = cur.fetchone()['id']
                 return user_id
     except Exception as e:
-        logger.error(f"Ошибка получения/создания пользователя: {e}")
+        logger.error("Ошибка получения/создания пользователя: %s", e)
         raise
     finally:
         if conn:
             close_db_connection(conn)
 
+@traced("db.get_or_create_user_language")
 def get_or_create_user_language(user_id: int, target_language_id: int) -> tuple:
     """Возвращает ID связи пользователь-язык и уровень."""
+    conn = None
     try:
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
                 # Ищем связь
-                cur.execute("""
-                    SELECT id, level FROM user_languages
-                    WHERE user_id = %s AND target_language_id = %s AND is_active = TRUE
-                """, (user_id, target_language_id))
+                cur.execute(queries.USER_LANGUAGE_GET, (user_id, target_language_id))
                 result = cur.fetchone()
 
-                if result:
-                    return result['id'], result['level']
-
-                # Создаем новую связь с начальным уровнем A2
-                cur.execute("""
-                    INSERT INTO user_languages (user_id, target_language_id, level, is_active, started_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id, level
-                """, (user_id, target_language_id, 'A2', True, datetime.now()))
-                result = cur.fetchone()
-                return result['id'], result['level']
+                if not result:
+                    # Создаем новую связь с начальным уровнем A2
+                    cur.execute(queries.USER_LANGUAGE_INSERT, (user_id, target_language_id, 'A2', True, datetime.now()))
+                    result = cur.fetchone()
+        _remember_learner(user_id, target_language_id, result['id'], result['level'])
+        return result['id'], result['level']
     except Exception as e:
-        logger.error(f"Ошибка получения/создания user_language: {e}")
+        logger.error("Ошибка получения/создания user_language: %s", e)
         raise
     finally:
         if conn:
@@ -101,31 +350,46 @@ def get_or_create_user_language(user_id: int, target_language_id: int) -> tuple:
 
 def update_user_last_active(user_id: int) -> None:
     """Обновляет время последней активности пользователя."""
+    conn = None
     try:
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE users SET last_active = %s WHERE id = %s
-                """, (datetime.now(), user_id))
+                cur.execute(queries.USER_TOUCH, (datetime.now(), user_id))
     except Exception as e:
-        logger.error(f"Ошибка обновления last_active: {e}")
+        logger.error("Ошибка обновления last_active: %s", e)
         raise
     finally:
         if conn:
             close_db_connection(conn)
 
-def update_user_progress(user_language_id: int, word_id: int, is_correct: bool, session_id: str) -> None:
-    """Обновляет прогресс пользователя для заданного слова."""
+@traced("db.update_user_progress")
+def update_user_progress(user_language_id: int, word_id: int, is_correct: bool, session_id: str,
+                         answered_at: Optional[datetime] = None) -> None:
+    """
+    Обновляет прогресс пользователя для заданного слова и дописывает ответ в журнал
+    ответов (db/answer_events.py) той же транзакцией. answered_at - время ответа,
+    если он записывается позже (очередь ответов на диске); по умолчанию - сейчас.
+    """
+    now = answered_at or datetime.now()
+    try:
+        _write_progress(user_language_id, word_id, is_correct, session_id, now)
+    except psycopg2.errors.CheckViolation:
+        # Нет секции журнала для месяца ответа - создаём её и повторяем транзакцию
+        if not answer_events.ensure_month(now):
+            raise
+        _write_progress(user_language_id, word_id, is_correct, session_id, now)
+
+def _write_progress(user_language_id: int, word_id: int, is_correct: bool, session_id: str,
+                    now: datetime) -> None:
+    seen = None
+    conn = None
     try:
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
                 # Проверяем наличие записи
-                cur.execute("""
-                    SELECT repeats, successes FROM user_progress
-                    WHERE user_language_id = %s AND word_id = %s
-                """, (user_language_id, word_id))
+                cur.execute(queries.PROGRESS_GET, (user_language_id, word_id))
                 result = cur.fetchone()
 
                 if result:
@@ -134,18 +398,10 @@ def update_user_progress(user_language_id: int, word_id: int, is_correct: bool,
                     successes = result['successes'] + (1 if is_correct else 0)
                     success_rate = successes / repeats
 
-                    cur.execute("""
-                        UPDATE user_progress
-                        SET repeats = %s,
-                            successes = %s,
-                            success_rate = %s,
-                            last_seen = %s,
-                            last_answer_wrong = %s,
-                            session_id = %s
-                        WHERE user_language_id = %s AND word_id = %s
-                    """, (
+                    cur.execute(queries.PROGRESS_UPDATE, (
                         repeats, successes, success_rate,
-                        datetime.now(), not is_correct, session_id,
+                        now, not is_correct, session_id,
+                        next_review_at(repeats, successes, not is_correct, now),
                         user_language_id, word_id
                     ))
                 else:
@@ -154,87 +410,114 @@ def update_user_progress(user_language_id: int, word_id: int, is_correct: bool,
                     repeats = 1
                     success_rate = successes / repeats
 
-                    cur.execute("""
-                        INSERT INTO user_progress
-                        (user_language_id, word_id, repeats, successes, success_rate,
-                         last_seen, last_answer_wrong, session_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
+                    cur.execute(queries.PROGRESS_INSERT, (
                         user_language_id, word_id, repeats, successes, success_rate,
-                        datetime.now(), not is_correct, session_id
+                        now, not is_correct, session_id,
+                        next_review_at(repeats, successes, not is_correct, now)
                     ))
+                    # Первый ответ на слово - отмечаем его в карте виденных слов
+                    seen = seen_words.mark_seen(cur, user_language_id, word_id)
+                answer_events.record(cur, user_language_id, word_id, is_correct, session_id, now)
+        if seen:
+            seen_words.remember(user_language_id, *seen)
+        routing.note_write(user_language_id)
     except Exception as e:
-        logger.error(f"Ошибка обновления прогресса пользователя: {e}")
+        logger.error("Ошибка обновления прогресса пользователя: %s", e)
         raise
     finally:
         if conn:
             close_db_connection(conn)
 
+@traced("db.get_recent_success_rate")
 def get_recent_success_rate(user_language_id: int, num_answers: int = 20) -> float:
     """Возвращает среднюю успеваемость за последние num_answers ответов."""
+    conn = None
     try:
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT AVG(CASE WHEN last_answer_wrong THEN 0 ELSE 1 END) * 100 as avg_success
-                    FROM (
-                        SELECT last_answer_wrong
-                        FROM user_progress
-                        WHERE user_language_id = %s
-                        ORDER BY last_seen DESC
-                        LIMIT %s
-                    ) as recent_answers
-                """, (user_language_id, num_answers))
+                cur.execute(queries.RECENT_SUCCESS_RATE, (user_language_id, num_answers, user_language_id, num_answers))
                 result = cur.fetchone()
                 return result['avg_success'] if result and result['avg_success'] is not None else 50.0
     except Exception as e:
-        logger.error(f"Ошибка расчета recent_success_rate: {e}")
+        logger.error("Ошибка расчета recent_success_rate: %s", e)
         return 50.0  # Значение по умолчанию
     finally:
         if conn:
             close_db_connection(conn)
 
 # Функции для работы со словами и переводами
+@traced("db.get_word_translation")
 def get_word_translation(word_id: int, translation_language_id: int = 2) -> str:
     """Возвращает перевод слова на указанный язык."""
+    if vocabulary.ENABLED:
+        cached = vocabulary.get_translation(word_id, translation_language_id)
+        if cached is not None:
+            return cached
+    conn = None
     try:
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT translation FROM word_senses
-                    WHERE word_id = %s AND language_id = %s
-                    LIMIT 1
-                """, (word_id, translation_language_id))
+                cur.execute(queries.WORD_TRANSLATION, (word_id, translation_language_id))
                 result = cur.fetchone()
+                if result and vocabulary.ENABLED:
+                    vocabulary.put_translation(word_id, translation_language_id, result['translation'])
                 return result['translation'] if result else ""
     except Exception as e:
-        logger.error(f"Ошибка получения перевода слова: {e}")
+        logger.error("Ошибка получения перевода слова: %s", e)
         return ""
     finally:
         if conn:
             close_db_connection(conn)
 
+@traced("db.get_word_translations")
+def get_word_translations(word_ids: List[int], translation_language_id: int = 2) -> Dict[int, str]:
+    """Переводы сразу для многих слов: из кеша словаря, недостающие - одним запросом."""
+    translations = {}
+    missing = []
+    for word_id in word_ids:
+        cached = vocabulary.get_translation(word_id, translation_language_id) if vocabulary.ENABLED else None
+        if cached is not None:
+            translations[word_id] = cached
+        else:
+            missing.append(word_id)
+    if not missing:
+        return translations
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(queries.WORD_TRANSLATIONS_MANY, (missing, translation_language_id))
+                for row in cur.fetchall():
+                    translations[row['word_id']] = row['translation']
+                    if vocabulary.ENABLED:
+                        vocabulary.put_translation(row['word_id'], translation_language_id, row['translation'])
+    except Exception as e:
+        logger.error("Ошибка получения переводов слов: %s", e)
+    finally:
+        if conn:
+            close_db_connection(conn)
+    return translations
+
+@traced("db.get_wrong_translation")
 def get_wrong_translation(correct_word_id: int, difficulty: int, translation_language_id: int = 2, count: int = 3) -> List[str]:
     """Возвращает список из count неправильных переводов подходящего уровня сложности."""
+    conn = None
     try:
+        if vocabulary.ENABLED:
+            if not vocabulary.has_distractor_pool(translation_language_id, difficulty):
+                conn = get_db_connection()
+                vocabulary.load_distractor_pool(conn, translation_language_id, difficulty)
+            return vocabulary.sample_distractors(translation_language_id, difficulty, correct_word_id, count)
         conn = get_db_connection()
         with conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT ws.translation
-                    FROM word_senses ws
-                    JOIN words w ON ws.word_id = w.id
-                    WHERE ws.language_id = %s
-                    AND w.difficulty = %s
-                    AND w.id != %s
-                    ORDER BY RANDOM()
-                    LIMIT %s
-                """, (translation_language_id, difficulty, correct_word_id, count))
+                cur.execute(queries.WRONG_TRANSLATIONS, (translation_language_id, difficulty, correct_word_id, count))
                 return [row['translation'] for row in cur.fetchall()]
     except Exception as e:
-        logger.error(f"Ошибка получения неправильных переводов: {e}")
+        logger.error("Ошибка получения неправильных переводов: %s", e)
         return []
     finally:
         if conn:
@@ -0,0 +1,149 @@
+"""
+Идемпотентные миграции схемы.
+
+База приложения создаётся не из этого репозитория, поэтому новые колонки и
+индексы догоняются при старте (прогрев, core/startup.py) функцией apply_migrations(). Каждая
+миграция сначала проверяет схему и пропускается, если уже применена, так что
+повторный запуск ничего не меняет. Шаги одной миграции идут в одной транзакции;
+ALTER TABLE берёт блокировку таблицы, поэтому воркеры, стартующие одновременно,
+применяют миграцию по очереди, а следующие видят её уже применённой.
+
+Запуск вручную:
+    python -m db.migrations
+"""
+import time
+import logging
+from typing import Callable, List, Tuple
+
+from datetime import datetime
+
+from db import answer_events, database, queries
+from db.database import get_db_connection, close_db_connection
+from models.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _backfill_params() -> dict:
+    return {
+        "weak": CONFIG["WEAK_SUCCESS_THRESHOLD"],
+        "review": CONFIG["REVIEW_SUCCESS_THRESHOLD"],
+        "medium_successes": CONFIG["REVIEW_MEDIUM_MIN_SUCCESSES"],
+        "long_successes": CONFIG["REVIEW_LONG_MIN_SUCCESSES"],
+        "quarantine_minutes": CONFIG["QUARANTINE_MINUTES"],
+        "short_days": CONFIG["LAST_SEEN_DAYS_SHORT"],
+        "medium_days": CONFIG["LAST_SEEN_DAYS_MEDIUM"],
+        "long_days": CONFIG["LAST_SEEN_DAYS_LONG"],
+    }
+
+
+def migrate_evaluation_columns(cur) -> bool:
+    """Колонки оценки уровня: increase_patch, счётчики порогов и level_changed_at."""
+    cur.execute(queries.HAS_EVALUATION_COLUMNS)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.ADD_EVALUATION_COLUMNS)
+    return True
+
+
+def migrate_next_review_at(cur) -> bool:
+    """Колонка user_progress.next_review_at, её заполнение и индекс очереди повторений."""
+    cur.execute(queries.HAS_NEXT_REVIEW_AT)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.ADD_NEXT_REVIEW_AT)
+    cur.execute(queries.BACKFILL_NEXT_REVIEW_AT, _backfill_params())
+    logger.info("Scheduled %s existing progress rows", cur.rowcount)
+    cur.execute(queries.CREATE_REVIEW_INDEX)
+    return True
+
+
+def migrate_seen_words(cur) -> bool:
+    """
+    Колонки карты виденных слов user_languages.seen_words и seen_words_version.
+    Сами карты строятся из user_progress при первом подборе (db/seen_words.py).
+    """
+    cur.execute(queries.HAS_SEEN_WORDS)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.ADD_SEEN_WORDS)
+    cur.execute(queries.ADD_SEEN_WORDS_VERSION)
+    return True
+
+
+def migrate_words_language_index(cur) -> bool:
+    """Индекс words (language_id, difficulty) для запросов кандидатов подборщика."""
+    cur.execute(queries.HAS_WORDS_LANGUAGE_INDEX)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.CREATE_WORDS_LANGUAGE_INDEX)
+    return True
+
+
+def migrate_session_evaluations(cur) -> bool:
+    """Таблица очереди оценки сессий (services/evaluation_queue.py)."""
+    cur.execute(queries.HAS_SESSION_EVALUATIONS)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.CREATE_SESSION_EVALUATIONS)
+    cur.execute(queries.CREATE_SESSION_EVALUATIONS_INDEX)
+    return True
+
+
+def migrate_evaluation_retry_at(cur) -> bool:
+    """Колонка session_evaluations.retry_at: оценка ждёт повтора, а не захвачена."""
+    cur.execute(queries.HAS_EVALUATION_RETRY_AT)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.ADD_EVALUATION_RETRY_AT)
+    return True
+
+
+def migrate_answer_events(cur) -> bool:
+    """
+    Журнал ответов answer_events (db/answer_events.py). В Postgres таблица
+    секционирована по месяцам; сразу создаются секции на ближайшие месяцы.
+    """
+    cur.execute(queries.HAS_ANSWER_EVENTS)
+    if cur.fetchone()['exists']:
+        return False
+    cur.execute(queries.CREATE_ANSWER_EVENTS)
+    cur.execute(queries.CREATE_ANSWER_EVENTS_INDEX)
+    if database.DB_BACKEND != "sqlite":
+        current = answer_events.month_of(datetime.now())
+        answer_events.ensure_partitions(cur, current, answer_events.add_months(current, answer_events.MONTHS_AHEAD))
+    return True
+
+
+# Имя миграции -> функция; применяются по порядку
+MIGRATIONS: List[Tuple[str, Callable]] = [
+    ("user_languages.evaluation_columns", migrate_evaluation_columns),
+    ("progress.next_review_at", migrate_next_review_at),
+    ("user_languages.seen_words", migrate_seen_words),
+    ("words.language_difficulty_index", migrate_words_language_index),
+    ("session_evaluations", migrate_session_evaluations),
+    ("answer_events", migrate_answer_events),
+    ("session_evaluations.retry_at", migrate_evaluation_retry_at),
+]
+
+
+def apply_migrations() -> List[str]:
+    """Применяет недостающие миграции и возвращает имена применённых."""
+    applied = []
+    conn = get_db_connection()
+    try:
+        for name, migration in MIGRATIONS:
+            started = time.perf_counter()
+            with conn:
+                with conn.cursor() as cur:
+                    if migration(cur):
+                        applied.append(name)
+                        logger.info("Applied migration %s in %.0f ms", name, (time.perf_counter() - started) * 1000)
+    finally:
+        close_db_connection(conn)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print("Applied:", ", ".join(apply_migrations()) or "nothing")
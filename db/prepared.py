@@ -0,0 +1,110 @@
+"""
+Подготовленные запросы для соединений пула.
+
+Горячие запросы реестра (db/queries.py, register(..., prepare=True)) на каждом
+вызове разбираются и планируются Postgres заново - при запросах меньше
+миллисекунды это заметная доля времени. Соединения пула живут долго, поэтому
+такой запрос готовится один раз на соединение (PREPARE) и дальше выполняется
+по имени (EXECUTE). Подготовка уходит в одном обращении к серверу с первым
+выполнением, лишних обращений нет.
+
+Соединения, открытые в обход пула (DB_POOL_SIZE=0, пул исчерпан), закрываются
+после вызова - для них запросы выполняются как обычно. Подготовленный запрос не
+откатывается вместе с транзакцией, поэтому после ошибки его состояние на сервере
+неизвестно: соединение сбрасывает свои запросы (DEALLOCATE ALL) и готовит их заново.
+
+DB_PREPARED_STATEMENTS=0 - выключить. Метрика flowcado_db_prepared_statements_total
+{result}: prepared - подготовка, executed - выполнение готового запроса, reset -
+сброс после ошибки; доля executed - это доля вызовов без разбора и планирования.
+"""
+import os
+import re
+from typing import Dict, Optional, Set, Tuple
+
+from psycopg2.extensions import connection as _connection
+
+from core.metrics import DB_PREPARED_STATEMENTS
+from db import queries
+
+ENABLED = os.environ.get("DB_PREPARED_STATEMENTS", "1") != "0"
+
+# %s -> $n; %% остаётся как есть - его обработает подстановка параметров psycopg2
+_PLACEHOLDER = re.compile(r"%[%s]")
+
+
+class PreparedConnection(_connection):
+    """
+    Соединение, которое может держать подготовленные запросы. prepared - имена
+    подготовленных в его сессии запросов реестра; None - соединение не из пула.
+    """
+    prepared: Optional[Set[str]] = None
+    # После ошибки подготовленного запроса следующая подготовка начнётся с DEALLOCATE ALL
+    stale: bool = False
+
+
+# Имя в реестре -> (имя оператора, текст PREPARE, текст EXECUTE)
+_statements: Dict[str, Tuple[str, str, str]] = {}
+
+
+def _statement(name: str, sql: str) -> Tuple[str, str, str]:
+    statement = _statements.get(name)
+    if statement is None:
+        count = 0
+
+        def number(match):
+            nonlocal count
+            if match.group() == "%%":
+                return "%%"
+            count += 1
+            return f"${count}"
+
+        body = _PLACEHOLDER.sub(number, sql)
+        statement_name = "q_" + re.sub(r"\W", "_", name)
+        arguments = f" ({', '.join(['%s'] * count)})" if count else ""
+        statement = (
+            statement_name,
+            f"PREPARE {statement_name} AS {body};",
+            f"EXECUTE {statement_name}{arguments}",
+        )
+        _statements[name] = statement
+    return statement
+
+
+def attach(conn) -> None:
+    """Включает подготовленные запросы для соединения пула (при его открытии)."""
+    if ENABLED and isinstance(conn, PreparedConnection):
+        conn.prepared = set()
+
+
+def rewrite(conn, name: Optional[str], query, vars) -> Optional[str]:
+    """
+    Текст для выполнения query через подготовленный запрос или None, если запрос
+    выполняется как обычно. Параметры vars передаются в cursor.execute без изменений.
+    """
+    prepared = getattr(conn, "prepared", None)
+    if prepared is None or name is None or isinstance(vars, dict) or not queries.QUERIES[name].prepare:
+        return None
+    _, prepare, execute = _statement(name, query)
+    prefix = ""
+    if conn.stale:
+        # Сбрасываем всё, включая запрос, на котором была ошибка: например, его план
+        # устарел после миграции ("cached plan must not change result type")
+        prefix = "DEALLOCATE ALL;"
+        prepared.clear()
+        conn.stale = False
+    elif name in prepared:
+        DB_PREPARED_STATEMENTS.labels("executed").inc()
+        return execute
+    DB_PREPARED_STATEMENTS.labels("prepared").inc()
+    return prefix + prepare + execute
+
+
+def executed(conn, name: str) -> None:
+    """Отмечает успешное выполнение подготовленного запроса name."""
+    conn.prepared.add(name)
+
+
+def failed(conn) -> None:
+    """Ошибка при выполнении подготовленного запроса: его состояние на сервере неизвестно."""
+    DB_PREPARED_STATEMENTS.labels("reset").inc()
+    conn.stale = True
@@ -0,0 +1,1051 @@
+"""
+Реестр SQL-запросов горячего пути.
+
+Все запросы подборщика, онбординга, оценщика сессий и помощников db.database
+собраны здесь под стабильными именами. По реестру работают проверка планов
+запросов (bench/explain_check.py), журнал медленных запросов в db.database
+и встроенный SQLite-бэкенд (db/sqlite_backend.py): текст в диалекте Postgres
+переводится в SQLite автоматически, а запросы, которые так не переводятся,
+регистрируются с явным вариантом sqlite=. Запросы с prepare=True соединения
+пула Postgres готовят один раз и выполняют по имени (db/prepared.py).
+"""
+import re
+from typing import Dict, Optional
+
+
+class Query:
+    """Именованный SQL-запрос."""
+    __slots__ = ("name", "sql", "sqlite", "prepare")
+
+    def __init__(self, name: str, sql: str, sqlite: Optional[str] = None, prepare: bool = False):
+        self.name = name
+        self.sql = sql
+        self.sqlite = sqlite
+        self.prepare = prepare
+
+
+# Имя запроса -> запрос
+QUERIES: Dict[str, Query] = {}
+
+# Текст запроса -> имя; текст берётся из констант модуля, поэтому поиск - это хеш готовой строки
+_NAMES_BY_SQL: Dict[str, str] = {}
+
+# Текст запроса в диалекте Postgres -> текст для SQLite
+_SQLITE_BY_SQL: Dict[str, str] = {}
+
+# Механические замены Postgres -> SQLite; порядок важен (массив до плейсхолдеров)
+_SQLITE_REWRITES = [
+    (re.compile(r"SELECT\s+unnest\(%s::int\[\]\)", re.IGNORECASE), "SELECT value FROM json_each(%s)"),
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), "datetime('now', 'localtime')"),
+    (re.compile(r"%s"), "?"),
+]
+
+
+def register(name: str, sql: str, sqlite: Optional[str] = None, prepare: bool = False) -> str:
+    """
+    Регистрирует запрос и возвращает его текст для передачи в cursor.execute.
+    prepare - горячий запрос: соединения пула выполняют его подготовленным.
+    """
+    if name in QUERIES:
+        raise ValueError(f"Query {name} is already registered")
+    QUERIES[name] = Query(name, sql, sqlite, prepare)
+    _NAMES_BY_SQL[sql] = name
+    if sqlite is not None:
+        _SQLITE_BY_SQL[sql] = sqlite
+    return sql
+
+
+def query_name(sql) -> Optional[str]:
+    """Возвращает имя зарегистрированного запроса или None для ad-hoc SQL."""
+    return _NAMES_BY_SQL.get(sql)
+
+
+def to_sqlite(sql: str) -> str:
+    """
+    Возвращает текст запроса для SQLite: явный вариант из реестра или
+    механический перевод (плейсхолдеры, NOW(), unnest массива через json_each).
+    Переведённый текст кешируется, поэтому повторный вызов - поиск в словаре.
+    """
+    translated = _SQLITE_BY_SQL.get(sql)
+    if translated is None:
+        translated = sql
+        for pattern, replacement in _SQLITE_REWRITES:
+            translated = pattern.sub(replacement, translated)
+        _SQLITE_BY_SQL[sql] = translated
+    return translated
+
+
+# Пользователи и языки
+
+USER_UPSERT = register("users.upsert", """
+    INSERT INTO users (username, base_language_id, created_at)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (username) DO UPDATE SET username = EXCLUDED.username
+    RETURNING id
+""", prepare=True)
+
+USER_LANGUAGE_GET = register("user_languages.get_active", """
+    SELECT id, level FROM user_languages
+    WHERE user_id = %s AND target_language_id = %s AND is_active = TRUE
+""", prepare=True)
+
+USER_LANGUAGE_INSERT = register("user_languages.insert", """
+    INSERT INTO user_languages (user_id, target_language_id, level, is_active, started_at)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id, level
+""")
+
+USER_TOUCH = register("users.touch_last_active", """
+    UPDATE users SET last_active = %s WHERE id = %s
+""")
+
+USER_LANGUAGE_INCREASE_PATCH = register("user_languages.increase_patch", """
+    SELECT increase_patch FROM user_languages
+    WHERE id = %s
+""")
+
+
+# Прогресс
+
+PROGRESS_GET = register("progress.get", """
+    SELECT repeats, successes FROM user_progress
+    WHERE user_language_id = %s AND word_id = %s
+""", prepare=True)
+
+PROGRESS_UPDATE = register("progress.update", """
+    UPDATE user_progress
+    SET repeats = %s,
+        successes = %s,
+        success_rate = %s,
+        last_seen = %s,
+        last_answer_wrong = %s,
+        session_id = %s,
+        next_review_at = %s
+    WHERE user_language_id = %s AND word_id = %s
+""", prepare=True)
+
+PROGRESS_INSERT = register("progress.insert", """
+    INSERT INTO user_progress
+    (user_language_id, word_id, repeats, successes, success_rate,
+     last_seen, last_answer_wrong, session_id, next_review_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+""", prepare=True)
+
+# Доля верных среди последних %s ответов по журналу ответов (db/answer_events.py);
+# у ученика без событий - по флагу последнего ответа на недавно виденные слова
+RECENT_SUCCESS_RATE = register("progress.recent_success_rate", """
+    SELECT COALESCE(
+        (
+            SELECT AVG(CASE WHEN is_correct THEN 1 ELSE 0 END) * 100
+            FROM (
+                SELECT is_correct
+                FROM answer_events
+                WHERE user_language_id = %s
+                ORDER BY answered_at DESC, word_id DESC
+                LIMIT %s
+            ) as recent_events
+        ),
+        (
+            SELECT AVG(CASE WHEN last_answer_wrong THEN 0 ELSE 1 END) * 100
+            FROM (
+                SELECT last_answer_wrong
+                FROM user_progress
+                WHERE user_language_id = %s
+                ORDER BY last_seen DESC
+                LIMIT %s
+            ) as recent_answers
+        )
+    ) as avg_success
+""", prepare=True)
+
+
+# Журнал ответов (db/answer_events.py)
+
+# Событие ответа - в транзакции записи прогресса (db.database.update_user_progress)
+ANSWER_EVENTS_INSERT = register("answer_events.insert", """
+    INSERT INTO answer_events (user_language_id, word_id, session_id, is_correct, answered_at)
+    VALUES (%s, %s, %s, %s, %s)
+""", prepare=True)
+
+# Секции журнала (только Postgres); имя секции - answer_events_ГГГГ_ММ
+ANSWER_EVENTS_PARTITIONS = register("answer_events.partitions", """
+    SELECT c.relname AS name
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'answer_events'::regclass
+    ORDER BY c.relname
+""")
+
+# Срок хранения в SQLite, где секций нет
+ANSWER_EVENTS_PRUNE = register("answer_events.prune", """
+    DELETE FROM answer_events WHERE answered_at < %s
+""")
+
+WORD_TRANSLATION = register("translations.correct", """
+    SELECT translation FROM word_senses
+    WHERE word_id = %s AND language_id = %s
+    LIMIT 1
+""", prepare=True)
+
+# Переводы сразу для многих слов (пакет сессий, api/words.py:session_batch)
+WORD_TRANSLATIONS_MANY = register("translations.correct_many", """
+    SELECT DISTINCT ON (word_id) word_id, translation
+    FROM word_senses
+    WHERE word_id IN (SELECT unnest(%s::int[]))
+    AND language_id = %s
+    ORDER BY word_id, id
+""", sqlite="""
+    SELECT word_id, translation
+    FROM word_senses
+    WHERE id IN (
+        SELECT MIN(id) FROM word_senses
+        WHERE word_id IN (SELECT value FROM json_each(?))
+        AND language_id = ?
+        GROUP BY word_id
+    )
+""", prepare=True)
+
+WRONG_TRANSLATIONS = register("translations.distractors", """
+    SELECT ws.translation
+    FROM word_senses ws
+    JOIN words w ON ws.word_id = w.id
+    WHERE ws.language_id = %s
+    AND w.difficulty = %s
+    AND w.id != %s
+    ORDER BY RANDOM()
+    LIMIT %s
+""")
+
+# Загрузка кеша словаря (db/vocabulary.py) при старте воркера
+VOCABULARY_TRANSLATIONS = register("vocabulary.translations", """
+    SELECT DISTINCT ON (word_id) word_id, translation
+    FROM word_senses
+    WHERE language_id = %s
+    ORDER BY word_id, id
+""", sqlite="""
+    SELECT word_id, translation
+    FROM word_senses
+    WHERE id IN (SELECT MIN(id) FROM word_senses WHERE language_id = ? GROUP BY word_id)
+""")
+
+VOCABULARY_WORDS = register("vocabulary.words", """
+    SELECT id, text, language_id, difficulty FROM words
+    ORDER BY id
+""")
+
+VOCABULARY_DISTRACTORS = register("vocabulary.distractors", """
+    SELECT w.id AS word_id, ws.translation
+    FROM word_senses ws
+    JOIN words w ON ws.word_id = w.id
+    WHERE ws.language_id = %s
+    AND w.difficulty = %s
+""")
+
+# Сборка файла словаря (db/vocabulary_file.py)
+VOCABULARY_FILE_WORDS = register("vocabulary_file.words", """
+    SELECT id, text, language_id, difficulty, frequency_rank FROM words
+    ORDER BY id
+""")
+
+VOCABULARY_FILE_SENSES = register("vocabulary_file.senses", """
+    SELECT ws.word_id, ws.language_id, ws.translation, w.difficulty
+    FROM word_senses ws
+    JOIN words w ON ws.word_id = w.id
+    ORDER BY ws.language_id, ws.word_id, ws.id
+""")
+
+WORD_DIFFICULTY = register("words.difficulty", """
+    SELECT difficulty FROM words WHERE id = %s
+""")
+
+WORDS_ANY_EXCLUDING = register("words.any_excluding", """
+    SELECT w.id, w.text
+    FROM words w
+    WHERE w.id NOT IN (SELECT unnest(%s::int[]))
+    AND w.language_id = %s
+    ORDER BY RANDOM()
+    LIMIT %s
+""")
+
+
+# Подбор слов (services.picker)
+
+# Все запросы кандидатов ограничены языком изучения: слова остальных языков не
+# сканируются, и стоимость не растёт с их числом (индекс idx_words_language_difficulty)
+
+# Слабые и повторяемые слова: ближайшие по сроку повторения записи (models/schedule.py),
+# одно сканирование индекса idx_user_progress_review по возрастанию next_review_at.
+# Уровень проверяется поиском по первичному ключу words, а не соединением: доля записей
+# нужного языка и уровня недооценивается планировщиком, и с соединением он выбирает проход
+# по всем словам словаря. Так сканирование останавливается на LIMIT-й подходящей записи
+PICKER_DUE = register("picker.due", """
+    SELECT w.id, w.text, due.repeats, due.successes, due.last_answer_wrong, due.next_review_at
+    FROM (
+        SELECT up.word_id, up.repeats, up.successes, up.last_answer_wrong, up.next_review_at
+        FROM user_progress up
+        WHERE up.user_language_id = %s
+        AND up.next_review_at IS NOT NULL
+        AND (SELECT w.difficulty FROM words w WHERE w.id = up.word_id AND w.language_id = %s) = %s
+        ORDER BY up.next_review_at
+        LIMIT %s
+    ) due
+    JOIN words w ON w.id = due.word_id
+    ORDER BY due.next_review_at
+""", prepare=True)
+
+PICKER_NEW = register("picker.new", """
+    SELECT w.id, w.text
+    FROM words w
+    LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
+    WHERE w.language_id = %s
+    AND w.difficulty = %s
+    AND up.id IS NULL
+    AND w.id NOT IN (SELECT unnest(%s::int[]))
+    ORDER BY RANDOM()
+    LIMIT %s
+""")
+
+# Незнакомые или давно не виденные слова (Stretch+1, Patch-1) - без кеша словаря
+PICKER_NEW_OR_STALE = register("picker.new_or_stale", """
+    SELECT w.id, w.text
+    FROM words w
+    LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
+    WHERE w.language_id = %s
+    AND w.difficulty = %s
+    AND (up.id IS NULL OR up.last_seen < %s)
+    AND w.id NOT IN (SELECT unnest(%s::int[]))
+    ORDER BY RANDOM()
+    LIMIT %s
+""")
+
+# Давно не виденные слова для подбора по карте виденных (db/seen_words.py): незнакомые
+# берутся из каталога словаря, а запрос идёт только по записям прогресса ученика, сложность -
+# поиском по первичному ключу words (соединение со всеми словами уровня здесь дороже).
+# Тексты - из каталога; total - число подходящих записей до LIMIT, для равномерной выборки
+PICKER_SEEN_BEFORE = register("picker.seen_before", """
+    SELECT up.word_id AS id, COUNT(*) OVER () AS total
+    FROM user_progress up
+    WHERE up.user_language_id = %s
+    AND (SELECT w.difficulty FROM words w WHERE w.id = up.word_id AND w.language_id = %s) = %s
+    AND up.last_seen < %s
+    AND up.word_id NOT IN (SELECT unnest(%s::int[]))
+    ORDER BY RANDOM()
+    LIMIT %s
+""", prepare=True)
+
+PICKER_FALLBACK = register("picker.fallback", """
+    SELECT w.id, w.text
+    FROM words w
+    LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
+    WHERE w.id NOT IN (SELECT unnest(%s::int[]))
+    AND w.language_id = %s
+    ORDER BY RANDOM()
+    LIMIT %s
+""")
+
+
+# Снимок прогресса для подбора в памяти (services/snapshot_picker.py): одна строка,
+# столбцы - числа через запятую в одном порядке записей. Время - мс от эпохи,
+# отсутствующий срок повторения - -1 (string_agg пропускает NULL и сбил бы порядок).
+# recent_success - доля верных последних ответов по журналу, как в
+# progress.recent_success_rate (NULL, если событий нет)
+PICKER_SNAPSHOT = register("picker.snapshot", """
+    SELECT (
+               SELECT AVG(CASE WHEN is_correct THEN 1 ELSE 0 END) * 100
+               FROM (
+                   SELECT is_correct
+                   FROM answer_events
+                   WHERE user_language_id = %s
+                   ORDER BY answered_at DESC, word_id DESC
+                   LIMIT %s
+               ) as recent_events
+           ) AS recent_success,
+           string_agg(word_id::text, ',') AS word_ids,
+           string_agg(repeats::text, ',') AS repeats,
+           string_agg(successes::text, ',') AS successes,
+           string_agg(last_answer_wrong::int::text, ',') AS last_answer_wrong,
+           string_agg((date_part('epoch', last_seen) * 1000)::bigint::text, ',') AS last_seen,
+           string_agg(COALESCE((date_part('epoch', next_review_at) * 1000)::bigint, -1)::text, ',')
+               AS next_review_at
+    FROM user_progress
+    WHERE user_language_id = %s
+""", sqlite="""
+    SELECT (
+               SELECT AVG(CASE WHEN is_correct THEN 1 ELSE 0 END) * 100
+               FROM (
+                   SELECT is_correct
+                   FROM answer_events
+                   WHERE user_language_id = ?
+                   ORDER BY answered_at DESC, word_id DESC
+                   LIMIT ?
+               ) as recent_events
+           ) AS recent_success,
+           group_concat(word_id, ',') AS word_ids,
+           group_concat(repeats, ',') AS repeats,
+           group_concat(successes, ',') AS successes,
+           group_concat(CAST(last_answer_wrong AS INTEGER), ',') AS last_answer_wrong,
+           group_concat(CAST((julianday(last_seen) - 2440587.5) * 86400000 AS INTEGER), ',') AS last_seen,
+           group_concat(COALESCE(CAST((julianday(next_review_at) - 2440587.5) * 86400000 AS INTEGER), -1), ',')
+               AS next_review_at
+    FROM user_progress
+    WHERE user_language_id = ?
+""")
+
+# Онбординг (services.onboarding)
+
+ONBOARDING_PROGRESS_COUNT = register("onboarding.progress_count", """
+    SELECT COUNT(*) AS count FROM user_progress WHERE user_language_id = %s
+""", prepare=True)
+
+ONBOARDING_A1_FREQUENT = register("onboarding.a1_frequent", """
+    SELECT w.id, w.text
+    FROM words w
+    WHERE w.difficulty = 1  -- A1
+    AND w.language_id = %s
+    ORDER BY frequency_rank ASC NULLS LAST, RANDOM()
+    LIMIT 5
+""")
+
+ONBOARDING_A2_RANDOM = register("onboarding.a2_random", """
+    SELECT w.id, w.text
+    FROM words w
+    WHERE w.difficulty = 2  -- A2
+    AND w.language_id = %s
+    ORDER BY RANDOM()
+    LIMIT 5
+""")
+
+# Прогресс уникален по (user_language_id, word_id), поэтому DISTINCT не нужен
+# (а вместе с ORDER BY up.last_seen Postgres его и не принимает)
+ONBOARDING_PREVIOUS_WORDS = register("onboarding.previous_words", """
+    SELECT w.id, w.text
+    FROM words w
+    JOIN user_progress up ON w.id = up.word_id
+    WHERE up.user_language_id = %s
+    ORDER BY up.last_seen DESC
+    LIMIT 10
+""")
+
+ONBOARDING_A2_NEW = register("onboarding.a2_new", """
+    SELECT w.id, w.text
+    FROM words w
+    WHERE w.difficulty = 2  -- A2
+    AND w.language_id = %s
+    AND w.id NOT IN (SELECT unnest(%s::int[]))
+    ORDER BY RANDOM()
+    LIMIT %s
+""")
+
+ONBOARDING_A1_FREQUENT_EXCLUDING = register("onboarding.a1_frequent_excluding", """
+    SELECT w.id, w.text
+    FROM words w
+    WHERE w.difficulty = 1  -- A1
+    AND w.language_id = %s
+    AND w.id NOT IN (SELECT unnest(%s::int[]))
+    ORDER BY frequency_rank ASC NULLS LAST, RANDOM()
+    LIMIT %s
+""")
+
+
+# Оценка сессий (services.session_evaluator)
+
+# Входные данные оценки одним запросом: строка ученика (блокируется до конца
+# транзакции, чтобы параллельные завершения сессий оценивались по очереди) и итоги
+# трёх последних сессий на момент завершения оцениваемой сессии, новые первыми
+# (параметры: id, момент завершения, число событий, снова момент завершения): ответы
+# более поздних сессий не учитываются, даже если оценка выполняется с опозданием.
+# Итоги сессий - по последним событиям журнала ответов (db/answer_events.py); если
+# сессий в журнале меньше трёх (история до журнала), недостающие - из user_progress,
+# где ответ на слово относится к сессии последнего ответа, без сессий, уже найденных
+# в журнале (эти сессии всегда старше журнальных, поэтому при трёх сессиях в журнале
+# user_progress не читается). У ученика без ответов - одна строка с NULL в столбцах
+# сессии. В SQLite писатель и так один, блокировка не нужна.
+EVALUATOR_INPUTS = register("evaluator.inputs", """
+    WITH learner AS (
+        SELECT id, level, level_up_streak, level_down_streak, increase_patch
+        FROM user_languages
+        WHERE id = %s
+        FOR UPDATE
+    ), recent AS (
+        SELECT session_id, is_correct, answered_at
+        FROM answer_events
+        WHERE user_language_id = (SELECT id FROM learner) AND answered_at <= %s
+        ORDER BY answered_at DESC, word_id DESC
+        LIMIT %s
+    ), sessions AS (
+        SELECT session_id, successes, repeats, last_seen
+        FROM (
+            SELECT
+                session_id,
+                SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as successes,
+                COUNT(*) as repeats,
+                MAX(answered_at) as last_seen
+            FROM recent
+            GROUP BY session_id
+            UNION ALL
+            SELECT
+                session_id,
+                SUM(successes) as successes,
+                SUM(repeats) as repeats,
+                MAX(last_seen) as last_seen
+            FROM user_progress
+            WHERE user_language_id = (SELECT id FROM learner) AND last_seen <= %s
+            AND (SELECT COUNT(DISTINCT session_id) FROM recent) < 3
+            AND NOT EXISTS (SELECT 1 FROM recent r WHERE r.session_id = user_progress.session_id)
+            GROUP BY session_id
+        ) all_sessions
+        ORDER BY last_seen DESC, session_id DESC
+        LIMIT 3
+    )
+    SELECT l.id, l.level, l.level_up_streak, l.level_down_streak, l.increase_patch,
+           s.session_id, s.successes, s.repeats, s.last_seen
+    FROM learner l
+    LEFT JOIN sessions s ON TRUE
+    ORDER BY s.last_seen DESC, s.session_id DESC
+""", sqlite="""
+    WITH recent AS (
+        SELECT session_id, is_correct, answered_at
+        FROM answer_events
+        WHERE user_language_id = ?1 AND answered_at <= ?2
+        ORDER BY answered_at DESC, word_id DESC
+        LIMIT ?3
+    ), sessions AS (
+        SELECT session_id, successes, repeats, last_seen
+        FROM (
+            SELECT
+                session_id,
+                SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as successes,
+                COUNT(*) as repeats,
+                MAX(answered_at) as last_seen
+            FROM recent
+            GROUP BY session_id
+            UNION ALL
+            SELECT
+                session_id,
+                SUM(successes) as successes,
+                SUM(repeats) as repeats,
+                MAX(last_seen) as last_seen
+            FROM user_progress
+            WHERE user_language_id = ?1 AND last_seen <= ?4
+            AND (SELECT COUNT(DISTINCT session_id) FROM recent) < 3
+            AND NOT EXISTS (SELECT 1 FROM recent r WHERE r.session_id = user_progress.session_id)
+            GROUP BY session_id
+        )
+        ORDER BY last_seen DESC, session_id DESC
+        LIMIT 3
+    )
+    SELECT ul.id, ul.level, ul.level_up_streak, ul.level_down_streak, ul.increase_patch,
+           s.session_id, s.successes, s.repeats, s.last_seen as "last_seen [timestamp]"
+    FROM user_languages ul
+    LEFT JOIN sessions s ON TRUE
+    WHERE ul.id = ?1
+    ORDER BY s.last_seen DESC, s.session_id DESC
+""", prepare=True)
+
+# Результат оценки одним UPDATE; level_changed_at - только при смене уровня
+# (параметры: level, level_up_streak, level_down_streak, increase_patch, level, id)
+EVALUATOR_APPLY = register("evaluator.apply", """
+    UPDATE user_languages
+    SET level = %s,
+        level_up_streak = %s,
+        level_down_streak = %s,
+        increase_patch = %s,
+        level_changed_at = CASE WHEN level <> %s THEN NOW() ELSE level_changed_at END
+    WHERE id = %s
+""", prepare=True)
+
+# Очередь оценки сессий (services.evaluation_queue)
+
+EVALUATION_ENQUEUE = register("evaluations.enqueue", """
+    INSERT INTO session_evaluations (user_language_id, user_id, session_id, enqueued_at)
+    VALUES (%s, %s, %s, %s)
+    RETURNING id
+""", prepare=True)
+
+# Самая старая оценка ученика: оценки одного ученика идут по порядку. Строка
+# блокируется до конца транзакции оценки, которая её удаляет: занятая другим
+# обработчиком строка - LockNotAvailable (NOWAIT), её ожидание - EVALUATION_WAIT_NEXT.
+# В SQLite писатель один: строку, удалённую другим обработчиком, выдаёт rowcount 0
+# у EVALUATION_DONE
+EVALUATION_NEXT = register("evaluations.next", """
+    SELECT id, user_id, enqueued_at, attempts, locked_until, retry_at
+    FROM session_evaluations
+    WHERE user_language_id = %s
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE NOWAIT
+""", sqlite="""
+    SELECT id, user_id, enqueued_at, attempts, locked_until, retry_at
+    FROM session_evaluations
+    WHERE user_language_id = ?
+    ORDER BY id
+    LIMIT 1
+""", prepare=True)
+
+# То же с ожиданием оценки, которую применяет другой обработчик (ограничено
+# lock_timeout). Дождавшись удаления строки, запрос возвращает пустой результат, а не
+# следующую строку (LIMIT 1 FOR UPDATE), поэтому следующую читает EVALUATION_NEXT
+EVALUATION_WAIT_NEXT = register("evaluations.wait_next", """
+    SELECT id, user_id, enqueued_at, attempts, locked_until, retry_at
+    FROM session_evaluations
+    WHERE user_language_id = %s
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE
+""", sqlite="""
+    SELECT id, user_id, enqueued_at, attempts, locked_until, retry_at
+    FROM session_evaluations
+    WHERE user_language_id = ?
+    ORDER BY id
+    LIMIT 1
+""")
+
+# Неудачная оценка ждёт повтора: locked_until - время повтора, retry_at отличает
+# ожидание повтора от захвата обработчиком прежней версии (захват по сроку)
+EVALUATION_RETRY_AT = register("evaluations.retry_at", """
+    UPDATE session_evaluations
+    SET locked_until = %s, retry_at = %s, attempts = attempts + 1
+    WHERE id = %s
+""")
+
+EVALUATION_LOCK_TIMEOUT = register("evaluations.lock_timeout", """
+    SELECT set_config('lock_timeout', %s, TRUE)
+""", sqlite="""
+    SELECT ? -- в SQLite нет блокировок строк: писатель ждёт другого писателя BUSY_TIMEOUT_MS
+""")
+
+EVALUATION_DONE = register("evaluations.done", """
+    DELETE FROM session_evaluations WHERE id = %s
+""", prepare=True)
+
+# Ученики с оценками, которые никто не обрабатывает: подошло время повтора (или истёк
+# захват прежней версии) или оценку давно не применяли (процесс упал до коммита)
+EVALUATION_ORPHANED = register("evaluations.orphaned", """
+    SELECT DISTINCT user_language_id
+    FROM session_evaluations
+    WHERE locked_until < %s OR (locked_until IS NULL AND enqueued_at < %s)
+    LIMIT %s
+""")
+
+
+# Пакетная переоценка уровней (services.level_reevaluation)
+
+REEVALUATION_LEARNER_IDS = register("reevaluation.learner_ids", """
+    SELECT id FROM user_languages WHERE is_active = TRUE ORDER BY id
+""")
+
+# Строки блокируются до записи результата, чтобы не затереть параллельную оценку сессии
+REEVALUATION_LEARNERS = register("reevaluation.learners", """
+    SELECT id, level, level_up_streak, level_down_streak, increase_patch, level_changed_at
+    FROM user_languages
+    WHERE id BETWEEN %s AND %s AND is_active = TRUE
+    ORDER BY id
+    FOR UPDATE
+""", sqlite="""
+    SELECT id, level, level_up_streak, level_down_streak, increase_patch,
+        level_changed_at as "level_changed_at [timestamp]"
+    FROM user_languages
+    WHERE id BETWEEN ? AND ? AND is_active = TRUE
+    ORDER BY id
+""")
+
+# Последние сессии для диапазона учеников, как в evaluator.inputs, но до заданного
+# числа сессий на ученика (параметры: число событий, первый id, последний id, снова
+# первый и последний id, дважды число сессий); last_seen первой сессии ученика - это
+# время его последнего ответа. В Postgres последние события каждого
+# ученика читаются по индексу (LATERAL), в SQLite - нумерацией ROW_NUMBER
+REEVALUATION_RECENT_SESSIONS = register("reevaluation.recent_sessions", """
+    WITH recent AS (
+        SELECT ul.id as user_language_id, e.session_id, e.is_correct, e.answered_at
+        FROM user_languages ul
+        CROSS JOIN LATERAL (
+            SELECT session_id, is_correct, answered_at
+            FROM answer_events
+            WHERE user_language_id = ul.id
+            ORDER BY answered_at DESC, word_id DESC
+            LIMIT %s
+        ) e
+        WHERE ul.id BETWEEN %s AND %s
+    ), event_sessions AS (
+        SELECT
+            user_language_id,
+            session_id,
+            SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as successes,
+            COUNT(*) as repeats,
+            MAX(answered_at) as last_seen
+        FROM recent
+        GROUP BY user_language_id, session_id
+    ), sessions AS (
+        SELECT user_language_id, session_id, successes, repeats, last_seen
+        FROM event_sessions
+        UNION ALL
+        SELECT
+            up.user_language_id,
+            up.session_id,
+            SUM(up.successes) as successes,
+            SUM(up.repeats) as repeats,
+            MAX(up.last_seen) as last_seen
+        FROM user_languages ul
+        JOIN user_progress up ON up.user_language_id = ul.id
+        WHERE ul.id BETWEEN %s AND %s
+        AND ul.id NOT IN (
+            SELECT user_language_id FROM event_sessions GROUP BY user_language_id HAVING COUNT(*) >= %s
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM event_sessions es
+            WHERE es.user_language_id = up.user_language_id AND es.session_id = up.session_id
+        )
+        GROUP BY up.user_language_id, up.session_id
+    )
+    SELECT user_language_id, session_id, successes, repeats, last_seen
+    FROM (
+        SELECT
+            user_language_id, session_id, successes, repeats, last_seen,
+            ROW_NUMBER() OVER (
+                PARTITION BY user_language_id
+                ORDER BY last_seen DESC, session_id DESC
+            ) as position
+        FROM sessions
+    ) ranked
+    WHERE position <= %s
+    ORDER BY user_language_id, last_seen DESC, session_id DESC
+""", sqlite="""
+    WITH recent AS (
+        SELECT user_language_id, session_id, is_correct, answered_at
+        FROM (
+            SELECT
+                user_language_id, session_id, is_correct, answered_at,
+                ROW_NUMBER() OVER (PARTITION BY user_language_id ORDER BY answered_at DESC, word_id DESC) as number
+            FROM answer_events
+            WHERE user_language_id BETWEEN ?2 AND ?3
+        ) numbered
+        WHERE number <= ?1
+    ), event_sessions AS (
+        SELECT
+            user_language_id,
+            session_id,
+            SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as successes,
+            COUNT(*) as repeats,
+            MAX(answered_at) as last_seen
+        FROM recent
+        GROUP BY user_language_id, session_id
+    ), sessions AS (
+        SELECT user_language_id, session_id, successes, repeats, last_seen
+        FROM event_sessions
+        UNION ALL
+        SELECT
+            user_language_id,
+            session_id,
+            SUM(successes) as successes,
+            SUM(repeats) as repeats,
+            MAX(last_seen) as last_seen
+        FROM user_progress up
+        WHERE user_language_id BETWEEN ?4 AND ?5
+        AND user_language_id NOT IN (
+            SELECT user_language_id FROM event_sessions GROUP BY user_language_id HAVING COUNT(*) >= ?6
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM event_sessions es
+            WHERE es.user_language_id = up.user_language_id AND es.session_id = up.session_id
+        )
+        GROUP BY user_language_id, session_id
+    )
+    SELECT user_language_id, session_id, successes, repeats, last_seen as "last_seen [timestamp]"
+    FROM (
+        SELECT
+            user_language_id, session_id, successes, repeats, last_seen,
+            ROW_NUMBER() OVER (
+                PARTITION BY user_language_id
+                ORDER BY last_seen DESC, session_id DESC
+            ) as position
+        FROM sessions
+    ) ranked
+    WHERE position <= ?7
+    ORDER BY user_language_id, position
+""")
+
+# Результаты пачкой: в Postgres - execute_values (VALUES %s), в SQLite - executemany
+# по строке (id, level, level_up_streak, level_down_streak, increase_patch)
+REEVALUATION_APPLY = register("reevaluation.apply", """
+    UPDATE user_languages AS ul
+    SET level = v.level,
+        level_up_streak = v.level_up_streak,
+        level_down_streak = v.level_down_streak,
+        increase_patch = v.increase_patch,
+        level_changed_at = CASE WHEN v.level <> ul.level THEN NOW() ELSE ul.level_changed_at END
+    FROM (VALUES %s) AS v (id, level, level_up_streak, level_down_streak, increase_patch)
+    WHERE ul.id = v.id
+""", sqlite="""
+    UPDATE user_languages
+    SET level = ?2,
+        level_up_streak = ?3,
+        level_down_streak = ?4,
+        increase_patch = ?5,
+        level_changed_at = CASE WHEN ?2 <> level THEN datetime('now', 'localtime') ELSE level_changed_at END
+    WHERE id = ?1
+""")
+
+
+# Проверки схемы
+
+# Проверка соединения при прогреве воркера (core/startup.py)
+PING = register("schema.ping", """
+    SELECT 1 as ok
+""")
+
+HAS_INCREASE_PATCH = register("schema.has_increase_patch", """
+    SELECT EXISTS (
+        SELECT FROM information_schema.columns
+        WHERE table_name = 'user_languages' AND column_name = 'increase_patch'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM pragma_table_info('user_languages') WHERE name = 'increase_patch'
+    ) as "exists"
+""")
+
+# Колонки оценки уровня в user_languages (db/migrations.py)
+
+HAS_EVALUATION_COLUMNS = register("schema.has_evaluation_columns", """
+    SELECT COUNT(*) = 4 as "exists"
+    FROM information_schema.columns
+    WHERE table_name = 'user_languages'
+      AND column_name IN ('increase_patch', 'level_up_streak', 'level_down_streak', 'level_changed_at')
+""", sqlite="""
+    SELECT COUNT(*) = 4 as "exists"
+    FROM pragma_table_info('user_languages')
+    WHERE name IN ('increase_patch', 'level_up_streak', 'level_down_streak', 'level_changed_at')
+""")
+
+ADD_EVALUATION_COLUMNS = register("schema.add_evaluation_columns", """
+    ALTER TABLE user_languages
+    ADD COLUMN IF NOT EXISTS increase_patch BOOLEAN DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS level_up_streak INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS level_down_streak INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS level_changed_at TIMESTAMP
+""", sqlite="""
+    SELECT 1 -- колонки оценки входят в схему db/sqlite_schema.sql
+""")
+
+# Миграция расписания повторений (db/migrations.py)
+
+HAS_NEXT_REVIEW_AT = register("schema.has_next_review_at", """
+    SELECT EXISTS (
+        SELECT FROM information_schema.columns
+        WHERE table_name = 'user_progress' AND column_name = 'next_review_at'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM pragma_table_info('user_progress') WHERE name = 'next_review_at'
+    ) as "exists"
+""")
+
+ADD_NEXT_REVIEW_AT = register("schema.add_next_review_at", """
+    ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS next_review_at TIMESTAMP
+""", sqlite="""
+    ALTER TABLE user_progress ADD COLUMN next_review_at TIMESTAMP
+""")
+
+# Те же правила, что в models/schedule.py:review_interval
+BACKFILL_NEXT_REVIEW_AT = register("schema.backfill_next_review_at", """
+    UPDATE user_progress
+    SET next_review_at = last_seen + CASE
+        WHEN last_answer_wrong OR successes * 100 < %(weak)s * repeats
+            THEN %(quarantine_minutes)s * INTERVAL '1 minute'
+        WHEN successes * 100 < %(review)s * repeats OR successes < %(medium_successes)s
+            THEN %(short_days)s * INTERVAL '1 day'
+        WHEN successes < %(long_successes)s
+            THEN %(medium_days)s * INTERVAL '1 day'
+        ELSE %(long_days)s * INTERVAL '1 day'
+    END
+    WHERE next_review_at IS NULL
+""", sqlite="""
+    UPDATE user_progress
+    SET next_review_at = datetime(last_seen, CASE
+        WHEN last_answer_wrong OR successes * 100 < :weak * repeats
+            THEN '+' || :quarantine_minutes || ' minutes'
+        WHEN successes * 100 < :review * repeats OR successes < :medium_successes
+            THEN '+' || :short_days || ' days'
+        WHEN successes < :long_successes
+            THEN '+' || :medium_days || ' days'
+        ELSE '+' || :long_days || ' days'
+    END)
+    WHERE next_review_at IS NULL
+""")
+
+CREATE_REVIEW_INDEX = register("schema.create_review_index", """
+    CREATE INDEX IF NOT EXISTS idx_user_progress_review
+    ON user_progress (user_language_id, next_review_at)
+""")
+
+# Карта виденных слов (db/seen_words.py)
+
+HAS_SEEN_WORDS = register("schema.has_seen_words", """
+    SELECT EXISTS (
+        SELECT FROM information_schema.columns
+        WHERE table_name = 'user_languages' AND column_name = 'seen_words'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM pragma_table_info('user_languages') WHERE name = 'seen_words'
+    ) as "exists"
+""")
+
+ADD_SEEN_WORDS = register("schema.add_seen_words", """
+    ALTER TABLE user_languages ADD COLUMN IF NOT EXISTS seen_words BYTEA
+""", sqlite="""
+    ALTER TABLE user_languages ADD COLUMN seen_words BLOB
+""")
+
+ADD_SEEN_WORDS_VERSION = register("schema.add_seen_words_version", """
+    ALTER TABLE user_languages ADD COLUMN IF NOT EXISTS seen_words_version INTEGER NOT NULL DEFAULT 0
+""", sqlite="""
+    ALTER TABLE user_languages ADD COLUMN seen_words_version INTEGER NOT NULL DEFAULT 0
+""")
+
+SEEN_WORDS_VERSION = register("seen_words.version", """
+    SELECT seen_words_version AS version FROM user_languages
+    WHERE id = %s
+""", prepare=True)
+
+SEEN_WORDS_GET = register("seen_words.get", """
+    SELECT seen_words, seen_words_version AS version FROM user_languages
+    WHERE id = %s
+""")
+
+# Блокировка строки ученика: запись карты - чтение, установка бита и запись под ней,
+# чтобы воркеры не затирали биты друг друга (в SQLite писатель и так один)
+SEEN_WORDS_LOCK = register("seen_words.lock", """
+    SELECT seen_words, seen_words_version AS version FROM user_languages
+    WHERE id = %s
+    FOR UPDATE
+""", sqlite="""
+    SELECT seen_words, seen_words_version AS version FROM user_languages
+    WHERE id = ?
+""", prepare=True)
+
+SEEN_WORDS_SET = register("seen_words.set", """
+    UPDATE user_languages
+    SET seen_words = %s, seen_words_version = seen_words_version + 1
+    WHERE id = %s
+""", prepare=True)
+
+SEEN_WORDS_PROGRESS = register("seen_words.progress", """
+    SELECT word_id FROM user_progress
+    WHERE user_language_id = %s
+""")
+
+# Индекс слов по языку и уровню для запросов кандидатов подборщика (db/migrations.py)
+
+HAS_WORDS_LANGUAGE_INDEX = register("schema.has_words_language_index", """
+    SELECT EXISTS (
+        SELECT FROM pg_indexes
+        WHERE tablename = 'words' AND indexname = 'idx_words_language_difficulty'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_words_language_difficulty'
+    ) as "exists"
+""")
+
+CREATE_WORDS_LANGUAGE_INDEX = register("schema.create_words_language_index", """
+    CREATE INDEX IF NOT EXISTS idx_words_language_difficulty
+    ON words (language_id, difficulty)
+""")
+
+# Таблица очереди оценки сессий (db/migrations.py)
+
+HAS_SESSION_EVALUATIONS = register("schema.has_session_evaluations", """
+    SELECT EXISTS (
+        SELECT FROM information_schema.tables
+        WHERE table_name = 'session_evaluations'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'session_evaluations'
+    ) as "exists"
+""")
+
+CREATE_SESSION_EVALUATIONS = register("schema.create_session_evaluations", """
+    CREATE TABLE IF NOT EXISTS session_evaluations (
+        id SERIAL PRIMARY KEY,
+        user_language_id INTEGER NOT NULL REFERENCES user_languages (id),
+        user_id INTEGER NOT NULL,
+        session_id TEXT,
+        enqueued_at TIMESTAMP NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        locked_until TIMESTAMP,
+        retry_at TIMESTAMP
+    )
+""", sqlite="""
+    CREATE TABLE IF NOT EXISTS session_evaluations (
+        id INTEGER PRIMARY KEY,
+        user_language_id INTEGER NOT NULL REFERENCES user_languages (id),
+        user_id INTEGER NOT NULL,
+        session_id TEXT,
+        enqueued_at TIMESTAMP NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        locked_until TIMESTAMP,
+        retry_at TIMESTAMP
+    )
+""")
+
+CREATE_SESSION_EVALUATIONS_INDEX = register("schema.create_session_evaluations_index", """
+    CREATE INDEX IF NOT EXISTS idx_session_evaluations_user
+    ON session_evaluations (user_language_id, id)
+""")
+
+HAS_EVALUATION_RETRY_AT = register("schema.has_evaluation_retry_at", """
+    SELECT EXISTS (
+        SELECT FROM information_schema.columns
+        WHERE table_name = 'session_evaluations' AND column_name = 'retry_at'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM pragma_table_info('session_evaluations') WHERE name = 'retry_at'
+    ) as "exists"
+""")
+
+ADD_EVALUATION_RETRY_AT = register("schema.add_evaluation_retry_at", """
+    ALTER TABLE session_evaluations ADD COLUMN IF NOT EXISTS retry_at TIMESTAMP
+""", sqlite="""
+    ALTER TABLE session_evaluations ADD COLUMN retry_at TIMESTAMP
+""")
+
+# Журнал ответов (db/migrations.py): в Postgres секционирован по месяцам answered_at,
+# секции создаёт db/answer_events.py; индекс родительской таблицы получают все секции.
+# word_id в индексе - однозначный порядок ответов с одинаковым временем
+
+HAS_ANSWER_EVENTS = register("schema.has_answer_events", """
+    SELECT EXISTS (
+        SELECT FROM information_schema.tables
+        WHERE table_name = 'answer_events'
+    )
+""", sqlite="""
+    SELECT EXISTS (
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'answer_events'
+    ) as "exists"
+""")
+
+CREATE_ANSWER_EVENTS = register("schema.create_answer_events", """
+    CREATE TABLE IF NOT EXISTS answer_events (
+        user_language_id INTEGER NOT NULL,
+        word_id INTEGER NOT NULL,
+        session_id TEXT,
+        is_correct BOOLEAN NOT NULL,
+        answered_at TIMESTAMP NOT NULL
+    ) PARTITION BY RANGE (answered_at)
+""", sqlite="""
+    CREATE TABLE IF NOT EXISTS answer_events (
+        user_language_id INTEGER NOT NULL,
+        word_id INTEGER NOT NULL,
+        session_id TEXT,
+        is_correct BOOLEAN NOT NULL,
+        answered_at TIMESTAMP NOT NULL
+    )
+""")
+
+CREATE_ANSWER_EVENTS_INDEX = register("schema.create_answer_events_index", """
+    CREATE INDEX IF NOT EXISTS idx_answer_events_user
+    ON answer_events (user_language_id, answered_at, word_id)
+""")
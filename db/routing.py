@@ -0,0 +1,131 @@
+"""
+Маршрутизация чтений на реплики Postgres.
+
+Подбор сессии почти целиком состоит из чтений (кандидаты, переводы, варианты
+ответов, recent_success_rate), а записи сосредоточены в update_user_progress и
+оценке сессии. Код, который только читает, оборачивается в read_only(user_language_id):
+все соединения, открытые внутри (get_db_connection), идут на одну из реплик
+DB_REPLICA_DSNS. Реплики открываются с default_transaction_read_only, поэтому
+случайная запись из такого блока завершится ошибкой, а не уйдёт мимо основной базы.
+
+Чтение своих записей: после записи прогресса или оценки сессии ученик в течение
+DB_READ_YOUR_WRITES_SECONDS читает с основной базы, чтобы не увидеть реплику,
+ещё не догнавшую его ответы. Время записей хранится в памяти процесса - при
+нескольких воркерах окно действует в том воркере, который принял запись, поэтому
+окно стоит задавать с запасом относительно отставания реплик.
+
+Если к реплике не удалось подключиться, чтение идёт с основной базы, а реплика
+не выбирается следующие DB_REPLICA_RETRY_SECONDS. Без DB_REPLICA_DSNS и на
+SQLite read_only() ничего не меняет.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from core.metrics import DB_READ_ROUTES
+from db.prepared import PreparedConnection
+
+logger = logging.getLogger(__name__)
+
+# Строки подключения реплик через запятую (libpq DSN или postgresql://...)
+REPLICA_DSNS: List[str] = [dsn.strip() for dsn in os.environ.get("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
+
+# Сколько секунд после своей записи ученик читает с основной базы
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+# Сколько секунд не выбирать реплику после ошибки подключения
+REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", "30"))
+
+# Параметры сессии реплики: запись из блока read_only() - ошибка, а не тихий промах
+REPLICA_OPTIONS = "-c default_transaction_read_only=on"
+
+# При скольких записях в памяти чистить устаревшие
+_RECENT_WRITES_PRUNE_AT = 10000
+
+# user_language_id -> time.monotonic() последней записи
+_recent_writes: Dict[int, float] = {}
+# DSN реплики -> time.monotonic(), до которого она считается недоступной
+_unavailable_until: Dict[str, float] = {}
+_lock = threading.Lock()
+
+# DSN реплики для соединений текущего блока read_only(); None - основная база
+_replica_dsn: ContextVar[Optional[str]] = ContextVar("replica_dsn", default=None)
+
+
+class ReplicaConnection(PreparedConnection):
+    """Соединение с репликой; replica_dsn - строка из REPLICA_DSNS, по ней выбирается пул."""
+    replica_dsn: Optional[str] = None
+
+
+def is_replica(conn) -> bool:
+    return isinstance(conn, ReplicaConnection)
+
+
+def note_write(user_language_id: int) -> None:
+    """Отмечает запись ученика: следующие READ_YOUR_WRITES_SECONDS он читает с основной базы."""
+    if not REPLICA_DSNS:
+        return
+    now = time.monotonic()
+    with _lock:
+        _recent_writes[user_language_id] = now
+        if len(_recent_writes) > _RECENT_WRITES_PRUNE_AT:
+            expired = [key for key, at in _recent_writes.items() if now - at > READ_YOUR_WRITES_SECONDS]
+            for key in expired:
+                del _recent_writes[key]
+
+
+def mark_unavailable(dsn: str) -> None:
+    """Исключает реплику из выбора на REPLICA_RETRY_SECONDS после ошибки подключения."""
+    with _lock:
+        _unavailable_until[dsn] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+
+def _available(dsn: str) -> bool:
+    return _unavailable_until.get(dsn, 0.0) <= time.monotonic()
+
+
+def _wrote_recently(user_language_id: int) -> bool:
+    written_at = _recent_writes.get(user_language_id)
+    return written_at is not None and time.monotonic() - written_at <= READ_YOUR_WRITES_SECONDS
+
+
+@contextmanager
+def read_only(user_language_id: Optional[int] = None) -> Iterator[Optional[str]]:
+    """
+    Блок только чтения: соединения внутри открываются на реплике, если ученик
+    user_language_id не писал в последние READ_YOUR_WRITES_SECONDS. Возвращает
+    DSN выбранной реплики или None, если чтение идёт с основной базы.
+    """
+    dsn = None
+    if REPLICA_DSNS:
+        available = [replica for replica in REPLICA_DSNS if _available(replica)]
+        if user_language_id is not None and _wrote_recently(user_language_id):
+            DB_READ_ROUTES.labels("primary", "recent_write").inc()
+        elif not available:
+            DB_READ_ROUTES.labels("primary", "replica_unavailable").inc()
+        else:
+            dsn = random.choice(available)
+            DB_READ_ROUTES.labels("replica", "").inc()
+    token = _replica_dsn.set(dsn)
+    try:
+        yield dsn
+    finally:
+        _replica_dsn.reset(token)
+
+
+def current_replica() -> Optional[str]:
+    """DSN реплики, на которую идут соединения текущего блока, или None."""
+    dsn = _replica_dsn.get()
+    return dsn if dsn is not None and _available(dsn) else None
+
+
+def reset() -> None:
+    """Забывает недавние записи и ошибки реплик (для бенчмарков)."""
+    with _lock:
+        _recent_writes.clear()
+        _unavailable_until.clear()
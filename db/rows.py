@@ -0,0 +1,84 @@
+"""
+Компактные типы строк для горячих запросов.
+
+RealDictCursor создаёт на каждую строку словарь с копией имён столбцов: для
+сотен кандидатов подбора это основная часть аллокаций запроса. Запросы
+подборщика и оценщика читаются курсором кортежей (database.tuple_cursor) и
+сразу раскладываются в NamedTuple: у них нет __dict__, поля читаются как
+атрибуты, а порядок полей совпадает с порядком столбцов в SELECT - при
+изменении запроса в db/queries.py тип строки меняется вместе с ним.
+
+Ответы API по-прежнему собираются в словари: их сериализуют orjson и pydantic.
+"""
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Type, TypeVar
+
+Row = TypeVar("Row", bound=tuple)
+
+
+class WordRow(NamedTuple):
+    """Слово-кандидат: picker.new, picker.new_or_stale, picker.fallback, words.any_excluding."""
+    id: int
+    text: str
+
+
+class DueWordRow(NamedTuple):
+    """Слово с прогрессом ученика из очереди повторений (picker.due)."""
+    id: int
+    text: str
+    repeats: int
+    successes: int
+    last_answer_wrong: bool
+    next_review_at: Optional[datetime]
+
+
+class SeenBeforeRow(NamedTuple):
+    """Давно виденное слово и число таких слов (picker.seen_before)."""
+    id: int
+    total: int
+
+
+class LearnerLevelRow(NamedTuple):
+    """Уровень и счётчики порогов ученика (начало строки evaluator.inputs)."""
+    id: int
+    level: str
+    level_up_streak: Optional[int]
+    level_down_streak: Optional[int]
+    increase_patch: Optional[bool]
+
+
+class ReevaluationLearnerRow(NamedTuple):
+    """Уровень, счётчики порогов и время последней смены уровня (reevaluation.learners)."""
+    id: int
+    level: str
+    level_up_streak: Optional[int]
+    level_down_streak: Optional[int]
+    increase_patch: Optional[bool]
+    level_changed_at: Optional[datetime]
+
+
+class RecentSessionRow(NamedTuple):
+    """Итоги одной из последних сессий ученика (reevaluation.recent_sessions)."""
+    user_language_id: int
+    session_id: str
+    successes: int
+    repeats: int
+    last_seen: datetime
+
+
+class EvaluatorInputRow(NamedTuple):
+    """Ученик и одна из его последних сессий (evaluator.inputs); без сессий - NULL в её столбцах."""
+    id: int
+    level: str
+    level_up_streak: Optional[int]
+    level_down_streak: Optional[int]
+    increase_patch: Optional[bool]
+    session_id: Optional[str]
+    successes: Optional[int]
+    repeats: Optional[int]
+    last_seen: Optional[datetime]
+
+
+def fetch_all(cur, row_type: Type[Row]) -> List[Row]:
+    """Все строки курсора кортежей в виде row_type."""
+    return list(map(row_type._make, cur.fetchall()))
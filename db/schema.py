@@ -0,0 +1,55 @@
+"""
+Возможности схемы базы, которые код проверяет, а не предполагает.
+
+Подборщик работает и со старой схемой без колонки user_languages.increase_patch,
+поэтому раньше спрашивал information_schema на каждой сессии. Схема меняется только
+миграциями при старте (db/migrations.py), так что проверка выполняется один раз на
+процесс - при прогреве воркера (core/startup.py) или при первом обращении - и
+результат держится в памяти. Новая возможность - запрос проверки в db/queries.py
+и строка в CHECKS.
+"""
+import logging
+import threading
+from typing import Dict
+
+from db import queries
+
+logger = logging.getLogger(__name__)
+
+# Возможность -> запрос проверки (возвращает колонку exists)
+CHECKS: Dict[str, str] = {
+    "increase_patch": queries.HAS_INCREASE_PATCH,
+}
+
+_detected: Dict[str, bool] = {}
+_lock = threading.Lock()
+
+
+def _check(cur, name: str) -> bool:
+    cur.execute(CHECKS[name])
+    return bool(cur.fetchone()['exists'])
+
+
+def detect(cur) -> Dict[str, bool]:
+    """Проверяет все возможности схемы заново и запоминает результат."""
+    detected = {name: _check(cur, name) for name in CHECKS}
+    with _lock:
+        _detected.update(detected)
+    logger.info("Schema capabilities: %s", ", ".join(f"{name}={value}" for name, value in detected.items()))
+    return detected
+
+
+def has(cur, name: str) -> bool:
+    """Есть ли в схеме возможность name; при первом обращении проверяет её курсором cur."""
+    value = _detected.get(name)
+    if value is None:
+        value = _check(cur, name)
+        with _lock:
+            _detected[name] = value
+    return value
+
+
+def clear() -> None:
+    """Забывает проверенные возможности (после смены бэкенда или миграции вручную)."""
+    with _lock:
+        _detected.clear()
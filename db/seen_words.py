@@ -0,0 +1,146 @@
+"""
+Карта виденных слов ученика: бит word_id установлен, если по слову есть запись прогресса.
+
+Подборщик ищет незнакомые слова для New-L, Stretch+1 и Patch-1. Раньше это был
+LEFT JOIN user_progress ... WHERE up.id IS NULL по всем словам уровня на каждой
+сессии; с картой незнакомые слова - это каталог словаря (db/vocabulary.py) без
+установленных битов, то есть разность множеств в памяти.
+
+Карта хранится в user_languages.seen_words (bytea, колонки добавляет
+db/migrations.py) вместе со счётчиком seen_words_version и держится в памяти
+процесса. Бит ставится при первом ответе на слово в той же транзакции, что и
+запись прогресса, под блокировкой строки ученика, поэтому воркеры не затирают
+биты друг друга. Перед подбором сверяется версия (поиск по первичному ключу) -
+карта перечитывается, только если её изменил другой воркер. Пустая колонка
+(старые ученики, данные bench.dataset) заполняется из user_progress при первом
+подборе. Отключается переменной окружения SEEN_WORDS_MAP=0 (подбор возвращается
+к анти-join; карты при ответах всё равно поддерживаются).
+
+На реплике (db/routing.py) пустая карта строится для подбора, но не сохраняется
+и не кешируется: её сохранит первый подбор на основной базе.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from db import queries, routing
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("SEEN_WORDS_MAP", "1") != "0"
+
+# Сколько карт держать в памяти; карта весит max(word_id) / 8 байт
+CACHE_SIZE = int(os.environ.get("SEEN_WORDS_CACHE_SIZE", "1000"))
+
+# user_language_id -> (версия, карта); в конце - недавно использованные
+_cache: "OrderedDict[int, Tuple[int, bytearray]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def from_word_ids(word_ids: Iterable[int]) -> bytearray:
+    """Карта по списку id слов."""
+    bits = bytearray()
+    for word_id in word_ids:
+        add(bits, word_id)
+    return bits
+
+
+def contains(bits: bytearray, word_id: int) -> bool:
+    index = word_id >> 3
+    return index < len(bits) and bool(bits[index] >> (word_id & 7) & 1)
+
+
+def add(bits: bytearray, word_id: int) -> None:
+    """Ставит бит слова, при необходимости удлиняя карту."""
+    index = word_id >> 3
+    if index >= len(bits):
+        bits.extend(bytes(index + 1 - len(bits)))
+    bits[index] |= 1 << (word_id & 7)
+
+
+def remember(user_language_id: int, version: int, bits: bytearray) -> None:
+    """Кладёт карту в память процесса."""
+    with _lock:
+        _cache[user_language_id] = (version, bits)
+        _cache.move_to_end(user_language_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _cached(user_language_id: int, version: int) -> Optional[bytearray]:
+    with _lock:
+        cached = _cache.get(user_language_id)
+        if cached is None or cached[0] != version:
+            return None
+        _cache.move_to_end(user_language_id)
+        return cached[1]
+
+
+def last_known(user_language_id: int) -> Optional[bytearray]:
+    """Карта ученика из памяти без сверки версии (когда база недоступна) или None."""
+    with _lock:
+        cached = _cache.get(user_language_id)
+        return cached[1] if cached is not None else None
+
+
+def load(cur, user_language_id: int) -> bytearray:
+    """
+    Карта виденных слов ученика: из памяти, если версия в базе та же, иначе из
+    базы. Если карты ещё нет, строит её по user_progress и сохраняет.
+    """
+    cur.execute(queries.SEEN_WORDS_VERSION, (user_language_id,))
+    row = cur.fetchone()
+    if row is None:
+        return bytearray()
+    bits = _cached(user_language_id, row['version'])
+    if bits is not None:
+        return bits
+
+    cur.execute(queries.SEEN_WORDS_GET, (user_language_id,))
+    row = cur.fetchone()
+    if row['seen_words'] is None and routing.is_replica(getattr(cur, "connection", None)):
+        # Пока карта пуста, ответы не меняют её версию - построенную здесь карту нельзя кешировать
+        cur.execute(queries.SEEN_WORDS_PROGRESS, (user_language_id,))
+        return from_word_ids(r['word_id'] for r in cur.fetchall())
+    if row['seen_words'] is None:
+        # Строим под блокировкой: ответ, записанный параллельно, либо уже виден
+        # в user_progress, либо дождётся блокировки и поставит свой бит сам
+        cur.execute(queries.SEEN_WORDS_LOCK, (user_language_id,))
+        row = cur.fetchone()
+    if row['seen_words'] is None:
+        cur.execute(queries.SEEN_WORDS_PROGRESS, (user_language_id,))
+        bits = from_word_ids(r['word_id'] for r in cur.fetchall())
+        cur.execute(queries.SEEN_WORDS_SET, (bytes(bits), user_language_id))
+        version = row['version'] + 1
+        logger.info("Built seen-word map for user_language %s: %s bytes", user_language_id, len(bits))
+    else:
+        bits = bytearray(row['seen_words'])
+        version = row['version']
+    remember(user_language_id, version, bits)
+    return bits
+
+
+def mark_seen(cur, user_language_id: int, word_id: int) -> Optional[Tuple[int, bytearray]]:
+    """
+    Ставит бит слова в транзакции записи прогресса. Возвращает (версия, карта)
+    для remember() после коммита или None, если менять ничего не пришлось.
+    """
+    cur.execute(queries.SEEN_WORDS_LOCK, (user_language_id,))
+    row = cur.fetchone()
+    if row is None or row['seen_words'] is None:
+        # Карты ещё нет - её построят из user_progress при следующем подборе
+        return None
+    bits = bytearray(row['seen_words'])
+    if contains(bits, word_id):
+        return None
+    add(bits, word_id)
+    cur.execute(queries.SEEN_WORDS_SET, (bytes(bits), user_language_id))
+    return row['version'] + 1, bits
+
+
+def clear() -> None:
+    """Сбрасывает карты в памяти."""
+    with _lock:
+        _cache.clear()
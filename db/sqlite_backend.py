@@ -0,0 +1,158 @@
+"""
+Встроенный SQLite-бэкенд хранилища (DB_BACKEND=sqlite).
+
+Повторяет интерфейс соединения psycopg2, которым пользуется приложение:
+conn.cursor() как контекстный менеджер, cur.execute(sql, params) с
+плейсхолдерами %s, строки-словари, как у RealDictCursor (или кортежи -
+conn.cursor(tuples=True), как у обычного курсора psycopg2), и `with conn:`
+для транзакции. Текст запроса переводится в диалект SQLite через реестр
+db.queries, поэтому подборщик, онбординг, оценщик и авторизация работают
+без изменений. База открывается в режиме WAL: читатели не блокируют писателя.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from core.metrics import record_db_connection, record_db_query
+from core.tracing import start_span
+from db import queries
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "sqlite_schema.sql")
+
+# Сколько ждать снятия блокировки другим писателем (мс)
+BUSY_TIMEOUT_MS = 5000
+
+# Даты храним текстом ISO 8601: так они сравниваются в SQL как строки
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("timestamp", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("boolean", lambda value: bool(int(value)))
+
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _adapt_params(params):
+    # Списки id (unnest(%s::int[]) в Postgres) передаются в json_each как JSON
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        # Именованные параметры: в варианте для SQLite они записаны как :имя
+        return {key: json.dumps(list(p)) if isinstance(p, (list, tuple)) else p for key, p in params.items()}
+    return tuple(json.dumps(list(p)) if isinstance(p, (list, tuple)) else p for p in params)
+
+
+class SqliteCursor:
+    """Курсор с интерфейсом RealDictCursor поверх sqlite3."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query, vars=None):
+        name = queries.query_name(query)
+        span = start_span("db.query", timing="db", **{"db.statement": name or " ".join(query.split())[:120]})
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(queries.to_sqlite(query), _adapt_params(vars))
+        finally:
+            record_db_query(time.perf_counter() - started)
+            span.finish()
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(queries.to_sqlite(query), [_adapt_params(v) for v in vars_list])
+        finally:
+            record_db_query(time.perf_counter() - started)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SqliteConnection:
+    """Соединение с интерфейсом, которого ждёт код приложения от psycopg2."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self, tuples: bool = False) -> SqliteCursor:
+        cursor = self._conn.cursor()
+        if tuples:
+            # Фабрика курсора важнее фабрики соединения: строки остаются кортежами sqlite3
+            cursor.row_factory = None
+        return SqliteCursor(cursor)
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Как в psycopg2: коммит или откат, но соединение остаётся открытым
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+
+def _apply_schema(conn: sqlite3.Connection, path: str) -> None:
+    """Один раз на процесс создаёт таблицы и включает WAL."""
+    with _init_lock:
+        if path in _initialized_paths:
+            return
+        # journal_mode=WAL сохраняется в файле базы, остальное - настройки соединения
+        conn.execute("PRAGMA journal_mode=WAL")
+        with open(SQLITE_SCHEMA_PATH, encoding="utf-8") as f:
+            conn.executescript(f.read())
+        _initialized_paths.add(path)
+        logger.info("SQLite database ready: %s", path)
+
+
+def connect(path: str) -> SqliteConnection:
+    """Открывает базу SQLite, при первом обращении создаёт схему."""
+    with start_span("db.connect", timing="db-connect"):
+        started = time.perf_counter()
+        conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_MS / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+        )
+        conn.row_factory = _dict_row
+        # В WAL достаточно NORMAL: после сбоя теряются только последние транзакции, но не целостность
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _apply_schema(conn, path)
+        record_db_connection(time.perf_counter() - started)
+    return SqliteConnection(conn)
@@ -0,0 +1,63 @@
+-- Схема встроенного SQLite-бэкенда (DB_BACKEND=sqlite).
+-- Те же таблицы и колонки, что в Postgres (bench/schema.sql).
+-- Колонки и индексы, появившиеся позже, добавляет db/migrations.py.
+
+CREATE TABLE IF NOT EXISTS languages (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    base_language_id INTEGER REFERENCES languages (id),
+    created_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    last_active TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_languages (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    target_language_id INTEGER NOT NULL REFERENCES languages (id),
+    level TEXT NOT NULL DEFAULT 'A2',
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    started_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    increase_patch BOOLEAN DEFAULT FALSE,
+    level_up_streak INTEGER DEFAULT 0,
+    level_down_streak INTEGER DEFAULT 0,
+    level_changed_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    language_id INTEGER NOT NULL REFERENCES languages (id),
+    difficulty INTEGER NOT NULL,
+    frequency_rank INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS word_senses (
+    id INTEGER PRIMARY KEY,
+    word_id INTEGER NOT NULL REFERENCES words (id),
+    language_id INTEGER NOT NULL REFERENCES languages (id),
+    translation TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_progress (
+    id INTEGER PRIMARY KEY,
+    user_language_id INTEGER NOT NULL REFERENCES user_languages (id),
+    word_id INTEGER NOT NULL REFERENCES words (id),
+    repeats INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    success_rate REAL NOT NULL DEFAULT 0,
+    first_seen TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    last_seen TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    last_answer_wrong BOOLEAN NOT NULL DEFAULT FALSE,
+    session_id TEXT,
+    UNIQUE (user_language_id, word_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_languages_user ON user_languages (user_id, target_language_id);
+CREATE INDEX IF NOT EXISTS idx_word_senses_word ON word_senses (word_id, language_id);
@@ -0,0 +1,219 @@
+"""
+Кеш словаря в памяти процесса: каталог слов, переводы и пулы неправильных вариантов.
+
+Каждая сессия запрашивает перевод и три неправильных варианта для каждого из
+десяти слов - это двадцать обращений к базе со своим соединением. Словарь
+меняется только при импорте данных, поэтому кеш живёт до перезапуска процесса
+(или до clear()) и прогревается при старте процесса (core/startup.py).
+Каталог слов по языку и сложности нужен подборщику: незнакомые слова уровня -
+это каталог без слов из карты виденных (db/seen_words.py).
+Отключается переменной окружения VOCABULARY_CACHE=0.
+
+Если задан VOCABULARY_FILE, слова, переводы и пулы вариантов читаются из файла
+словаря, отображённого в память (db/vocabulary_file.py), - одна копия на все
+воркеры вместо своей в каждом. Раз в VOCABULARY_FILE_CHECK_SECONDS проверяется,
+не подменён ли файл новой сборкой; новая версия подхватывается без перезапуска.
+Слова и переводы, которых нет в файле, по-прежнему ищутся в базе и кешируются здесь.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from db import queries
+from db.vocabulary_file import VocabularyFile
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("VOCABULARY_CACHE", "1") != "0"
+
+# Файл словаря (db/vocabulary_file.py); пусто - кеш загружается запросами
+FILE_PATH = os.environ.get("VOCABULARY_FILE", "")
+FILE_CHECK_SECONDS = float(os.environ.get("VOCABULARY_FILE_CHECK_SECONDS", "5"))
+
+# (word_id, language_id) -> перевод
+_translations: Dict[Tuple[int, int], str] = {}
+
+# (language_id, difficulty) -> [(word_id, перевод)] - все кандидаты в неправильные варианты
+_distractor_pools: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+
+# Каталог слов: (язык слова, сложность) -> [(word_id, текст)] по возрастанию id
+_words_by_level: Optional[Dict[Tuple[int, int], List[Tuple[int, str]]]] = None
+
+# (язык слова, сложность) -> [word_id] по тому же каталогу
+_ids_by_level: Dict[Tuple[int, int], List[int]] = {}
+
+# word_id -> текст по тому же каталогу
+_word_texts: Dict[int, str] = {}
+
+_lock = threading.Lock()
+
+# Отображённый файл словаря, признаки файла на диске (inode, mtime, размер) и время последней проверки
+_file: Optional[VocabularyFile] = None
+_file_stat: Optional[Tuple[int, int, int]] = None
+_file_checked_at = 0.0
+_file_warned = False
+
+
+def mapped() -> Optional[VocabularyFile]:
+    """
+    Файл словаря или None, если VOCABULARY_FILE не задан или не открывается.
+    Подменённый файл (новая сборка) открывается заново, старое отображение
+    освобождается, когда на него не останется ссылок.
+    """
+    global _file, _file_stat, _file_checked_at, _file_warned
+    if not FILE_PATH:
+        return None
+    now = time.monotonic()
+    if _file is not None and now - _file_checked_at < FILE_CHECK_SECONDS:
+        return _file
+    with _lock:
+        if _file is not None and now - _file_checked_at < FILE_CHECK_SECONDS:
+            return _file
+        _file_checked_at = now
+        try:
+            stat = os.stat(FILE_PATH)
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if key != _file_stat:
+                vocabulary_file = VocabularyFile(FILE_PATH)
+                _file, _file_stat, _file_warned = vocabulary_file, key, False
+                logger.info("Vocabulary file %s mapped: %s", FILE_PATH, vocabulary_file.stats())
+        except (OSError, ValueError) as e:
+            # Файл ещё не собран или повреждён - работаем на прежней версии или запросами
+            if not _file_warned:
+                logger.warning("Vocabulary file %s not mapped: %s", FILE_PATH, e)
+                _file_warned = True
+    return _file
+
+
+def load_words(conn) -> Dict[Tuple[int, int], List[Tuple[int, str]]]:
+    """Загружает (или берёт из кеша) каталог всех слов по языку и сложности."""
+    global _words_by_level
+    words = _words_by_level
+    if words is None:
+        words = {}
+        with conn.cursor() as cur:
+            cur.execute(queries.VOCABULARY_WORDS)
+            for row in cur.fetchall():
+                words.setdefault((row["language_id"], row["difficulty"]), []).append((row["id"], row["text"]))
+        texts = {word_id: text for level in words.values() for word_id, text in level}
+        ids = {key: [word_id for word_id, _ in level] for key, level in words.items()}
+        with _lock:
+            _words_by_level = words
+            _ids_by_level.update(ids)
+            _word_texts.update(texts)
+        logger.info("Word catalog loaded: %s words", sum(len(level) for level in words.values()))
+    return words
+
+
+def ensure_words(conn) -> None:
+    """Готовит каталог слов: файл словаря, если он есть, иначе load_words."""
+    if mapped() is None:
+        load_words(conn)
+
+
+def word_ids_at(language_id: int, difficulty: int) -> Sequence[int]:
+    """id слов языка language_id сложности difficulty по возрастанию (после ensure_words)."""
+    vocabulary_file = mapped()
+    if vocabulary_file is not None:
+        return vocabulary_file.word_ids_at(language_id, difficulty)
+    return _ids_by_level.get((language_id, difficulty), [])
+
+
+def word_text(word_id: int) -> str:
+    """Текст слова из каталога."""
+    vocabulary_file = mapped()
+    if vocabulary_file is not None:
+        text = vocabulary_file.word_text(word_id)
+        if text is not None:
+            return text
+    return _word_texts.get(word_id, "")
+
+
+def get_translation(word_id: int, language_id: int) -> Optional[str]:
+    """Перевод из файла словаря или кеша; None, если его нет ни там, ни там."""
+    vocabulary_file = mapped()
+    if vocabulary_file is not None:
+        translation = vocabulary_file.translation(word_id, language_id)
+        if translation is not None:
+            return translation
+    return _translations.get((word_id, language_id))
+
+
+def put_translation(word_id: int, language_id: int, translation: str) -> None:
+    _translations[(word_id, language_id)] = translation
+
+
+def load_translations(conn, language_id: int) -> int:
+    """Загружает все переводы на язык. Возвращает число переводов."""
+    with conn.cursor() as cur:
+        cur.execute(queries.VOCABULARY_TRANSLATIONS, (language_id,))
+        rows = cur.fetchall()
+    with _lock:
+        for row in rows:
+            _translations[(row["word_id"], language_id)] = row["translation"]
+    return len(rows)
+
+
+def load_distractor_pool(conn, language_id: int, difficulty: int) -> List[Tuple[int, str]]:
+    """Загружает (или берёт из кеша) все переводы слов заданной сложности."""
+    key = (language_id, difficulty)
+    pool = _distractor_pools.get(key)
+    if pool is None:
+        with conn.cursor() as cur:
+            cur.execute(queries.VOCABULARY_DISTRACTORS, (language_id, difficulty))
+            pool = [(row["word_id"], row["translation"]) for row in cur.fetchall()]
+        with _lock:
+            _distractor_pools[key] = pool
+    return pool
+
+
+def has_distractor_pool(language_id: int, difficulty: int) -> bool:
+    vocabulary_file = mapped()
+    if vocabulary_file is not None and vocabulary_file.has_pool(language_id, difficulty):
+        return True
+    return (language_id, difficulty) in _distractor_pools
+
+
+def sample_distractors(language_id: int, difficulty: int, exclude_word_id: int, count: int) -> List[str]:
+    """
+    Случайные неправильные варианты из пула - то же, что ORDER BY RANDOM() LIMIT count
+    в translations.distractors, но без запроса к базе.
+    """
+    vocabulary_file = mapped()
+    if vocabulary_file is not None and vocabulary_file.has_pool(language_id, difficulty):
+        return vocabulary_file.sample_distractors(language_id, difficulty, exclude_word_id, count)
+    pool = _distractor_pools.get((language_id, difficulty), [])
+    # Берём с запасом на случай, если в выборку попадёт само слово
+    picked = random.sample(pool, min(count + 1, len(pool)))
+    return [translation for word_id, translation in picked if word_id != exclude_word_id][:count]
+
+
+def warm(conn, language_ids: List[int], difficulties: List[int]) -> Dict[str, int]:
+    """Прогревает кеш для языков перевода и уровней сложности. Возвращает размеры загруженного."""
+    vocabulary_file = mapped()
+    if vocabulary_file is not None:
+        # Всё уже в файле словаря - запросы не нужны
+        return vocabulary_file.stats()
+    stats = {"words": sum(len(level) for level in load_words(conn).values()), "translations": 0, "distractors": 0}
+    for language_id in language_ids:
+        stats["translations"] += load_translations(conn, language_id)
+        for difficulty in difficulties:
+            stats["distractors"] += len(load_distractor_pool(conn, language_id, difficulty))
+    logger.info("Vocabulary cache warmed: %s words, %s translations, %s distractor candidates",
+                stats["words"], stats["translations"], stats["distractors"])
+    return stats
+
+
+def clear() -> None:
+    """Сбрасывает кеш, например после импорта словаря (файл словаря открывается заново)."""
+    global _words_by_level, _file, _file_stat
+    with _lock:
+        _words_by_level = None
+        _file = _file_stat = None
+        _ids_by_level.clear()
+        _word_texts.clear()
+        _translations.clear()
+        _distractor_pools.clear()
@@ -0,0 +1,248 @@
+"""
+Файл словаря, общий для воркеров.
+
+Кеш словаря (db/vocabulary.py) в каждом воркере держит свою копию слов и переводов
+и загружает её запросами при старте. Файл словаря собирается один раз из words и
+word_senses, а воркеры отображают его в память только для чтения (mmap): страницы
+файла лежат в кеше ОС в одном экземпляре на все процессы, а прогрев воркера
+сводится к открытию файла.
+
+Формат little-endian (на других платформах файл не открывается): заголовок
+HEADER, затем секции int32 и в конце куча строк UTF-8. Столбцы читаются через
+memoryview без копирования:
+  - слова по возрастанию id: id, язык, сложность, frequency_rank (-1 - NULL) и
+    смещения текстов в куче (на одно больше числа слов);
+  - уровни (язык, сложность, начало, конец) и id слов, упорядоченные по уровню;
+  - значения (word_senses) по (язык перевода, word_id, id): word_id и смещения
+    переводов; диапазоны языков (язык, начало, конец);
+  - пулы неправильных вариантов (язык перевода, сложность слова, начало, конец)
+    и номера значений в них.
+Файл пишется во временный и подменяется через os.replace, поэтому воркеры видят
+либо старую, либо новую версию целиком.
+
+Сборка:
+    python -m db.vocabulary_file --path vocabulary.bin
+"""
+import os
+import sys
+import time
+import mmap
+import random
+import struct
+import logging
+import argparse
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from db import queries
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FLWV"
+FORMAT_VERSION = 1
+
+# magic, формат, время сборки (мс), слов, уровней, значений, языков, пулов, значений в пулах, байт кучи
+HEADER = struct.Struct("<4sIQIIIIIII")
+
+# Пропуск NULL в столбцах сложности и frequency_rank
+NULL = -1
+
+
+def _section(view: memoryview, offset: int, count: int) -> Tuple[memoryview, int]:
+    end = offset + 4 * count
+    return view[offset:end].cast("i"), end
+
+
+class VocabularyFile:
+    """Файл словаря, отображённый в память только для чтения."""
+    __slots__ = ("path", "built_at", "word_ids", "word_language", "word_difficulty", "word_rank",
+                 "_word_text_offsets", "_levels", "_sense_word_ids", "_sense_text_offsets",
+                 "_languages", "_pools", "_heap", "_mmap")
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise ValueError("Vocabulary file requires a little-endian platform")
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        (magic, format_version, built_at, n_words, n_levels, n_senses,
+         n_languages, n_pools, n_pool_senses, heap_size) = HEADER.unpack_from(view)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a vocabulary file of format {FORMAT_VERSION}")
+        self.built_at = built_at
+
+        offset = HEADER.size
+        self.word_ids, offset = _section(view, offset, n_words)
+        self.word_language, offset = _section(view, offset, n_words)
+        self.word_difficulty, offset = _section(view, offset, n_words)
+        self.word_rank, offset = _section(view, offset, n_words)
+        self._word_text_offsets, offset = _section(view, offset, n_words + 1)
+        levels, offset = _section(view, offset, 4 * n_levels)
+        level_word_ids, offset = _section(view, offset, n_words)
+        self._sense_word_ids, offset = _section(view, offset, n_senses)
+        self._sense_text_offsets, offset = _section(view, offset, n_senses + 1)
+        languages, offset = _section(view, offset, 3 * n_languages)
+        pools, offset = _section(view, offset, 4 * n_pools)
+        pool_senses, offset = _section(view, offset, n_pool_senses)
+        self._heap = view[offset:offset + heap_size]
+
+        # Таблицы уровней, языков и пулов маленькие - разворачиваем в словари срезов
+        self._levels = {
+            (levels[i], levels[i + 1]): level_word_ids[levels[i + 2]:levels[i + 3]]
+            for i in range(0, len(levels), 4)
+        }
+        self._languages = {languages[i]: (languages[i + 1], languages[i + 2]) for i in range(0, len(languages), 3)}
+        self._pools = {
+            (pools[i], pools[i + 1]): pool_senses[pools[i + 2]:pools[i + 3]]
+            for i in range(0, len(pools), 4)
+        }
+
+    def __len__(self) -> int:
+        return len(self.word_ids)
+
+    def _text(self, offsets: memoryview, index: int) -> str:
+        return str(self._heap[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def position(self, word_id: int) -> Optional[int]:
+        """Номер слова в столбцах или None, если слова нет в файле."""
+        i = bisect_left(self.word_ids, word_id)
+        return i if i < len(self.word_ids) and self.word_ids[i] == word_id else None
+
+    def text_at(self, position: int) -> str:
+        return self._text(self._word_text_offsets, position)
+
+    def word_text(self, word_id: int) -> Optional[str]:
+        position = self.position(word_id)
+        return None if position is None else self.text_at(position)
+
+    def word_ids_at(self, language_id: int, difficulty: int) -> Sequence[int]:
+        """id слов языка language_id сложности difficulty по возрастанию (без копирования)."""
+        return self._levels.get((language_id, difficulty), ())
+
+    def translation(self, word_id: int, language_id: int) -> Optional[str]:
+        """Первое значение слова на языке language_id - как translations.correct."""
+        start, end = self._languages.get(language_id, (0, 0))
+        i = bisect_left(self._sense_word_ids, word_id, start, end)
+        if i < end and self._sense_word_ids[i] == word_id:
+            return self._text(self._sense_text_offsets, i)
+        return None
+
+    def has_pool(self, language_id: int, difficulty: int) -> bool:
+        return (language_id, difficulty) in self._pools
+
+    def sample_distractors(self, language_id: int, difficulty: int, exclude_word_id: int, count: int) -> List[str]:
+        """Случайные неправильные варианты, как vocabulary.sample_distractors."""
+        pool = self._pools.get((language_id, difficulty), ())
+        # Берём с запасом на случай, если в выборку попадёт само слово
+        picked = [pool[i] for i in random.sample(range(len(pool)), min(count + 1, len(pool)))]
+        return [
+            self._text(self._sense_text_offsets, sense) for sense in picked
+            if self._sense_word_ids[sense] != exclude_word_id
+        ][:count]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "words": len(self.word_ids),
+            "translations": len(self._sense_word_ids),
+            "distractors": sum(len(pool) for pool in self._pools.values()),
+            "bytes": len(self._mmap),
+        }
+
+
+def _heap_append(heap: bytearray, offsets: array, text: Optional[str]) -> None:
+    heap.extend((text or "").encode("utf-8"))
+    offsets.append(len(heap))
+
+
+def build(conn, path: str) -> Dict[str, int]:
+    """Собирает файл словаря из words и word_senses и атомарно подменяет path."""
+    with conn.cursor() as cur:
+        cur.execute(queries.VOCABULARY_FILE_WORDS)
+        words = cur.fetchall()
+        cur.execute(queries.VOCABULARY_FILE_SENSES)
+        senses = cur.fetchall()
+
+    heap = bytearray()
+    word_ids, word_language, word_difficulty, word_rank = array("i"), array("i"), array("i"), array("i")
+    word_text_offsets = array("i", [0])
+    for row in words:
+        word_ids.append(row["id"])
+        word_language.append(row["language_id"])
+        word_difficulty.append(NULL if row["difficulty"] is None else row["difficulty"])
+        word_rank.append(NULL if row["frequency_rank"] is None else row["frequency_rank"])
+        _heap_append(heap, word_text_offsets, row["text"])
+
+    levels, level_word_ids = array("i"), array("i")
+    by_level = sorted(range(len(words)), key=lambda i: (word_language[i], word_difficulty[i], word_ids[i]))
+    for key, group in groupby(by_level, key=lambda i: (word_language[i], word_difficulty[i])):
+        start = len(level_word_ids)
+        level_word_ids.extend(word_ids[i] for i in group)
+        levels.extend((*key, start, len(level_word_ids)))
+
+    # Значения уже упорядочены запросом по (язык, word_id, id)
+    sense_word_ids, languages = array("i"), array("i")
+    sense_text_offsets = array("i", [len(heap)])
+    pool_members: Dict[Tuple[int, int], List[int]] = {}
+    for i, row in enumerate(senses):
+        sense_word_ids.append(row["word_id"])
+        _heap_append(heap, sense_text_offsets, row["translation"])
+        if row["difficulty"] is not None:
+            pool_members.setdefault((row["language_id"], row["difficulty"]), []).append(i)
+    for language_id, group in groupby(range(len(senses)), key=lambda i: senses[i]["language_id"]):
+        group = list(group)
+        languages.extend((language_id, group[0], group[-1] + 1))
+
+    pools, pool_senses = array("i"), array("i")
+    for key in sorted(pool_members):
+        start = len(pool_senses)
+        pool_senses.extend(pool_members[key])
+        pools.extend((*key, start, len(pool_senses)))
+
+    if len(heap) >= 2 ** 31:
+        raise ValueError("Vocabulary strings exceed 2 GiB, int32 offsets cannot address them")
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, int(time.time() * 1000), len(word_ids), len(levels) // 4,
+        len(sense_word_ids), len(languages) // 3, len(pools) // 4, len(pool_senses), len(heap)
+    )
+    if sys.byteorder != "little":
+        raise ValueError("Vocabulary file requires a little-endian platform")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for column in (word_ids, word_language, word_difficulty, word_rank, word_text_offsets,
+                       levels, level_word_ids, sense_word_ids, sense_text_offsets,
+                       languages, pools, pool_senses):
+            f.write(column.tobytes())
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    stats = {"words": len(word_ids), "translations": len(sense_word_ids),
+             "distractors": len(pool_senses), "bytes": os.path.getsize(path)}
+    logger.info("Vocabulary file %s built: %s", path, stats)
+    return stats
+
+
+def main() -> None:
+    from db.database import get_db_connection, close_db_connection
+
+    parser = argparse.ArgumentParser(description="Сборка файла словаря для воркеров")
+    parser.add_argument("--path", default=os.environ.get("VOCABULARY_FILE") or "vocabulary.bin")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    conn = get_db_connection()
+    try:
+        stats = build(conn, args.path)
+    finally:
+        close_db_connection(conn)
+    print(f"{args.path}: {stats['words']} words, {stats['translations']} translations, {stats['bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
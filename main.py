@@ -1,36 +1,59 @@
-from fastapi import FastAPI, Request, Response, Depends, HTTPException, status
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 import logging
-import uuid
-from typing import Dict, List, Optional, Any
+from contextlib import asynccontextmanager
 
 # Импорт модулей приложения
-from db.database import get_db_session
+from db import answer_events
 from api.auth import router as auth_router
 from api.words import router as words_router
-from services.session_evaluator import SessionEvaluator
-from models.config import CONFIG
+from api.metrics import router as metrics_router
+from api.health import router as health_router
+from core import startup
+from core.metrics import MetricsMiddleware
+from core.admission import AdmissionMiddleware
+from core.assets import ApiGZipMiddleware, PrecompressedStaticFiles, index_url
+from core.logs import configure_logging
+from core.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+from services import answer_spool, evaluation_queue
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Настройка логирования (один раз на процесс, см. core/logs.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев до приёма запросов: пул, миграции и схема, кеш словаря (core/startup.py)
+    await run_in_threadpool(startup.start)
+    # Секции журнала ответов (db/answer_events.py)
+    await run_in_threadpool(answer_events.start)
+    # Потоки очереди оценки сессий (services/evaluation_queue.py)
+    await run_in_threadpool(evaluation_queue.start)
+    # Воспроизведение ответов, принятых без базы (services/answer_spool.py)
+    await run_in_threadpool(answer_spool.start)
+    yield
+    answer_spool.stop()
+    evaluation_queue.stop()
+    answer_events.stop()
+    startup.stop()
+    # Спаны последних запросов (экспорт OTLP - сетевой вызов)
+    await run_in_threadpool(shutdown_tracing)
+
+
 # Создание приложения FastAPI
 app = FastAPI(
     title="Flowcado",
     description="Приложение для изучения иностранных слов",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Подключение статических файлов
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Шаблоны для HTML страниц
-templates = Jinja2Templates(directory="templates")
+# Подключение статических файлов: предсжатые варианты и кеширование файлов с отпечатками
+# (сборка: python -m core.assets)
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # CORS настройки для API
 app.add_middleware(
@@ -41,17 +64,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие JSON-ответов API
+app.add_middleware(ApiGZipMiddleware)
+
+# Допуск запросов: лимиты одновременных запросов и частоты учеников (core/admission.py);
+# внутри метрик, чтобы отклонённые запросы учитывались с их статусом
+app.add_middleware(AdmissionMiddleware)
+
+# Метрики запросов и обращений к БД
+app.add_middleware(MetricsMiddleware)
+
+# Трассировка запросов и заголовок Server-Timing
+configure_tracing()
+app.add_middleware(TracingMiddleware)
+
 # Подключение роутеров API
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(words_router, prefix="/api/words", tags=["words"])
-
-# Инициализация оценщика сессий
-evaluator = SessionEvaluator()
+app.include_router(metrics_router, tags=["metrics"])
+app.include_router(health_router, tags=["health"])
 
 # Корневой маршрут - перенаправление на статичный index.html
 @app.get("/", response_class=HTMLResponse)
 async def redirect_to_index():
-    return RedirectResponse(url="/static/index.html")
+    return RedirectResponse(url=index_url())
 
 # Запуск приложения (для отладки)
 if __name__ == "__main__":
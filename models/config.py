@@ -1,6 +1,7 @@
 # Словарь конфигурационных параметров приложения
 CONFIG = {
     "SESSION_SIZE": 10,                    # Количество слов в сессии
+    "SESSION_BATCH_MAX": 7,                # Максимум сессий в пакете для офлайн-клиента
     "QUARANTINE_MINUTES": 5,               # Временной карантин между повторениями
     "LONG_BREAK_DAYS": 14,                 # Дней в "длинном перерыве"
     "WSR_WEIGHTS": [3, 2, 1],              # Веса сессий для WSR (от новой к старой)
@@ -24,6 +25,11 @@ CONFIG = {
     "LAST_SEEN_DAYS_SHORT": 1,             # Короткий интервал (дни)
     "LAST_SEEN_DAYS_MEDIUM": 7,            # Средний интервал (дни)
     "LAST_SEEN_DAYS_LONG": 30,             # Длинный интервал (дни)
+
+    # Расписание повторений (models/schedule.py)
+    "REVIEW_MEDIUM_MIN_SUCCESSES": 2,      # Верных ответов для среднего интервала
+    "REVIEW_LONG_MIN_SUCCESSES": 4,        # Верных ответов для длинного интервала
+    "REVIEW_QUEUE_WINDOW": 30,             # Сколько ближайших по сроку слов смотрит подборщик
     
     # Пороги для адаптивного выбора новых слов
     "NEW_WORDS_THRESHOLD_LOW": 40,         # Нижний порог (%)
@@ -7,7 +7,10 @@ ERROR_MESSAGES = {
     "general_error": "Произошла ошибка. Попробуйте снова.",
     "no_answer": "Выберите перевод",
     "word_mismatch": "Ошибка: слово не совпадает. Попробуйте снова.",
-    "unauthorized": "Необходима авторизация для выполнения этого действия."
+    "unauthorized": "Необходима авторизация для выполнения этого действия.",
+    "rate_limited": "Слишком много запросов. Подождите немного и попробуйте снова.",
+    "overloaded": "Сервер перегружен. Попробуйте через несколько секунд.",
+    "database_unavailable": "Сервис временно недоступен. Попробуйте через минуту."
 }
 
 # Сообщения успеха
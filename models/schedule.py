@@ -0,0 +1,48 @@
+"""
+Расписание повторений.
+
+Срок следующего повторения (user_progress.next_review_at) считается при каждой
+записи прогресса из числа повторов и верных ответов, а подборщик берёт слабые
+и повторяемые слова одной выборкой самых просроченных записей по индексу
+(user_language_id, next_review_at).
+
+Интервалы берутся из CONFIG:
+  - последний ответ неверный или доля верных ниже WEAK_SUCCESS_THRESHOLD -
+    слово слабое, снова доступно через QUARANTINE_MINUTES;
+  - доля верных ниже REVIEW_SUCCESS_THRESHOLD или верных ответов меньше
+    REVIEW_MEDIUM_MIN_SUCCESSES - через LAST_SEEN_DAYS_SHORT;
+  - верных ответов меньше REVIEW_LONG_MIN_SUCCESSES - через LAST_SEEN_DAYS_MEDIUM;
+  - иначе - через LAST_SEEN_DAYS_LONG.
+Тот же расчёт на SQL - в заполнении колонки для старых записей (db/migrations.py).
+"""
+from datetime import datetime, timedelta
+
+from models.config import CONFIG
+
+
+def success_percent(repeats: int, successes: int) -> float:
+    """Доля верных ответов в процентах."""
+    return successes * 100 / repeats if repeats else 0.0
+
+
+def is_weak(repeats: int, successes: int, last_answer_wrong: bool,
+            threshold: float = CONFIG["WEAK_SUCCESS_THRESHOLD"]) -> bool:
+    """Слабое слово: последний ответ неверный или доля верных ниже порога (%)."""
+    return bool(last_answer_wrong) or success_percent(repeats, successes) < threshold
+
+
+def review_interval(repeats: int, successes: int, last_answer_wrong: bool) -> timedelta:
+    """Интервал до следующего повторения."""
+    if is_weak(repeats, successes, last_answer_wrong):
+        return timedelta(minutes=CONFIG["QUARANTINE_MINUTES"])
+    if (success_percent(repeats, successes) < CONFIG["REVIEW_SUCCESS_THRESHOLD"]
+            or successes < CONFIG["REVIEW_MEDIUM_MIN_SUCCESSES"]):
+        return timedelta(days=CONFIG["LAST_SEEN_DAYS_SHORT"])
+    if successes < CONFIG["REVIEW_LONG_MIN_SUCCESSES"]:
+        return timedelta(days=CONFIG["LAST_SEEN_DAYS_MEDIUM"])
+    return timedelta(days=CONFIG["LAST_SEEN_DAYS_LONG"])
+
+
+def next_review_at(repeats: int, successes: int, last_answer_wrong: bool, seen_at: datetime) -> datetime:
+    """Срок следующего повторения слова, показанного в seen_at."""
+    return seen_at + review_interval(repeats, successes, last_answer_wrong)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 import uuid
 
@@ -56,6 +56,15 @@ class WordSession(BaseModel):
     words: List[WordWithOptions]
     totalWords: int
 
+class CompactSession(BaseModel):
+    sessionId: str
+    # Слова в компактном виде: [wordId, text, индекс правильного варианта в options, options]
+    words: List[Tuple[int, str, int, List[str]]]
+
+class SessionBatch(BaseModel):
+    sessions: List[CompactSession]
+    totalSessions: int
+
 class UserAnswer(BaseModel):
     wordId: int
     userAnswer: str
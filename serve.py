@@ -0,0 +1,179 @@
+"""
+Продакшен-запуск: несколько процессов-воркеров uvicorn на одном сокете.
+
+Мастер открывает сокет и запускает воркеры (по умолчанию по числу ядер).
+Каждый воркер перед тем, как начать принимать соединения, прогревается в
+lifespan приложения (core/startup.py): открывает пул соединений с БД, проверяет
+схему и загружает кеш словаря. Пока воркер не вызвал accept, соединения из
+очереди сокета забирают уже готовые воркеры.
+
+По SIGTERM/SIGINT мастер пересылает сигнал воркерам; uvicorn перестаёт
+принимать соединения и дожидается активных запросов, после чего воркер
+дописывает очереди логов и трасс и закрывает пул. Воркер, обработавший
+--max-requests запросов (с разбросом --max-requests-jitter), завершается
+так же мягко, а мастер запускает ему замену.
+
+Запуск:
+    python serve.py --workers 4 --port 8000
+Для разработки по-прежнему run.py (один процесс с reload).
+"""
+import os
+import time
+import random
+import signal
+import socket
+import logging
+import argparse
+import multiprocessing
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+# Воркер, упавший быстрее этого времени после старта, перезапускаем с паузой
+MIN_WORKER_UPTIME = 5.0
+
+
+def shutdown_worker() -> None:
+    """Дописывает буферы и освобождает соединения после остановки сервера."""
+    from core.logs import shutdown_logging
+    from core.tracing import shutdown_tracing
+    from db import database
+
+    shutdown_tracing()
+    database.close_pool()
+    logger.info("Worker %s stopped", os.getpid())
+    shutdown_logging()
+
+
+def run_worker(sock: socket.socket, args: argparse.Namespace) -> None:
+    """Точка входа процесса-воркера."""
+    # Размер пула читается db.database при импорте приложения; пул открывает прогрев в lifespan
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+
+    max_requests = None
+    if args.max_requests:
+        max_requests = args.max_requests + random.randint(0, args.max_requests_jitter)
+
+    config = uvicorn.Config(
+        "main:app",
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keep_alive,
+        access_log=args.access_log,
+        # Логирование настраивает приложение (core/logs.py), у uvicorn своё не включаем
+        log_config=None,
+    )
+    config.load()
+
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock])
+    finally:
+        shutdown_worker()
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Мастер-процесс: держит заданное число воркеров и останавливает их мягко."""
+
+    def __init__(self, sock: socket.socket, args: argparse.Namespace):
+        self.sock = sock
+        self.args = args
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = {}  # процесс -> время запуска
+        self.stopping = False
+
+    def spawn(self) -> None:
+        process = self.context.Process(target=run_worker, args=(self.sock, self.args), daemon=False)
+        process.start()
+        self.workers[process] = time.monotonic()
+        logger.info("Started worker %s", process.pid)
+
+    def _on_signal(self, signum, frame) -> None:
+        logger.info("Received %s, draining workers", signal.Signals(signum).name)
+        self.stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        while not self.stopping:
+            for process, started in list(self.workers.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                del self.workers[process]
+                if self.stopping:
+                    break
+                uptime = time.monotonic() - started
+                # Код 0 - плановая замена после max-requests, остальное - падение
+                if process.exitcode == 0:
+                    logger.info("Worker %s recycled after %.0f s", process.pid, uptime)
+                else:
+                    logger.warning("Worker %s exited with code %s", process.pid, process.exitcode)
+                    if uptime < MIN_WORKER_UPTIME:
+                        time.sleep(1)
+                self.spawn()
+            time.sleep(0.2)
+
+        self.drain()
+
+    def drain(self) -> None:
+        """Пересылает SIGTERM воркерам и ждёт их завершения, зависшие добивает."""
+        for process in self.workers:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        for process in self.workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker %s did not stop in time, killing", process.pid)
+                process.kill()
+                process.join()
+        logger.info("All workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Продакшен-запуск Flowcado")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="Число процессов (по умолчанию - по числу ядер)")
+    parser.add_argument("--pool-size", type=int, default=int(os.environ.get("DB_POOL_SIZE", "10")),
+                        help="Соединений с БД в пуле каждого воркера")
+    parser.add_argument("--max-requests", type=int, default=int(os.environ.get("MAX_REQUESTS", "10000")),
+                        help="Перезапускать воркер после стольких запросов (0 - никогда)")
+    parser.add_argument("--max-requests-jitter", type=int,
+                        default=int(os.environ.get("MAX_REQUESTS_JITTER", "1000")),
+                        help="Случайная добавка к --max-requests, чтобы воркеры не уходили разом")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("GRACEFUL_TIMEOUT", "30")),
+                        help="Сколько секунд ждать активные запросы при остановке")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Таймаут keep-alive (с)")
+    parser.add_argument("--access-log", action="store_true", help="Писать журнал доступа uvicorn")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    sock = _bind_socket(args.host, args.port)
+    logger.info("Listening on %s:%s with %s workers", args.host, args.port, args.workers)
+    try:
+        Supervisor(sock, args).run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
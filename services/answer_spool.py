@@ -0,0 +1,248 @@
+"""
+Очередь ответов на локальном диске, пока база недоступна (db/breaker.py).
+
+submit-answer и finish-session при ошибке доступности базы не отвечают 500: ответ
+или завершение сессии дописывается строкой JSON в файл своего процесса
+ANSWER_SPOOL_DIR/answers-<pid>.jsonl с fsync - запись переживает и падение
+процесса, - а ученик получает обычный ответ: правильность проверяется по самому
+запросу, оценка сессии - "queued".
+
+Поток воспроизведения раз в ANSWER_SPOOL_REPLAY_SECONDS, если автомат защиты
+замкнут, забирает файлы всех процессов (и завершившихся): под блокировкой flock
+файл переименовывается в *.replay, и следующие записи процесса идут в новый файл.
+Записи забранных файлов применяются по времени ответа: прогресс и журнал ответов -
+со временем ответа, завершения сессий - в очередь оценки (services/evaluation_queue.py).
+Число применённых записей файла сохраняется рядом (*.done), поэтому после нового
+сбоя базы или падения процесса воспроизведение продолжается с того же места:
+повторно может примениться только запись, на которой процесс упал. Запись с ошибкой
+данных (например, слово удалено) пропускается с ошибкой в журнале.
+
+ANSWER_SPOOL=0 - выключить (ошибка базы - 500, как раньше). Метрика
+flowcado_answer_spool_total{result}: spooled, replayed, failed.
+"""
+import os
+import glob
+import heapq
+import json
+import fcntl
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.metrics import ANSWER_SPOOL
+from db import breaker
+from db.database import get_or_create_user_language, update_user_progress
+from services import evaluation_queue
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("ANSWER_SPOOL", "1") != "0"
+
+# Каталог файлов очереди; должен переживать перезапуск (не tmpfs)
+DIRECTORY = os.environ.get("ANSWER_SPOOL_DIR", "spool")
+
+# Период попыток воспроизведения
+REPLAY_SECONDS = float(os.environ.get("ANSWER_SPOOL_REPLAY_SECONDS", "5"))
+
+_PREFIX = "answers-"
+_ACTIVE = ".jsonl"
+_CLAIMED = ".replay"
+_DONE = ".done"
+
+_write_lock = threading.Lock()
+_replay_lock = threading.Lock()
+_stopping = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def accepts(error: BaseException) -> bool:
+    """Запрос, упавший с этой ошибкой, можно принять через очередь на диске."""
+    return ENABLED and breaker.is_outage(error)
+
+
+def _append(entry: Dict[str, Any]) -> None:
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    path = os.path.join(DIRECTORY, f"{_PREFIX}{os.getpid()}{_ACTIVE}")
+    with _write_lock:
+        os.makedirs(DIRECTORY, exist_ok=True)
+        while True:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Файл держит воспроизведение, которое его забирает, - через миг путь укажет на новый
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    time.sleep(0.001)
+                    continue
+                # Файл могли забрать между открытием и блокировкой - тогда пишем в новый
+                try:
+                    current = os.stat(path).st_ino == os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    os.write(fd, line)
+                    os.fsync(fd)
+                    break
+            finally:
+                os.close(fd)
+    ANSWER_SPOOL.labels("spooled").inc()
+
+
+def append_answer(user_id: int, target_language_id: int, word_id: int, is_correct: bool,
+                  session_id: Optional[str]) -> None:
+    """Ставит ответ в очередь на диске."""
+    _append({
+        "kind": "answer", "at": datetime.now().isoformat(), "user_id": user_id,
+        "language_id": target_language_id, "word_id": word_id, "correct": is_correct,
+        "session_id": session_id,
+    })
+
+
+def append_finish(user_id: int, target_language_id: int, session_id: Optional[str]) -> None:
+    """Ставит завершение сессии в очередь на диске."""
+    _append({
+        "kind": "finish", "at": datetime.now().isoformat(), "user_id": user_id,
+        "language_id": target_language_id, "session_id": session_id,
+    })
+
+
+def _apply(entry: Dict[str, Any]) -> None:
+    user_language_id, _ = get_or_create_user_language(entry["user_id"], entry["language_id"])
+    if entry["kind"] == "answer":
+        update_user_progress(user_language_id, entry["word_id"], entry["correct"], entry["session_id"],
+                             answered_at=datetime.fromisoformat(entry["at"]))
+    else:
+        evaluation_queue.enqueue(entry["user_id"], user_language_id, entry["session_id"],
+                                 finished_at=datetime.fromisoformat(entry["at"]))
+
+
+def _claim() -> List[Tuple[str, int]]:
+    """
+    Забирает файлы очереди под блокировкой: активные файлы процессов (переименованием)
+    и брошенные воспроизведения. Возвращает (путь, дескриптор с блокировкой).
+    """
+    claimed = []
+    for path in sorted(glob.glob(os.path.join(DIRECTORY, _PREFIX + "*"))):
+        if not path.endswith((_ACTIVE, _CLAIMED)):
+            continue
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if path.endswith(_ACTIVE):
+                if os.stat(path).st_ino != os.fstat(fd).st_ino:
+                    raise FileNotFoundError(path)
+                target = f"{path[:-len(_ACTIVE)]}.{time.time_ns()}{_CLAIMED}"
+                os.rename(path, target)
+                path = target
+        except (BlockingIOError, FileNotFoundError):
+            # Файл пишет или воспроизводит другой процесс, или его уже забрали
+            os.close(fd)
+            continue
+        claimed.append((path, fd))
+    return claimed
+
+
+def _read_done(path: str) -> int:
+    try:
+        with open(path + _DONE) as f:
+            return int(f.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_done(path: str, count: int) -> None:
+    temporary = path + _DONE + ".tmp"
+    with open(temporary, "w") as f:
+        f.write(str(count))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path + _DONE)
+
+
+def _entries(index: int, path: str) -> Iterator[Tuple[str, int, int, str]]:
+    """Непримененные строки файла: (время ответа, номер файла, номер строки, строка)."""
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    for number in range(_read_done(path), len(lines)):
+        line = lines[number]
+        try:
+            at = json.loads(line)["at"]
+        except (ValueError, KeyError):
+            # Строка, оборванная падением процесса, - применять нечего
+            at = ""
+        yield at, index, number, line
+
+
+def replay() -> int:
+    """Применяет записи очереди всех процессов; возвращает число применённых."""
+    if not os.path.isdir(DIRECTORY):
+        return 0
+    with _replay_lock:
+        claimed = _claim()
+        if not claimed:
+            return 0
+        applied = 0
+        finished = True
+        try:
+            # Ответы сессии могли попасть в файлы разных воркеров - применяем все по времени
+            for at, index, number, line in heapq.merge(*(_entries(i, path) for i, (path, _) in enumerate(claimed))):
+                try:
+                    _apply(json.loads(line))
+                except Exception as e:
+                    if breaker.is_outage(e):
+                        logger.warning("Answer spool replay paused, database unavailable: %s", e)
+                        finished = False
+                        break
+                    logger.error("Dropping spooled entry %s: %s", line.strip(), e)
+                    ANSWER_SPOOL.labels("failed").inc()
+                else:
+                    ANSWER_SPOOL.labels("replayed").inc()
+                    applied += 1
+                _write_done(claimed[index][0], number + 1)
+            if finished:
+                for path, _ in claimed:
+                    os.remove(path)
+                    if os.path.exists(path + _DONE):
+                        os.remove(path + _DONE)
+        finally:
+            for _, fd in claimed:
+                os.close(fd)
+    if applied:
+        logger.info("Replayed %s spooled answers and session finishes", applied)
+    return applied
+
+
+def _replay_loop() -> None:
+    while True:
+        if not breaker.is_open():
+            try:
+                replay()
+            except Exception as e:
+                logger.warning("Answer spool replay failed: %s", e)
+        if _stopping.wait(REPLAY_SECONDS):
+            return
+
+
+def start() -> None:
+    """Запускает поток воспроизведения (при старте приложения; сразу - оставшееся от прошлых запусков)."""
+    global _thread
+    if not ENABLED or _thread is not None:
+        return
+    _stopping.clear()
+    _thread = threading.Thread(target=_replay_loop, name="answer-spool", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Останавливает поток воспроизведения; невоспроизведённое остаётся на диске."""
+    global _thread
+    if _thread is None:
+        return
+    _stopping.set()
+    _thread.join(timeout)
+    _thread = None
@@ -0,0 +1,135 @@
+"""
+Подбор сессии без базы - деградированный режим, пока база недоступна (db/breaker.py).
+
+Раньше при ошибке базы select_words возвращал [], и ученик получал "недостаточно
+слов". Теперь start-session собирает сессию только из памяти процесса:
+- связь ученик-язык и уровень - последние известные процессу
+  (database.last_known_user_language), без них - начальный уровень A2;
+- Weak и Review - по последнему снимку прогресса ученика (PICKER_ENGINE=snapshot,
+  services/snapshot_picker.py), теми же правилами split_due_words;
+- остальное - случайные слова уровня из каталога словаря (db/vocabulary.py): сначала
+  незнакомые по снимку или карте виденных слов (db/seen_words.py), затем любые
+  слова уровня и соседних уровней;
+- переводы и неправильные варианты - из кеша или файла словаря. Слова без перевода
+  в памяти пропускаются; без загруженного пула вариантов неправильными вариантами
+  служат переводы других слов сессии.
+
+Такая сессия не видит ответов после снимка - это плата за то, что ученик
+продолжает заниматься. Ответы на её слова записываются как обычно или через очередь
+на диске (services/answer_spool.py). Без каталога в памяти (VOCABULARY_CACHE=0,
+непрогретый воркер) сессию собрать не из чего. Метрика
+flowcado_degraded_sessions_total{source}: snapshot, seen_words или vocabulary - что
+было известно об ученике.
+"""
+import random
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from core.metrics import DEGRADED_SESSIONS
+from db import seen_words, vocabulary
+from db.database import last_known_user_language
+from db.rows import WordRow
+from models.config import CONFIG, LEVEL_TO_DIFFICULTY
+from services import snapshot_picker
+from services.picker import split_due_words
+
+logger = logging.getLogger(__name__)
+
+# Уровень ученика, о котором процесс ничего не знает (как у новой связи ученик-язык)
+DEFAULT_LEVEL = "A2"
+
+
+def _level_words(language_id: int, difficulty: int, known: Callable[[int], bool],
+                 taken: set) -> List[int]:
+    """Слова уровня в случайном порядке: сначала незнакомые, затем знакомые."""
+    ids = [word_id for word_id in vocabulary.word_ids_at(language_id, difficulty) if word_id not in taken]
+    random.shuffle(ids)
+    return [word_id for word_id in ids if not known(word_id)] + [word_id for word_id in ids if known(word_id)]
+
+
+def _options(word_id: int, correct: str, difficulty: int, translation_language_id: int,
+             session_translations: List[str]) -> List[str]:
+    if vocabulary.has_distractor_pool(translation_language_id, difficulty):
+        wrong = vocabulary.sample_distractors(translation_language_id, difficulty, word_id, 3)
+    else:
+        others = [t for t in set(session_translations) if t != correct]
+        wrong = random.sample(others, min(3, len(others)))
+    options = [correct] + wrong
+    random.shuffle(options)
+    return options
+
+
+def select_words(user_id: int, target_language_id: int, translation_language_id: int = 2,
+                 user_language_id: Optional[int] = None, level: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Сессия из памяти процесса в формате services.picker.select_words; [] - в памяти
+    нет ни каталога, ни переводов.
+    """
+    if user_language_id is None or level is None:
+        learner = last_known_user_language(user_id, target_language_id)
+        if learner is not None:
+            user_language_id, level = learner
+    level = level or DEFAULT_LEVEL
+    difficulty = LEVEL_TO_DIFFICULTY[level]
+
+    words: List[WordRow] = []
+    known: Callable[[int], bool] = lambda word_id: False
+    source = "vocabulary"
+    snapshot = snapshot_picker.last_snapshot(user_language_id) if user_language_id is not None else None
+    seen = seen_words.last_known(user_language_id) if user_language_id is not None else None
+    if snapshot is not None:
+        source = "snapshot"
+        weak_words, review_words = split_due_words(
+            snapshot.due_window(difficulty, CONFIG["REVIEW_QUEUE_WINDOW"]), datetime.now()
+        )
+        words = weak_words[:CONFIG["WEAK_WORDS_TARGET"]] + review_words[:CONFIG["REVIEW_WORDS_TARGET"]]
+        progress_ids = {int(word_id) for word_id in snapshot.word_ids}
+        known = progress_ids.__contains__
+    elif seen is not None:
+        source = "seen_words"
+        known = lambda word_id: seen_words.contains(seen, word_id)
+
+    # Только слова, перевод которых есть в памяти
+    translations = {}
+    for word in words:
+        translation = vocabulary.get_translation(word.id, translation_language_id)
+        if translation is not None:
+            translations[word.id] = translation
+    words = [word for word in words if word.id in translations]
+
+    size = CONFIG["SESSION_SIZE"]
+    taken = {word.id for word in words}
+    for word_difficulty in (difficulty, difficulty + 1, difficulty - 1):
+        if len(words) >= size:
+            break
+        for word_id in _level_words(target_language_id, word_difficulty, known, taken):
+            translation = vocabulary.get_translation(word_id, translation_language_id)
+            if translation is None:
+                continue
+            translations[word_id] = translation
+            words.append(WordRow(word_id, vocabulary.word_text(word_id)))
+            taken.add(word_id)
+            if len(words) >= size:
+                break
+
+    if not words:
+        logger.error("Cannot serve degraded session for user %s: vocabulary is not in memory", user_id)
+        return []
+
+    random.shuffle(words)
+    session_translations = list(translations.values())
+    result = [
+        {
+            "wordId": word.id,
+            "text": word.text,
+            "correctTranslation": translations[word.id],
+            "options": _options(word.id, translations[word.id], difficulty, translation_language_id,
+                                session_translations),
+        }
+        for word in words
+    ]
+    logger.warning("Serving degraded session for user %s, level %s from %s: %s words",
+                   user_id, level, source, len(result))
+    DEGRADED_SESSIONS.labels(source).inc()
+    return result
@@ -0,0 +1,270 @@
+"""
+Очередь оценки сессий.
+
+/finish-session не ждёт оценки (WSR, счётчики порогов, смена уровня, increase_patch):
+он записывает завершение сессии в таблицу session_evaluations и сразу отвечает, а
+оценку выполняют фоновые потоки процесса. Строка очереди удаляется в транзакции
+оценки (SessionEvaluator.apply), поэтому каждая оценка применяется ровно один раз:
+при падении процесса до коммита строка остаётся, и её подберёт периодический обход
+в любом воркере.
+
+Порядок: оценки одного ученика применяются строго по очереди - обрабатывается только
+самая старая строка ученика, и только если её никто не держит: транзакция оценки
+блокирует строку очереди (FOR UPDATE) до своего коммита. Потоки процесса делят учеников
+по user_language_id, поэтому ученик в процессе обрабатывается одним потоком; между
+процессами порядок держит блокировка строки. Неудачная оценка повторяется через
+EVALUATION_RETRY_SECONDS (с ростом по числу попыток), после EVALUATION_MAX_ATTEMPTS
+попыток строка отбрасывается с ошибкой в журнале.
+Оценка считает итоги сессий на момент завершения сессии (enqueued_at), поэтому
+опоздавшая оценка (повтор, офлайн-клиент) не видит ответов следующих сессий, а
+накопившиеся оценки ученика оценивают каждая свою сессию.
+
+Перед подбором сессии settle() применяет оценки ученика, чтобы подбор видел уже
+решённый уровень. Оценку, которую применяет другой обработчик, settle() дожидается
+(не дольше EVALUATION_WAIT_SECONDS) на блокировке самой строки очереди - без опроса,
+и применяет следующие сам. В SQLite писатель один: ожидание - на блокировке базы.
+Оценку, ждущую повтора после ошибки, не ждёт: подбор идёт по текущему уровню, оценку
+применит повтор.
+
+EVALUATION_QUEUE=0 - оценка прямо в /finish-session, как раньше.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from psycopg2.errors import LockNotAvailable
+
+from core.metrics import SESSION_EVALUATIONS, SESSION_EVALUATION_LAG
+from db import queries, routing
+from db.database import get_db_connection, close_db_connection
+from services.session_evaluator import SessionEvaluator
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("EVALUATION_QUEUE", "1") != "0"
+
+# Потоков оценки на процесс
+WORKERS = int(os.environ.get("EVALUATION_WORKERS", "2"))
+
+# Пауза перед повтором неудачной оценки (умножается на номер попытки)
+RETRY_SECONDS = float(os.environ.get("EVALUATION_RETRY_SECONDS", "5"))
+
+# После скольких попыток оценка отбрасывается
+MAX_ATTEMPTS = int(os.environ.get("EVALUATION_MAX_ATTEMPTS", "5"))
+
+# Сколько start-session ждёт оценки, которую применяет другой поток или процесс
+WAIT_SECONDS = float(os.environ.get("EVALUATION_WAIT_SECONDS", "2"))
+
+# Период обхода брошенных оценок (и сколько незахваченная оценка ждёт своего потока)
+SWEEP_SECONDS = float(os.environ.get("EVALUATION_SWEEP_SECONDS", "30"))
+
+# Учеников за один обход
+_SWEEP_BATCH = 100
+
+evaluator = SessionEvaluator()
+
+_queues: List["queue.Queue[Optional[int]]"] = []
+_threads: List[threading.Thread] = []
+_stopping = threading.Event()
+_lock = threading.Lock()
+
+
+def enqueue(user_id: int, user_language_id: int, session_id: Optional[str],
+            finished_at: Optional[datetime] = None) -> int:
+    """
+    Записывает завершение сессии в очередь и передаёт ученика потоку оценки.
+    finished_at - когда сессия завершена, если завершение записывается позже
+    (очередь на диске); по умолчанию - сейчас. Оценка учитывает только ответы до него.
+    """
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(queries.EVALUATION_ENQUEUE, (user_language_id, user_id, session_id,
+                                                         finished_at or datetime.now()))
+                evaluation_id = cur.fetchone()['id']
+    finally:
+        close_db_connection(conn)
+    SESSION_EVALUATIONS.labels("queued").inc()
+    _submit(user_language_id)
+    return evaluation_id
+
+
+def _submit(user_language_id: int) -> None:
+    # Без запущенных потоков оценку применит settle() или обход в другом процессе
+    if _queues:
+        _queues[user_language_id % len(_queues)].put(user_language_id)
+
+
+def _apply_next(user_language_id: int, wait: bool = False) -> Tuple[Optional[dict], bool]:
+    """
+    Применяет самую старую оценку ученика: строка очереди заблокирована и удаляется в
+    транзакции оценки. Возвращает (строка, занято): строка - применённая оценка,
+    занято - оценку держит другой обработчик. wait - дождаться её (не дольше
+    WAIT_SECONDS). Оценка, ждущая повтора, не применяется и занятой не считается;
+    неудачная откладывается до повтора.
+    """
+    row = None
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                next_query = queries.EVALUATION_NEXT
+                if wait:
+                    cur.execute(queries.EVALUATION_LOCK_TIMEOUT, (f"{int(WAIT_SECONDS * 1000)}ms",))
+                    next_query = queries.EVALUATION_WAIT_NEXT
+                while True:
+                    cur.execute(next_query, (user_language_id,))
+                    candidate = cur.fetchone()
+                    if candidate is None and next_query is queries.EVALUATION_WAIT_NEXT:
+                        # Дождались удаления строки - следующую читаем заново
+                        next_query = queries.EVALUATION_NEXT
+                        continue
+                    if candidate is None:
+                        return None, False
+                    if candidate['locked_until'] is not None and candidate['locked_until'] >= datetime.now():
+                        # Ждёт повтора или захвачена по сроку обработчиком прежней версии
+                        return None, candidate['retry_at'] is None
+                    cur.execute(queries.EVALUATION_DONE, (candidate['id'],))
+                    if cur.rowcount != 1:
+                        # SQLite: оценку уже применил другой обработчик
+                        continue
+                    if candidate['attempts'] >= MAX_ATTEMPTS:
+                        logger.error("Dropping evaluation %s of user_language %s after %s attempts",
+                                     candidate['id'], user_language_id, candidate['attempts'])
+                        SESSION_EVALUATIONS.labels("dropped").inc()
+                        continue
+                    row = candidate
+                    evaluator.apply(conn, row['user_id'], user_language_id, row['enqueued_at'])
+                    break
+    except LockNotAvailable:
+        return None, True
+    except Exception as e:
+        if row is None:
+            raise
+        retry_at = datetime.now() + timedelta(seconds=RETRY_SECONDS * (row['attempts'] + 1))
+        logger.warning("Evaluation %s of user_language %s failed (attempt %s), retrying at %s: %s",
+                       row['id'], user_language_id, row['attempts'] + 1, retry_at, e)
+        SESSION_EVALUATIONS.labels("failed").inc()
+        _retry_at(row, retry_at)
+        return None, False
+    finally:
+        close_db_connection(conn)
+    routing.note_write(user_language_id)
+    return row, False
+
+
+def _retry_at(row: dict, retry_at: datetime) -> None:
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(queries.EVALUATION_RETRY_AT, (retry_at, retry_at, row['id']))
+    finally:
+        close_db_connection(conn)
+
+
+def process(user_language_id: int, wait: bool = False) -> Tuple[int, bool]:
+    """
+    Применяет оценки ученика по порядку. Возвращает (применено, занято): занято -
+    следующую оценку держит другой обработчик (с wait - и после WAIT_SECONDS ожидания).
+    На оценке, ждущей повтора, обработка останавливается.
+    """
+    applied = 0
+    while True:
+        row, busy = _apply_next(user_language_id, wait)
+        if row is None:
+            return applied, busy
+        SESSION_EVALUATIONS.labels("applied").inc()
+        SESSION_EVALUATION_LAG.observe((datetime.now() - row['enqueued_at']).total_seconds())
+        applied += 1
+
+
+def settle(user_language_id: int) -> bool:
+    """
+    Применяет или дожидается оценок ученика перед подбором сессии. Возвращает True,
+    если оценки были (уровень мог измениться и его стоит перечитать).
+    """
+    applied, busy = process(user_language_id)
+    if not busy:
+        return applied > 0
+    _, busy = process(user_language_id, wait=True)
+    if busy:
+        logger.warning("Evaluations of user_language %s still held by another handler", user_language_id)
+        SESSION_EVALUATIONS.labels("wait_timeout").inc()
+    return True
+
+
+def sweep() -> int:
+    """Передаёт потокам учеников с брошенными оценками; возвращает их число."""
+    now = datetime.now()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(queries.EVALUATION_ORPHANED, (now, now - timedelta(seconds=SWEEP_SECONDS), _SWEEP_BATCH))
+            user_language_ids = [row['user_language_id'] for row in cur.fetchall()]
+        conn.rollback()
+    finally:
+        close_db_connection(conn)
+    for user_language_id in user_language_ids:
+        _submit(user_language_id)
+    return len(user_language_ids)
+
+
+def _work(jobs: "queue.Queue[Optional[int]]") -> None:
+    while True:
+        user_language_id = jobs.get()
+        if user_language_id is None:
+            return
+        try:
+            process(user_language_id)
+        except Exception as e:
+            # Оценка осталась в таблице - её подберёт следующий обход
+            logger.error("Evaluation worker failed for user_language %s: %s", user_language_id, e)
+
+
+def _sweep_loop() -> None:
+    while not _stopping.wait(SWEEP_SECONDS):
+        try:
+            sweep()
+        except Exception as e:
+            logger.warning("Evaluation sweep failed: %s", e)
+
+
+def start(workers: int = WORKERS) -> None:
+    """Запускает потоки оценки и обход брошенных оценок (при старте приложения)."""
+    with _lock:
+        if _threads or not ENABLED:
+            return
+        _stopping.clear()
+        for i in range(max(workers, 1)):
+            jobs: "queue.Queue[Optional[int]]" = queue.Queue()
+            thread = threading.Thread(target=_work, args=(jobs,), name=f"evaluation-{i}", daemon=True)
+            _queues.append(jobs)
+            _threads.append(thread)
+            thread.start()
+        sweeper = threading.Thread(target=_sweep_loop, name="evaluation-sweep", daemon=True)
+        _threads.append(sweeper)
+        sweeper.start()
+    # Оценки, оставшиеся от прошлого запуска
+    try:
+        sweep()
+    except Exception as e:
+        logger.warning("Evaluation sweep failed: %s", e)
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Останавливает потоки после текущих оценок; необработанные остаются в таблице."""
+    with _lock:
+        _stopping.set()
+        for jobs in _queues:
+            jobs.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in _threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        _queues.clear()
+        _threads.clear()
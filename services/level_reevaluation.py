@@ -0,0 +1,153 @@
+"""
+Пакетная переоценка уровней всех учеников.
+
+SessionEvaluator меняет уровень только при завершении сессии, по одному ученику.
+После изменения LEVEL_UP_THRESHOLD, LEVEL_DOWN_THRESHOLD или WSR_WEIGHTS этот
+модуль переоценивает всех активных user_languages сразу: ученики делятся на пачки
+по id, для пачки двумя запросами читаются уровни и последние сессии
+(reevaluation.learners, reevaluation.recent_sessions), а изменившиеся строки
+записываются одним UPDATE на пачку.
+
+Переоценка не добавляет сессию к счётчикам порогов, а пересчитывает их заново
+(replay_learner): по последним LEVEL_CHANGE_STREAK сессиям после смены уровня, с
+WSR каждой, как при её оценке, но по текущим порогам и весам. Сессии и время смены
+уровня от запуска к запуску не меняются (смена уровня отсекает сессии до неё),
+поэтому повторный запуск ничего не меняет.
+
+Пачки обрабатываются параллельно (--workers), каждая в своей транзакции. В Postgres
+строки пачки заблокированы до записи результата; у SQLite писатель один, поэтому
+воркер там всегда один.
+
+Запуск:
+    python -m services.level_reevaluation --dry-run     # только посчитать изменения
+    python -m services.level_reevaluation --workers 4 --chunk-size 1000
+"""
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from psycopg2.extras import execute_values
+
+from db import database, queries
+from db.rows import RecentSessionRow, ReevaluationLearnerRow, fetch_all
+from services.session_evaluator import (
+    REEVALUATION_SESSIONS, SESSION_EVENTS_WINDOW, Evaluation, change_level, replay_learner
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_WORKERS = 4
+
+
+def _apply(cur, evaluations: List[Evaluation]) -> None:
+    """Записывает результаты пачки одним запросом (в SQLite - executemany без обращений к серверу)."""
+    if database.DB_BACKEND == "sqlite":
+        cur.executemany(queries.REEVALUATION_APPLY, evaluations)
+    else:
+        execute_values(cur, queries.REEVALUATION_APPLY, evaluations, page_size=len(evaluations))
+
+
+def reevaluate_chunk(first_id: int, last_id: int, now: datetime, dry_run: bool = False) -> Dict[str, int]:
+    """Переоценивает активных учеников с id от first_id до last_id включительно."""
+    stats = {"learners": 0, "updated": 0, "level_up": 0, "level_down": 0}
+    conn = database.get_db_connection()
+    try:
+        with conn:
+            with database.tuple_cursor(conn) as cur:
+                cur.execute(queries.REEVALUATION_LEARNERS, (first_id, last_id))
+                learners = fetch_all(cur, ReevaluationLearnerRow)
+                cur.execute(queries.REEVALUATION_RECENT_SESSIONS, (
+                    SESSION_EVENTS_WINDOW, first_id, last_id, first_id, last_id,
+                    REEVALUATION_SESSIONS, REEVALUATION_SESSIONS
+                ))
+                sessions_by_learner: Dict[int, List[RecentSessionRow]] = {}
+                for row in fetch_all(cur, RecentSessionRow):
+                    sessions_by_learner.setdefault(row.user_language_id, []).append(row)
+
+                changed = []
+                for learner in learners:
+                    evaluation = replay_learner(learner, sessions_by_learner.get(learner.id, []), now)
+                    _, level, level_up_streak, level_down_streak, increase_patch = evaluation
+                    if level != learner.level:
+                        stats["level_up" if change_level(learner.level, 1) == level else "level_down"] += 1
+                    if (level, level_up_streak, level_down_streak, increase_patch) != (
+                        learner.level, learner.level_up_streak, learner.level_down_streak, learner.increase_patch
+                    ):
+                        changed.append(evaluation)
+                stats["learners"] = len(learners)
+                stats["updated"] = len(changed)
+
+                # В пробном прогоне транзакция только снимает блокировки
+                if changed and not dry_run:
+                    _apply(cur, changed)
+    finally:
+        database.close_db_connection(conn)
+    return stats
+
+
+def _chunks(learner_ids: List[int], chunk_size: int) -> List[Tuple[int, int]]:
+    return [
+        (learner_ids[i], learner_ids[min(i + chunk_size, len(learner_ids)) - 1])
+        for i in range(0, len(learner_ids), chunk_size)
+    ]
+
+
+def reevaluate_all(chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = DEFAULT_WORKERS,
+                   dry_run: bool = False) -> Dict[str, float]:
+    """Переоценивает всех активных учеников пачками по chunk_size в workers потоках."""
+    if database.DB_BACKEND == "sqlite":
+        workers = 1
+    started = time.perf_counter()
+    now = datetime.now()
+
+    conn = database.get_db_connection()
+    try:
+        with database.tuple_cursor(conn) as cur:
+            cur.execute(queries.REEVALUATION_LEARNER_IDS)
+            learner_ids = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+    finally:
+        database.close_db_connection(conn)
+
+    totals = {"learners": 0, "updated": 0, "level_up": 0, "level_down": 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(reevaluate_chunk, first_id, last_id, now, dry_run)
+            for first_id, last_id in _chunks(learner_ids, chunk_size)
+        ]
+        for future in futures:
+            for key, value in future.result().items():
+                totals[key] += value
+
+    elapsed = time.perf_counter() - started
+    result = dict(totals, seconds=elapsed, learners_per_second=totals["learners"] / elapsed if elapsed else 0.0)
+    logger.info("Level re-evaluation%s: %s", " (dry run)" if dry_run else "", result)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пакетная переоценка уровней учеников")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="Посчитать изменения, не записывая их")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if database.DB_BACKEND == "postgres":
+        database.init_pool(args.workers)
+    try:
+        result = reevaluate_all(args.chunk_size, args.workers, args.dry_run)
+    finally:
+        database.close_pool()
+    print(f"{result['learners']} learners, {result['updated']} updated "
+          f"(level up {result['level_up']}, level down {result['level_down']})"
+          f"{' - dry run, nothing written' if args.dry_run else ''}")
+    print(f"{result['seconds']:.2f} s, {result['learners_per_second']:.0f} learners/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,17 @@
 import random
 import logging
 from typing import List, Dict, Any, Optional
-from psycopg2.extras import RealDictCursor
 from db.database import (
     get_db_connection, close_db_connection, get_word_translation, 
     get_wrong_translation
 )
+from db import queries
 from models.config import CONFIG, LEVEL_TO_DIFFICULTY
+from core.tracing import start_span, traced
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@traced("onboarding.select_onboarding_words", timing="onboarding")
 def select_onboarding_words(user_id: int, target_language_id: int, user_language_id: int, 
                             translation_language_id: int = 2) -> List[Dict[str, Any]]:
     """
@@ -24,9 +24,7 @@ def select_onboarding_words(user_id: int, target_language_id: int, user_language
         try:
             with conn:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT COUNT(*) FROM user_progress WHERE user_language_id = %s
-                    """, (user_language_id,))
+                    cur.execute(queries.ONBOARDING_PROGRESS_COUNT, (user_language_id,))
                     result = cur.fetchone()
                     answers_count = result['count'] if result else 0
                     
@@ -39,7 +37,7 @@ def select_onboarding_words(user_id: int, target_language_id: int, user_language
                         # Пользователь уже не новичок
                         return None
                     
-                    logger.info(f"Onboarding session {session_num} for user {user_id}")
+                    logger.info("Onboarding session %s for user %s", session_num, user_id)
                     
                     # Первая сессия: 5 частотных A1 + 5 новых A2
                     if session_num == 1:
@@ -56,34 +54,21 @@ def select_onboarding_words(user_id: int, target_language_id: int, user_language
             if conn:
                 close_db_connection(conn)
     except Exception as e:
-        logger.error(f"Error in select_onboarding_words: {e}")
+        logger.error("Error in select_onboarding_words: %s", e)
         return None
 
+@traced("onboarding.first_session_words")
 def _first_session_words(conn, user_language_id: int, target_language_id: int, 
                          translation_language_id: int) -> List[Dict[str, Any]]:
     """Подбирает слова для первой сессии."""
     try:
         with conn.cursor() as cur:
             # Выбираем 5 частотных A1
-            cur.execute("""
-                SELECT w.id, w.text 
-                FROM words w
-                WHERE w.difficulty = 1  -- A1
-                AND w.language_id = %s
-                ORDER BY frequency_rank ASC NULLS LAST, RANDOM()
-                LIMIT 5
-            """, (target_language_id,))
+            cur.execute(queries.ONBOARDING_A1_FREQUENT, (target_language_id,))
             a1_words = cur.fetchall()
             
             # Выбираем 5 новых A2
-            cur.execute("""
-                SELECT w.id, w.text 
-                FROM words w
-                WHERE w.difficulty = 2  -- A2
-                AND w.language_id = %s
-                ORDER BY RANDOM()
-                LIMIT 5
-            """, (target_language_id,))
+            cur.execute(queries.ONBOARDING_A2_RANDOM, (target_language_id,))
             a2_words = cur.fetchall()
             
             # Объединяем результаты
@@ -93,58 +78,52 @@ def _first_session_words(conn, user_language_id: int, target_language_id: int,
             # Проверяем, что у нас ровно 10 слов, иначе дополняем случайными словами
             if len(words) < CONFIG["SESSION_SIZE"]:
                 missing_count = CONFIG["SESSION_SIZE"] - len(words)
-                logger.warning(f"Not enough words for first session, need {missing_count} more")
+                logger.warning("Not enough words for first session, need %s more", missing_count)
                 
                 # Получаем ID уже выбранных слов
                 selected_ids = [w['id'] for w in words]
                 
                 # Выбираем дополнительные слова
-                cur.execute("""
-                    SELECT w.id, w.text 
-                    FROM words w
-                    WHERE w.id NOT IN (SELECT unnest(%s::int[]))
-                    AND w.language_id = %s
-                    ORDER BY RANDOM()
-                    LIMIT %s
-                """, (selected_ids, target_language_id, missing_count))
+                cur.execute(queries.WORDS_ANY_EXCLUDING, (selected_ids, target_language_id, missing_count))
                 additional_words = cur.fetchall()
                 words.extend(additional_words)
                 
             # Если слов получилось больше 10, обрезаем
             if len(words) > CONFIG["SESSION_SIZE"]:
-                logger.warning(f"Too many words for first session: {len(words)}, trimming to {CONFIG['SESSION_SIZE']}")
+                logger.warning("Too many words for first session: %s, trimming to %s", len(words), CONFIG['SESSION_SIZE'])
                 words = words[:CONFIG["SESSION_SIZE"]]
             
             # Добавляем переводы и варианты ответов
             words_with_options = []
-            for word in words:
-                correct_translation = get_word_translation(word['id'], translation_language_id)
-                if not correct_translation:
-                    logger.warning(f"No translation found for word {word['id']}, skipping")
-                    continue
+            with start_span("onboarding.translations", timing="translations", words=len(words)):
+                for word in words:
+                    correct_translation = get_word_translation(word['id'], translation_language_id)
+                    if not correct_translation:
+                        logger.warning("No translation found for word %s, skipping", word['id'])
+                        continue
                 
-                # Определяем сложность для неправильных вариантов
-                difficulty = 1 if word['id'] in [w['id'] for w in a1_words] else 2
+                    # Определяем сложность для неправильных вариантов
+                    difficulty = 1 if word['id'] in [w['id'] for w in a1_words] else 2
                 
-                # Получаем неправильные варианты
-                wrong_translations = get_wrong_translation(
-                    word['id'], difficulty, translation_language_id, 3
-                )
+                    # Получаем неправильные варианты
+                    wrong_translations = get_wrong_translation(
+                        word['id'], difficulty, translation_language_id, 3
+                    )
                 
-                # Собираем все варианты
-                options = [correct_translation] + wrong_translations
-                random.shuffle(options)
+                    # Собираем все варианты
+                    options = [correct_translation] + wrong_translations
+                    random.shuffle(options)
                 
-                words_with_options.append({
-                    'wordId': word['id'],
-                    'text': word['text'],
-                    'correctTranslation': correct_translation,
-                    'options': options
-                })
+                    words_with_options.append({
+                        'wordId': word['id'],
+                        'text': word['text'],
+                        'correctTranslation': correct_translation,
+                        'options': options
+                    })
             
             # Финальная проверка на количество слов
             if len(words_with_options) != CONFIG["SESSION_SIZE"]:
-                logger.warning(f"Final word count for first session is {len(words_with_options)}, expected {CONFIG['SESSION_SIZE']}")
+                logger.warning("Final word count for first session is %s, expected %s", len(words_with_options), CONFIG['SESSION_SIZE'])
                 # Если не хватает слов с переводами, дублируем существующие
                 while len(words_with_options) < CONFIG["SESSION_SIZE"] and len(words_with_options) > 0:
                     clone = words_with_options[0].copy()
@@ -154,27 +133,21 @@ def _first_session_words(conn, user_language_id: int, target_language_id: int,
                 if len(words_with_options) > CONFIG["SESSION_SIZE"]:
                     words_with_options = words_with_options[:CONFIG["SESSION_SIZE"]]
             
-            logger.info(f"First session word count: {len(words_with_options)}")
+            logger.info("First session word count: %s", len(words_with_options))
             return words_with_options
     
     except Exception as e:
-        logger.error(f"Error in _first_session_words: {e}")
+        logger.error("Error in _first_session_words: %s", e)
         return []
 
+@traced("onboarding.second_session_words")
 def _second_session_words(conn, user_language_id: int, target_language_id: int, 
                           translation_language_id: int) -> List[Dict[str, Any]]:
     """Подбирает слова для второй сессии."""
     try:
         with conn.cursor() as cur:
             # Получаем слова из первой сессии
-            cur.execute("""
-                SELECT DISTINCT w.id, w.text
-                FROM words w
-                JOIN user_progress up ON w.id = up.word_id
-                WHERE up.user_language_id = %s
-                ORDER BY up.last_seen DESC
-                LIMIT 10
-            """, (user_language_id,))
+            cur.execute(queries.ONBOARDING_PREVIOUS_WORDS, (user_language_id,))
             previous_words = cur.fetchall()
             
             # Выбираем 3-4 слова из первой сессии для повторения
@@ -183,15 +156,7 @@ def _second_session_words(conn, user_language_id: int, target_language_id: int,
             review_word_ids = [w['id'] for w in review_words]
             
             # Выбираем 3-4 новых A2
-            cur.execute("""
-                SELECT w.id, w.text 
-                FROM words w
-                WHERE w.difficulty = 2  -- A2
-                AND w.language_id = %s
-                AND w.id NOT IN (SELECT unnest(%s::int[]))
-                ORDER BY RANDOM()
-                LIMIT %s
-            """, (target_language_id, review_word_ids, 4))
+            cur.execute(queries.ONBOARDING_A2_NEW, (target_language_id, review_word_ids, 4))
             new_a2_words = cur.fetchall()
             
             # Объединяем результаты
@@ -200,15 +165,7 @@ def _second_session_words(conn, user_language_id: int, target_language_id: int,
             # Если не хватает до 10 слов, добавляем легкие A1
             if len(words) < CONFIG["SESSION_SIZE"]:
                 remaining = CONFIG["SESSION_SIZE"] - len(words)
-                cur.execute("""
-                    SELECT w.id, w.text 
-                    FROM words w
-                    WHERE w.difficulty = 1  -- A1
-                    AND w.language_id = %s
-                    AND w.id NOT IN (SELECT unnest(%s::int[]))
-                    ORDER BY frequency_rank ASC NULLS LAST, RANDOM()
-                    LIMIT %s
-                """, (
+                cur.execute(queries.ONBOARDING_A1_FREQUENT_EXCLUDING, (
                     target_language_id, 
                     [w['id'] for w in words], 
                     remaining
@@ -219,26 +176,19 @@ def _second_session_words(conn, user_language_id: int, target_language_id: int,
             # Если всё еще не хватает слов, добавляем случайные слова
             if len(words) < CONFIG["SESSION_SIZE"]:
                 missing_count = CONFIG["SESSION_SIZE"] - len(words)
-                logger.warning(f"Not enough words for second session, need {missing_count} more")
+                logger.warning("Not enough words for second session, need %s more", missing_count)
                 
                 # Получаем ID уже выбранных слов
                 selected_ids = [w['id'] for w in words]
                 
                 # Выбираем любые дополнительные слова
-                cur.execute("""
-                    SELECT w.id, w.text 
-                    FROM words w
-                    WHERE w.id NOT IN (SELECT unnest(%s::int[]))
-                    AND w.language_id = %s
-                    ORDER BY RANDOM()
-                    LIMIT %s
-                """, (selected_ids, target_language_id, missing_count))
+                cur.execute(queries.WORDS_ANY_EXCLUDING, (selected_ids, target_language_id, missing_count))
                 additional_words = cur.fetchall()
                 words.extend(additional_words)
             
             # Если слов больше 10, обрезаем
             if len(words) > CONFIG["SESSION_SIZE"]:
-                logger.warning(f"Too many words for second session: {len(words)}, trimming to {CONFIG['SESSION_SIZE']}")
+                logger.warning("Too many words for second session: %s, trimming to %s", len(words), CONFIG['SESSION_SIZE'])
                 words = words[:CONFIG["SESSION_SIZE"]]
             
             # Перемешиваем слова
@@ -246,38 +196,37 @@ def _second_session_words(conn, user_language_id: int, target_language_id: int,
             
             # Добавляем переводы и варианты ответов
             words_with_options = []
-            for word in words:
-                correct_translation = get_word_translation(word['id'], translation_language_id)
-                if not correct_translation:
-                    logger.warning(f"No translation found for word {word['id']}, skipping")
-                    continue
+            with start_span("onboarding.translations", timing="translations", words=len(words)):
+                for word in words:
+                    correct_translation = get_word_translation(word['id'], translation_language_id)
+                    if not correct_translation:
+                        logger.warning("No translation found for word %s, skipping", word['id'])
+                        continue
                 
-                # Определяем сложность для неправильных вариантов
-                cur.execute("""
-                    SELECT difficulty FROM words WHERE id = %s
-                """, (word['id'],))
-                result = cur.fetchone()
-                difficulty = result['difficulty'] if result else 1
+                    # Определяем сложность для неправильных вариантов
+                    cur.execute(queries.WORD_DIFFICULTY, (word['id'],))
+                    result = cur.fetchone()
+                    difficulty = result['difficulty'] if result else 1
                 
-                # Получаем неправильные варианты
-                wrong_translations = get_wrong_translation(
-                    word['id'], difficulty, translation_language_id, 3
-                )
+                    # Получаем неправильные варианты
+                    wrong_translations = get_wrong_translation(
+                        word['id'], difficulty, translation_language_id, 3
+                    )
                 
-                # Собираем все варианты
-                options = [correct_translation] + wrong_translations
-                random.shuffle(options)
+                    # Собираем все варианты
+                    options = [correct_translation] + wrong_translations
+                    random.shuffle(options)
                 
-                words_with_options.append({
-                    'wordId': word['id'],
-                    'text': word['text'],
-                    'correctTranslation': correct_translation,
-                    'options': options
-                })
+                    words_with_options.append({
+                        'wordId': word['id'],
+                        'text': word['text'],
+                        'correctTranslation': correct_translation,
+                        'options': options
+                    })
             
             # Финальная проверка на количество слов
             if len(words_with_options) != CONFIG["SESSION_SIZE"]:
-                logger.warning(f"Final word count for second session is {len(words_with_options)}, expected {CONFIG['SESSION_SIZE']}")
+                logger.warning("Final word count for second session is %s, expected %s", len(words_with_options), CONFIG['SESSION_SIZE'])
                 # Если не хватает слов с переводами, дублируем существующие
                 while len(words_with_options) < CONFIG["SESSION_SIZE"] and len(words_with_options) > 0:
                     clone = words_with_options[0].copy()
@@ -287,9 +236,9 @@ def _second_session_words(conn, user_language_id: int, target_language_id: int,
                 if len(words_with_options) > CONFIG["SESSION_SIZE"]:
                     words_with_options = words_with_options[:CONFIG["SESSION_SIZE"]]
             
-            logger.info(f"Second session word count: {len(words_with_options)}")
+            logger.info("Second session word count: %s", len(words_with_options))
             return words_with_options
     
     except Exception as e:
-        logger.error(f"Error in _second_session_words: {e}")
+        logger.error("Error in _second_session_words: %s", e)
         return [] 
\ No newline at end of file
@@ -1,528 +1,618 @@
 import random
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from psycopg2.extras import RealDictCursor
+from typing import List, Dict, Any, Optional, Tuple, TypeVar
 from db.database import (
-    get_db_connection, close_db_connection, get_word_translation,
-    get_wrong_translation, get_recent_success_rate
+    get_db_connection, close_db_connection, get_word_translations,
+    get_wrong_translation, get_recent_success_rate, tuple_cursor
 )
+from db import breaker, queries, schema, seen_words, vocabulary
+from db.rows import DueWordRow, SeenBeforeRow, WordRow, fetch_all
 from models.config import CONFIG, LEVEL_TO_DIFFICULTY, LEVEL_ORDER
+from models.schedule import is_weak
+from core.metrics import PICKER_FALLBACK_TIERS, record_picker_categories
+from core.tracing import start_span, traced
+from services import snapshot_picker
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def select_words(user_id: int, target_language_id: int, user_language_id: int, level: str, translation_language_id: int = 2) -> List[Dict[str, Any]]:
-    """Выбирает 10 слов для сессии, возвращает список с переводами."""
-    try:
-        logger.info(f"Selecting words for user {user_id}, level {level}")
-        
-        # Словарь для подсчета слов по категориям
-        categories_count = {
-            "Weak": 0,
-            "Review": 0,
-            "New-L": 0,
-            "Stretch+1": 0,
-            "Patch-1": 0,
-            "Fallback": 0
-        }
+# Сколько слов каждой категории берётся из очереди повторений
+WEAK_WORDS_LIMIT = 5
+REVIEW_WORDS_LIMIT = 4
+
+# Stretch+1 слов в выборке кандидатов
+STRETCH_WORDS_LIMIT = 2
+
+Row = TypeVar("Row", WordRow, DueWordRow)
+
+
+def _take(rows: List[Row], taken: set, limit: int, predicate=None) -> List[Row]:
+    """Первые limit строк, ещё не взятых и подходящих под условие; отмечает их взятыми."""
+    result = []
+    for row in rows:
+        if len(result) >= limit:
+            break
+        if row.id in taken or (predicate and not predicate(row)):
+            continue
+        taken.add(row.id)
+        result.append(row)
+    return result
+
+
+def split_due_words(rows: List[DueWordRow], now: datetime) -> Tuple[List[DueWordRow], List[DueWordRow]]:
+    """
+    Делит ближайшие по сроку повторения записи на Weak и Review.
+
+    Строки упорядочены по next_review_at, поэтому в каждую категорию первыми
+    попадают самые просроченные слова. Если слабых или повторяемых слов мало,
+    критерии смягчаются так же, как раньше запасными запросами, но по уже
+    полученной выборке: для Weak - более высокие пороги доли верных ответов,
+    для Review - слова, срок которых ещё не наступил.
+    """
+    due = [row for row in rows if row.next_review_at <= now]
+    taken = set()
+
+    def weak_below(threshold):
+        return lambda row: is_weak(row.repeats, row.successes, row.last_answer_wrong, threshold)
+
+    weak_words = _take(due, taken, WEAK_WORDS_LIMIT, weak_below(CONFIG["WEAK_SUCCESS_THRESHOLD"]))
+    if len(weak_words) < 3:
+        logger.warning(
+            "Only %s Weak words due with threshold %s%%, trying fallback threshold %s%%",
+            len(weak_words), CONFIG['WEAK_SUCCESS_THRESHOLD'], CONFIG['WEAK_SUCCESS_FALLBACK']
+        )
+        PICKER_FALLBACK_TIERS.labels("Weak", "fallback_threshold").inc()
+        weak_words.extend(_take(due, taken, WEAK_WORDS_LIMIT - len(weak_words),
+                                weak_below(CONFIG["WEAK_SUCCESS_FALLBACK"])))
+        if len(weak_words) < 2:
+            logger.warning(
+                "Still only %s Weak words due, trying last resort threshold %s%%",
+                len(weak_words), CONFIG['WEAK_SUCCESS_LAST_RESORT']
+            )
+            PICKER_FALLBACK_TIERS.labels("Weak", "last_resort_threshold").inc()
+            weak_words.extend(_take(due, taken, WEAK_WORDS_LIMIT - len(weak_words),
+                                    weak_below(CONFIG["WEAK_SUCCESS_LAST_RESORT"])))
+
+    review_words = _take(due, taken, REVIEW_WORDS_LIMIT)
+    if len(review_words) < 2:
+        logger.warning("Only %s Review words due, taking the nearest upcoming ones", len(review_words))
+        PICKER_FALLBACK_TIERS.labels("Review", "not_due").inc()
+        review_words.extend(_take(rows, taken, REVIEW_WORDS_LIMIT - len(review_words)))
+
+    return weak_words, review_words
+
+
+def _sample_unseen(cur, user_language_id: int, seen: Optional[bytearray], language_id: int, difficulty: int,
+                   exclude_ids: List[int], limit: int, seen_before: Optional[datetime] = None) -> List[WordRow]:
+    """
+    Случайные незнакомые слова языка language_id сложности difficulty (как picker.new),
+    а если задан seen_before - незнакомые или виденные раньше этого момента (как
+    picker.new_or_stale).
+
+    С картой виденных слов (db/seen_words.py) незнакомые берутся из каталога
+    словаря без запроса, давно виденные - запросом picker.seen_before только по
+    прогрессу ученика; слова выбираются равномерно из объединения, как ORDER BY
+    RANDOM() в запросе. Без карты (VOCABULARY_CACHE=0 или SEEN_WORDS_MAP=0) -
+    анти-join, как раньше. cur - курсор кортежей (database.tuple_cursor).
+    """
+    if seen is None:
+        if seen_before is None:
+            cur.execute(queries.PICKER_NEW, (user_language_id, language_id, difficulty, exclude_ids, limit))
+        else:
+            cur.execute(queries.PICKER_NEW_OR_STALE, (
+                user_language_id, language_id, difficulty, seen_before, exclude_ids, limit
+            ))
+        return fetch_all(cur, WordRow)
+
+    excluded = set(exclude_ids)
+    unseen = [
+        word_id for word_id in vocabulary.word_ids_at(language_id, difficulty)
+        if word_id not in excluded and not seen_words.contains(seen, word_id)
+    ]
+    stale, stale_total = [], 0
+    if seen_before is not None and limit > 0:
+        cur.execute(queries.PICKER_SEEN_BEFORE, (
+            user_language_id, language_id, difficulty, seen_before, exclude_ids, limit
+        ))
+        stale = fetch_all(cur, SeenBeforeRow)
+        stale_total = stale[0].total if stale else 0
+
+    # Сколько из limit мест достаётся давно виденным при равномерном выборе из объединения
+    slots = random.sample(range(len(unseen) + stale_total), min(limit, len(unseen) + stale_total))
+    from_stale = sum(1 for slot in slots if slot >= len(unseen))
+    words = [WordRow(word_id, vocabulary.word_text(word_id)) for word_id in random.sample(unseen, len(slots) - from_stale)]
+    words.extend(WordRow(row.id, vocabulary.word_text(row.id)) for row in stale[:from_stale])
+    random.shuffle(words)
+    return words
+
+
+def _collect_candidates(cur, user_language_id: int, target_language_id: int, current_difficulty: int,
+                        stretch_difficulty: Optional[int], patch_difficulty: Optional[int],
+                        max_new_words_limit: int, patch_limit: int,
+                        seen: Optional[bytearray] = None,
+                        exclude_ids: Optional[List[int]] = None) -> Tuple[List[WordRow], ...]:
+    """
+    Собирает кандидатов по категориям запросами к базе: Weak, Review, New-L, Stretch+1, Patch-1.
+    cur - курсор кортежей (database.tuple_cursor), строки - типы db/rows.py.
+    seen - карта виденных слов ученика, по ней незнакомые слова ищутся в памяти (см. _sample_unseen).
+    exclude_ids - слова, уже выданные в предыдущих сессиях пакета; в кандидаты они не попадают.
+    """
+    exclude_ids = list(exclude_ids or [])
+    excluded = set(exclude_ids)
+    weak_words = []
+    review_words = []
+    new_words = []
+    stretch_words = []
+    patch_words = []
+    now = datetime.now()
+
+    # Сбор Weak и Review слов - одна выборка ближайших по сроку повторения
+    # (окно шире на число исключённых слов, чтобы после исключения выбор был тем же)
+    with start_span("picker.due", timing="candidates") as stage_span:
+        cur.execute(queries.PICKER_DUE, (
+            user_language_id, target_language_id, current_difficulty, CONFIG["REVIEW_QUEUE_WINDOW"] + len(excluded)
+        ))
+        weak_words, review_words = split_due_words([row for row in fetch_all(cur, DueWordRow) if row.id not in excluded], now)
+        stage_span.set_attribute("weak", len(weak_words))
+        stage_span.set_attribute("review", len(review_words))
+
+    # Сбор New-L слов текущего уровня
+    with start_span("picker.new", timing="candidates") as stage_span:
+        new_words = _sample_unseen(
+            cur, user_language_id, seen, target_language_id, current_difficulty,
+            exclude_ids + [w.id for w in weak_words + review_words], max_new_words_limit
+        )
+        stage_span.set_attribute("found", len(new_words))
+
+    # Если не хватает New-L - ищем на сложности +1
+    if len(new_words) < 1 and stretch_difficulty:
+        logger.warning("Not enough New-L words, trying difficulty %s", stretch_difficulty)
+        PICKER_FALLBACK_TIERS.labels("New-L", "stretch_difficulty").inc()
+        with start_span("picker.new_stretch", timing="fallback") as stage_span:
+            new_words.extend(_sample_unseen(
+                cur, user_language_id, seen, target_language_id, stretch_difficulty,
+                exclude_ids + [w.id for w in weak_words + review_words + new_words], max_new_words_limit
+            ))
+            stage_span.set_attribute("found", len(new_words))
+
+    # Если совсем плохо с New - ищем на сложности -1
+    if len(new_words) < 1 and patch_difficulty:
+        logger.warning("Still not enough New-L words, trying difficulty %s", patch_difficulty)
+        PICKER_FALLBACK_TIERS.labels("New-L", "patch_difficulty").inc()
+        with start_span("picker.new_patch", timing="fallback") as stage_span:
+            new_words.extend(_sample_unseen(
+                cur, user_language_id, seen, target_language_id, patch_difficulty,
+                exclude_ids + [w.id for w in weak_words + review_words + new_words], max_new_words_limit
+            ))
+            stage_span.set_attribute("found", len(new_words))
+
+    # Сбор Stretch+1 слов (повышенная сложность): незнакомые или давно не виденные
+    if stretch_difficulty:
+        with start_span("picker.stretch", timing="candidates") as stage_span:
+            stretch_words = _sample_unseen(
+                cur, user_language_id, seen, target_language_id, stretch_difficulty,
+                exclude_ids + [w.id for w in weak_words + review_words + new_words], STRETCH_WORDS_LIMIT,
+                seen_before=now - timedelta(days=CONFIG["LAST_SEEN_DAYS_MEDIUM"])
+            )
+            stage_span.set_attribute("found", len(stretch_words))
+
+    # Сбор Patch-1 слов (пониженная сложность)
+    if patch_difficulty:
+        with start_span("picker.patch", timing="candidates") as stage_span:
+            patch_words = _sample_unseen(
+                cur, user_language_id, seen, target_language_id, patch_difficulty,
+                exclude_ids + [w.id for w in weak_words + review_words + new_words + stretch_words], patch_limit,
+                seen_before=now - timedelta(days=CONFIG["LAST_SEEN_DAYS_LONG"])
+            )
+            stage_span.set_attribute("found", len(patch_words))
+
+    return weak_words, review_words, new_words, stretch_words, patch_words
+
+
+def _collect_candidates_snapshot(snapshot, current_difficulty: int,
+                                 stretch_difficulty: Optional[int], patch_difficulty: Optional[int],
+                                 max_new_words_limit: int, patch_limit: int,
+                                 exclude_ids: Optional[List[int]] = None) -> Tuple[List[WordRow], ...]:
+    """То же, что _collect_candidates, по снимку прогресса в памяти (services/snapshot_picker.py)."""
+    exclude_ids = list(exclude_ids or [])
+    excluded = set(exclude_ids)
+    now = datetime.now()
+
+    due = snapshot.due_window(current_difficulty, CONFIG["REVIEW_QUEUE_WINDOW"] + len(excluded))
+    weak_words, review_words = split_due_words([row for row in due if row.id not in excluded], now)
+
+    new_words = snapshot.sample_words(
+        current_difficulty, exclude_ids + [w.id for w in weak_words + review_words], max_new_words_limit
+    )
+
+    # Если не хватает New-L - ищем на сложности +1
+    if len(new_words) < 1 and stretch_difficulty:
+        logger.warning("Not enough New-L words, trying difficulty %s", stretch_difficulty)
+        PICKER_FALLBACK_TIERS.labels("New-L", "stretch_difficulty").inc()
+        new_words.extend(snapshot.sample_words(
+            stretch_difficulty, exclude_ids + [w.id for w in weak_words + review_words + new_words], max_new_words_limit
+        ))
+
+    # Если совсем плохо с New - ищем на сложности -1
+    if len(new_words) < 1 and patch_difficulty:
+        logger.warning("Still not enough New-L words, trying difficulty %s", patch_difficulty)
+        PICKER_FALLBACK_TIERS.labels("New-L", "patch_difficulty").inc()
+        new_words.extend(snapshot.sample_words(
+            patch_difficulty, exclude_ids + [w.id for w in weak_words + review_words + new_words], max_new_words_limit
+        ))
+
+    # Stretch+1: незнакомые или давно не виденные слова повышенной сложности
+    stretch_words = []
+    if stretch_difficulty:
+        stretch_words = snapshot.sample_words(
+            stretch_difficulty, exclude_ids + [w.id for w in weak_words + review_words + new_words],
+            STRETCH_WORDS_LIMIT, seen_before=now - timedelta(days=CONFIG["LAST_SEEN_DAYS_MEDIUM"])
+        )
+
+    # Patch-1: то же на пониженной сложности
+    patch_words = []
+    if patch_difficulty:
+        patch_words = snapshot.sample_words(
+            patch_difficulty, exclude_ids + [w.id for w in weak_words + review_words + new_words + stretch_words],
+            patch_limit, seen_before=now - timedelta(days=CONFIG["LAST_SEEN_DAYS_LONG"])
+        )
+
+    return weak_words, review_words, new_words, stretch_words, patch_words
+
+
+def _new_words_limit(recent_success_rate: float) -> int:
+    """Более гибкая логика определения количества новых слов."""
+    if recent_success_rate < CONFIG["NEW_WORDS_THRESHOLD_LOW"]:
+        return CONFIG["NEW_WORDS_COUNT_LOW"]
+    if recent_success_rate < CONFIG["NEW_WORDS_THRESHOLD_MID"]:
+        return CONFIG["NEW_WORDS_COUNT_MID"]
+    if recent_success_rate < CONFIG["NEW_WORDS_THRESHOLD_HIGH"]:
+        return CONFIG["NEW_WORDS_COUNT_HIGH"]
+    return CONFIG["NEW_WORDS_COUNT_VERY_HIGH"]
+
+
+def _compose_session(cur, user_language_id: int, target_language_id: int, candidates: Tuple[List[WordRow], ...],
+                     max_new_words_limit: int, exclude_ids: List[int]) -> Tuple[List[WordRow], Dict[str, int]]:
+    """
+    Составляет сессию из кандидатов по квотам категорий, недостающие слова берёт
+    fallback-запросами (курсором кортежей cur) мимо exclude_ids. Возвращает слова
+    и их число по категориям.
+    """
+    weak_words, review_words, new_words, stretch_words, patch_words = candidates
+    words = []
+
+    # Словарь для подсчета слов по категориям
+    categories_count = {
+        "Weak": 0,
+        "Review": 0,
+        "New-L": 0,
+        "Stretch+1": 0,
+        "Patch-1": 0,
+        "Fallback": 0
+    }
+
+    # 2. Формируем финальный список слов
+    # Сколько Weak слов включаем
+    weak_to_include = min(CONFIG["WEAK_WORDS_TARGET"], len(weak_words))
+    categories_count["Weak"] = weak_to_include
+    
+    # Сколько Review слов нужно
+    review_to_include = min(CONFIG["REVIEW_WORDS_TARGET"], len(review_words))
+    categories_count["Review"] = review_to_include
+    
+    # Сколько новых слов включаем
+    new_to_include = min(max_new_words_limit, len(new_words))
+    categories_count["New-L"] = new_to_include
+    
+    # Сколько Stretch/Patch слов
+    words_count = weak_to_include + review_to_include + new_to_include
+    remaining_slots = CONFIG["SESSION_SIZE"] - words_count
+    
+    # Заполняем оставшиеся слоты из имеющихся категорий
+    if remaining_slots > 0:
+        logger.warning("Need %s more words to fill session", remaining_slots)
         
-        # Подготовка параметров
-        current_difficulty = LEVEL_TO_DIFFICULTY[level]
-        stretch_difficulty = current_difficulty + 1 if level != "C2" else None
-        patch_difficulty = current_difficulty - 1 if level != "A1" else None
+        # Если остались не использованные Weak слова - приоритет им
+        unused_weak = len(weak_words) - weak_to_include
+        if unused_weak > 0:
+            add_weak = min(remaining_slots, unused_weak)
+            weak_to_include += add_weak
+            remaining_slots -= add_weak
+            categories_count["Weak"] = weak_to_include
+            logger.info("Added %s more Weak words", add_weak)
+            
+        # Если остались не использованные Review слова
+        if remaining_slots > 0:
+            unused_review = len(review_words) - review_to_include
+            if unused_review > 0:
+                add_review = min(remaining_slots, unused_review)
+                review_to_include += add_review
+                remaining_slots -= add_review
+                categories_count["Review"] = review_to_include
+                logger.info("Added %s more Review words", add_review)
+                
+        # Если остались не использованные New слова
+        if remaining_slots > 0:
+            unused_new = len(new_words) - new_to_include
+            if unused_new > 0:
+                add_new = min(remaining_slots, unused_new)
+                new_to_include += add_new
+                remaining_slots -= add_new
+                categories_count["New-L"] = new_to_include
+                logger.info("Added %s more New-L words", add_new)
+                
+        # Используем stretch слова
+        if remaining_slots > 0 and stretch_words:
+            stretch_to_include = min(remaining_slots, len(stretch_words))
+            categories_count["Stretch+1"] = stretch_to_include
+            remaining_slots -= stretch_to_include
+            logger.info("Added %s Stretch+1 words", stretch_to_include)
+            
+        # Используем patch слова
+        if remaining_slots > 0 and patch_words:
+            patch_to_include = min(remaining_slots, len(patch_words))
+            categories_count["Patch-1"] = patch_to_include
+            remaining_slots -= patch_to_include
+            logger.info("Added %s Patch-1 words", patch_to_include)
+    
+    # Если всё ещё не хватает слов - fallback
+    if words_count + remaining_slots < CONFIG["SESSION_SIZE"]:
+        fallback_count = CONFIG["SESSION_SIZE"] - (words_count + remaining_slots)
+        logger.warning("Using %s fallback words", fallback_count)
+        PICKER_FALLBACK_TIERS.labels("Fallback", "any_word").inc()
+        categories_count["Fallback"] = fallback_count
         
-        # Получаем recent_success_rate для Adaptive и блокировки новых слов
-        recent_success_rate = get_recent_success_rate(user_language_id, num_answers=20)
+        # Собираем все выбранные ID слов
+        all_selected_ids = []
+        if weak_to_include > 0:
+            all_selected_ids.extend([w.id for w in weak_words[:weak_to_include]])
+        if review_to_include > 0:
+            all_selected_ids.extend([w.id for w in review_words[:review_to_include]])
+        if new_to_include > 0:
+            all_selected_ids.extend([w.id for w in new_words[:new_to_include]])
+        if categories_count["Stretch+1"] > 0:
+            all_selected_ids.extend([w.id for w in stretch_words[:categories_count["Stretch+1"]]])
+        if categories_count["Patch-1"] > 0:
+            all_selected_ids.extend([w.id for w in patch_words[:categories_count["Patch-1"]]])
         
-        # Более гибкая логика определения количества новых слов
-        if recent_success_rate < CONFIG["NEW_WORDS_THRESHOLD_LOW"]:
-            max_new_words_limit = CONFIG["NEW_WORDS_COUNT_LOW"]
-        elif recent_success_rate < CONFIG["NEW_WORDS_THRESHOLD_MID"]:
-            max_new_words_limit = CONFIG["NEW_WORDS_COUNT_MID"]
-        elif recent_success_rate < CONFIG["NEW_WORDS_THRESHOLD_HIGH"]:
-            max_new_words_limit = CONFIG["NEW_WORDS_COUNT_HIGH"]
-        else:
-            max_new_words_limit = CONFIG["NEW_WORDS_COUNT_VERY_HIGH"]
+        # Добавляем fallback слова
+        with start_span("picker.fallback", timing="fallback") as stage_span:
+            cur.execute(queries.PICKER_FALLBACK, (
+                user_language_id,
+                exclude_ids + all_selected_ids,
+                target_language_id,
+                fallback_count
+            ))
+            fallback_words = fetch_all(cur, WordRow)
+            stage_span.set_attribute("found", len(fallback_words))
         
-        logger.info(f"User recent_success_rate: {recent_success_rate}%, max_new_words_limit: {max_new_words_limit}")
-
-        conn = get_db_connection()
-        words = []
-        selected_word_ids = []
-
-        try:
-            with conn:
-                with conn.cursor() as cur:
-                    # Проверяем наличие колонки increase_patch
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.columns
-                            WHERE table_name = 'user_languages' AND column_name = 'increase_patch'
-                        )
-                    """)
-                    has_increase_patch = cur.fetchone()['exists']
-                    
-                    # Динамически настраиваем лимит patch-слов
-                    patch_limit = 0
-                    if patch_difficulty is not None:
-                        patch_limit = 1  # По умолчанию макс. 1 patch-слово
-                        
-                        # Если у нас есть колонка increase_patch, проверяем её значение
-                        if has_increase_patch:
-                            cur.execute("""
-                                SELECT increase_patch FROM user_languages
-                                WHERE id = %s
-                            """, (user_language_id,))
-                            result = cur.fetchone()
-                            if result and result['increase_patch']:
-                                patch_limit = 3  # Увеличиваем до 3 patch-слов при возвращении
-                    
-                    # Основная логика подбора слов
-                    
-                    # 1. Предварительно соберем слова по категориям
-                    weak_words = []
-                    review_words = []
-                    new_words = []
-                    stretch_words = []
-                    patch_words = []
-                    
-                    # Сбор Weak слов (с более гибким порогом)
-                    cur.execute("""
-                        SELECT w.id, w.text
-                        FROM words w
-                        JOIN user_progress up ON w.id = up.word_id
-                        WHERE up.user_language_id = %s
-                        AND w.difficulty = %s
-                        AND (up.success_rate < %s OR up.last_answer_wrong = TRUE)
-                        ORDER BY up.success_rate ASC, RANDOM()
-                        LIMIT 5
-                    """, (user_language_id, current_difficulty, CONFIG["WEAK_SUCCESS_THRESHOLD"]))
-                    weak_words = cur.fetchall()
-                    
-                    # Если не нашли достаточно слабых слов - используем fallback порог
-                    if len(weak_words) < 3:
-                        logger.warning(
-                            f"Only {len(weak_words)} Weak words found with threshold {CONFIG['WEAK_SUCCESS_THRESHOLD']}%, " +
-                            f"trying fallback threshold {CONFIG['WEAK_SUCCESS_FALLBACK']}%"
-                        )
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            JOIN user_progress up ON w.id = up.word_id
-                            WHERE up.user_language_id = %s
-                            AND w.difficulty = %s
-                            AND up.success_rate < %s
-                            AND w.id NOT IN (SELECT unnest(%s::int[]))
-                            ORDER BY up.success_rate ASC, RANDOM()
-                            LIMIT %s
-                        """, (
-                            user_language_id, 
-                            current_difficulty, 
-                            CONFIG["WEAK_SUCCESS_FALLBACK"],
-                            [w['id'] for w in weak_words] if weak_words else [], 
-                            5 - len(weak_words)
-                        ))
-                        weak_words.extend(cur.fetchall())
-                        
-                        # Если всё ещё не хватает - используем последний запасной порог
-                        if len(weak_words) < 2:
-                            logger.warning(
-                                f"Still only {len(weak_words)} Weak words found, " + 
-                                f"trying last resort threshold {CONFIG['WEAK_SUCCESS_LAST_RESORT']}%"
-                            )
-                            cur.execute("""
-                                SELECT w.id, w.text
-                                FROM words w
-                                JOIN user_progress up ON w.id = up.word_id
-                                WHERE up.user_language_id = %s
-                                AND w.difficulty = %s
-                                AND up.success_rate < %s
-                                AND w.id NOT IN (SELECT unnest(%s::int[]))
-                                ORDER BY up.success_rate ASC, RANDOM()
-                                LIMIT %s
-                            """, (
-                                user_language_id, 
-                                current_difficulty, 
-                                CONFIG["WEAK_SUCCESS_LAST_RESORT"],
-                                [w['id'] for w in weak_words] if weak_words else [], 
-                                5 - len(weak_words)
-                            ))
-                            weak_words.extend(cur.fetchall())
-                    
-                    # Сбор Review слов - базируемся на давности просмотра
-                    cur.execute("""
-                        SELECT w.id, w.text
-                        FROM words w
-                        JOIN user_progress up ON w.id = up.word_id
-                        WHERE up.user_language_id = %s
-                        AND w.difficulty = %s
-                        AND up.success_rate >= %s
-                        AND up.last_seen < %s
-                        AND w.id NOT IN (SELECT unnest(%s::int[]))
-                        ORDER BY up.last_seen ASC, RANDOM()
-                        LIMIT 4
-                    """, (
-                        user_language_id, 
-                        current_difficulty, 
-                        CONFIG["REVIEW_SUCCESS_THRESHOLD"],
-                        datetime.now() - timedelta(days=CONFIG["LAST_SEEN_DAYS_SHORT"]),
-                        [w['id'] for w in weak_words] if weak_words else []
-                    ))
-                    review_words = cur.fetchall()
-                    
-                    # Если мало Review слов - смягчаем критерии
-                    if len(review_words) < 2:
-                        logger.warning(
-                            f"Only {len(review_words)} Review words found with threshold {CONFIG['REVIEW_SUCCESS_THRESHOLD']}%, " +
-                            f"trying fallback threshold {CONFIG['REVIEW_SUCCESS_FALLBACK']}%"
-                        )
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            JOIN user_progress up ON w.id = up.word_id
-                            WHERE up.user_language_id = %s
-                            AND w.difficulty = %s
-                            AND up.success_rate BETWEEN %s AND %s
-                            AND up.last_seen < %s
-                            AND w.id NOT IN (SELECT unnest(%s::int[]))
-                            ORDER BY up.last_seen ASC, RANDOM()
-                            LIMIT %s
-                        """, (
-                            user_language_id, 
-                            current_difficulty, 
-                            CONFIG["REVIEW_SUCCESS_FALLBACK"], 
-                            CONFIG["REVIEW_SUCCESS_THRESHOLD"] - 1,
-                            datetime.now() - timedelta(days=CONFIG["LAST_SEEN_DAYS_MEDIUM"]),
-                            [w['id'] for w in weak_words + review_words] if (weak_words or review_words) else [],
-                            4 - len(review_words)
-                        ))
-                        review_words.extend(cur.fetchall())
-                        
-                        # Если все еще не хватает - ищем просто по давности просмотра
-                        if len(review_words) < 2:
-                            logger.warning("Still not enough Review words, using time-based fallback")
-                            cur.execute("""
-                                SELECT w.id, w.text
-                                FROM words w
-                                JOIN user_progress up ON w.id = up.word_id
-                                WHERE up.user_language_id = %s
-                                AND w.difficulty = %s
-                                AND up.last_seen < %s
-                                AND w.id NOT IN (SELECT unnest(%s::int[]))
-                                ORDER BY up.last_seen ASC, RANDOM()
-                                LIMIT %s
-                            """, (
-                                user_language_id, 
-                                current_difficulty,
-                                datetime.now() - timedelta(days=CONFIG["LAST_SEEN_DAYS_LONG"]),
-                                [w['id'] for w in weak_words + review_words] if (weak_words or review_words) else [],
-                                4 - len(review_words)
-                            ))
-                            review_words.extend(cur.fetchall())
-                    
-                    # Сбор New-L слов текущего уровня
-                    cur.execute("""
-                        SELECT w.id, w.text
-                        FROM words w
-                        LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
-                        WHERE w.difficulty = %s
-                        AND up.id IS NULL
-                        AND w.id NOT IN (SELECT unnest(%s::int[]))
-                        ORDER BY RANDOM()
-                        LIMIT %s
-                    """, (
-                        user_language_id,
-                        current_difficulty,
-                        [w['id'] for w in weak_words + review_words] if (weak_words or review_words) else [],
-                        max_new_words_limit
-                    ))
-                    new_words = cur.fetchall()
-                    
-                    # Если не хватает New-L - ищем на сложности +1
-                    if len(new_words) < 1 and stretch_difficulty:
-                        logger.warning(f"Not enough New-L words, trying difficulty {stretch_difficulty}")
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
-                            WHERE w.difficulty = %s
-                            AND up.id IS NULL
-                            AND w.id NOT IN (SELECT unnest(%s::int[]))
-                            ORDER BY RANDOM()
-                            LIMIT %s
-                        """, (
-                            user_language_id,
-                            stretch_difficulty,
-                            [w['id'] for w in weak_words + review_words + new_words] if (weak_words or review_words or new_words) else [],
-                            max_new_words_limit
-                        ))
-                        new_words.extend(cur.fetchall())
-                    
-                    # Если совсем плохо с New - ищем на сложности -1
-                    if len(new_words) < 1 and patch_difficulty:
-                        logger.warning(f"Still not enough New-L words, trying difficulty {patch_difficulty}")
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
-                            WHERE w.difficulty = %s
-                            AND up.id IS NULL
-                            AND w.id NOT IN (SELECT unnest(%s::int[]))
-                            ORDER BY RANDOM()
-                            LIMIT %s
-                        """, (
-                            user_language_id,
-                            patch_difficulty,
-                            [w['id'] for w in weak_words + review_words + new_words] if (weak_words or review_words or new_words) else [],
-                            max_new_words_limit
-                        ))
-                        new_words.extend(cur.fetchall())
-                    
-                    # Сбор Stretch+1 слов (повышенная сложность)
-                    if stretch_difficulty:
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
-                            WHERE w.difficulty = %s
-                            AND (up.id IS NULL OR up.last_seen < %s)
-                            AND w.id NOT IN (SELECT unnest(%s::int[]))
-                            ORDER BY RANDOM()
-                            LIMIT 2
-                        """, (
-                            user_language_id,
-                            stretch_difficulty,
-                            datetime.now() - timedelta(days=CONFIG["LAST_SEEN_DAYS_MEDIUM"]),
-                            [w['id'] for w in weak_words + review_words + new_words] if (weak_words or review_words or new_words) else []
-                        ))
-                        stretch_words = cur.fetchall()
-                    
-                    # Сбор Patch-1 слов (пониженная сложность)
-                    if patch_difficulty:
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
-                            WHERE w.difficulty = %s
-                            AND (up.id IS NULL OR up.last_seen < %s)
-                            AND w.id NOT IN (SELECT unnest(%s::int[]))
-                            ORDER BY RANDOM()
-                            LIMIT %s
-                        """, (
-                            user_language_id,
-                            patch_difficulty,
-                            datetime.now() - timedelta(days=CONFIG["LAST_SEEN_DAYS_LONG"]),
-                            [w['id'] for w in weak_words + review_words + new_words + stretch_words] 
-                                if (weak_words or review_words or new_words or stretch_words) else [],
-                            patch_limit
-                        ))
-                        patch_words = cur.fetchall()
-                    
-                    # 2. Формируем финальный список слов
-                    # Сколько Weak слов включаем
-                    weak_to_include = min(CONFIG["WEAK_WORDS_TARGET"], len(weak_words))
-                    categories_count["Weak"] = weak_to_include
-                    
-                    # Сколько Review слов нужно
-                    review_to_include = min(CONFIG["REVIEW_WORDS_TARGET"], len(review_words))
-                    categories_count["Review"] = review_to_include
-                    
-                    # Сколько новых слов включаем
-                    new_to_include = min(max_new_words_limit, len(new_words))
-                    categories_count["New-L"] = new_to_include
-                    
-                    # Сколько Stretch/Patch слов
-                    words_count = weak_to_include + review_to_include + new_to_include
-                    remaining_slots = CONFIG["SESSION_SIZE"] - words_count
-                    
-                    # Заполняем оставшиеся слоты из имеющихся категорий
-                    if remaining_slots > 0:
-                        logger.warning(f"Need {remaining_slots} more words to fill session")
-                        
-                        # Если остались не использованные Weak слова - приоритет им
-                        unused_weak = len(weak_words) - weak_to_include
-                        if unused_weak > 0:
-                            add_weak = min(remaining_slots, unused_weak)
-                            weak_to_include += add_weak
-                            remaining_slots -= add_weak
-                            categories_count["Weak"] = weak_to_include
-                            logger.info(f"Added {add_weak} more Weak words")
-                            
-                        # Если остались не использованные Review слова
-                        if remaining_slots > 0:
-                            unused_review = len(review_words) - review_to_include
-                            if unused_review > 0:
-                                add_review = min(remaining_slots, unused_review)
-                                review_to_include += add_review
-                                remaining_slots -= add_review
-                                categories_count["Review"] = review_to_include
-                                logger.info(f"Added {add_review} more Review words")
-                                
-                        # Если остались не использованные New слова
-                        if remaining_slots > 0:
-                            unused_new = len(new_words) - new_to_include
-                            if unused_new > 0:
-                                add_new = min(remaining_slots, unused_new)
-                                new_to_include += add_new
-                                remaining_slots -= add_new
-                                categories_count["New-L"] = new_to_include
-                                logger.info(f"Added {add_new} more New-L words")
-                                
-                        # Используем stretch слова
-                        if remaining_slots > 0 and stretch_words:
-                            stretch_to_include = min(remaining_slots, len(stretch_words))
-                            categories_count["Stretch+1"] = stretch_to_include
-                            remaining_slots -= stretch_to_include
-                            logger.info(f"Added {stretch_to_include} Stretch+1 words")
-                            
-                        # Используем patch слова
-                        if remaining_slots > 0 and patch_words:
-                            patch_to_include = min(remaining_slots, len(patch_words))
-                            categories_count["Patch-1"] = patch_to_include
-                            remaining_slots -= patch_to_include
-                            logger.info(f"Added {patch_to_include} Patch-1 words")
-                    
-                    # Если всё ещё не хватает слов - fallback
-                    if words_count + remaining_slots < CONFIG["SESSION_SIZE"]:
-                        fallback_count = CONFIG["SESSION_SIZE"] - (words_count + remaining_slots)
-                        logger.warning(f"Using {fallback_count} fallback words")
-                        categories_count["Fallback"] = fallback_count
-                        
-                        # Собираем все выбранные ID слов
-                        all_selected_ids = []
-                        if weak_to_include > 0:
-                            all_selected_ids.extend([w['id'] for w in weak_words[:weak_to_include]])
-                        if review_to_include > 0:
-                            all_selected_ids.extend([w['id'] for w in review_words[:review_to_include]])
-                        if new_to_include > 0:
-                            all_selected_ids.extend([w['id'] for w in new_words[:new_to_include]])
-                        if categories_count["Stretch+1"] > 0:
-                            all_selected_ids.extend([w['id'] for w in stretch_words[:categories_count["Stretch+1"]]])
-                        if categories_count["Patch-1"] > 0:
-                            all_selected_ids.extend([w['id'] for w in patch_words[:categories_count["Patch-1"]]])
-                        
-                        # Добавляем fallback слова
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            LEFT JOIN user_progress up ON w.id = up.word_id AND up.user_language_id = %s
-                            WHERE w.id NOT IN (SELECT unnest(%s::int[]))
-                            AND w.language_id = %s
-                            ORDER BY RANDOM()
-                            LIMIT %s
-                        """, (
-                            user_language_id,
-                            all_selected_ids if all_selected_ids else [],
-                            target_language_id,
-                            fallback_count
-                        ))
-                        fallback_words = cur.fetchall()
-                        
-                        # Формируем итоговый список слов
-                        words.extend(weak_words[:weak_to_include])
-                        words.extend(review_words[:review_to_include])
-                        words.extend(new_words[:new_to_include])
-                        
-                        if categories_count["Stretch+1"] > 0:
-                            words.extend(stretch_words[:categories_count["Stretch+1"]])
-                        if categories_count["Patch-1"] > 0:
-                            words.extend(patch_words[:categories_count["Patch-1"]])
-                            
-                        words.extend(fallback_words)
-                    else:
-                        # Формируем итоговый список слов без fallback
-                        words.extend(weak_words[:weak_to_include])
-                        words.extend(review_words[:review_to_include])
-                        words.extend(new_words[:new_to_include])
-                        
-                        if categories_count["Stretch+1"] > 0:
-                            words.extend(stretch_words[:categories_count["Stretch+1"]])
-                        if categories_count["Patch-1"] > 0:
-                            words.extend(patch_words[:categories_count["Patch-1"]])
-                    
-                    # В любом случае должно получиться ровно 10 слов или пополнить fallback
-                    if len(words) < CONFIG["SESSION_SIZE"]:
-                        missing_count = CONFIG["SESSION_SIZE"] - len(words)
-                        logger.warning(f"Still missing {missing_count} words after all selection, using emergency fallback")
-                        
-                        # Получаем все ID выбранных слов
-                        selected_ids = [w['id'] for w in words]
-                        
-                        # Берем любые слова, которых еще нет в списке
-                        cur.execute("""
-                            SELECT w.id, w.text
-                            FROM words w
-                            WHERE w.id NOT IN (SELECT unnest(%s::int[]))
-                            AND w.language_id = %s
-                            ORDER BY RANDOM()
-                            LIMIT %s
-                        """, (
-                            selected_ids if selected_ids else [],
-                            target_language_id,
-                            missing_count
-                        ))
-                        words.extend(cur.fetchall())
-                    
-                    # Если вдруг получилось больше 10 слов, обрезаем
-                    if len(words) > CONFIG["SESSION_SIZE"]:
-                        logger.warning(f"Too many words selected: {len(words)}, trimming to {CONFIG['SESSION_SIZE']}")
-                        words = words[:CONFIG["SESSION_SIZE"]]
-                    
-                    # Перемешиваем слова перед выдачей
-                    random.shuffle(words)
-        finally:
-            close_db_connection(conn)
+        # Формируем итоговый список слов
+        words.extend(weak_words[:weak_to_include])
+        words.extend(review_words[:review_to_include])
+        words.extend(new_words[:new_to_include])
         
-        # Добавляем к каждому слову необходимые переводы
-        result_words = []
-        for word in words:
-            word_id = word['id']
-            
-            # Получаем правильный перевод
-            correct_translation = get_word_translation(word_id, translation_language_id)
-            
-            # Получаем неправильные варианты
-            wrong_translations = get_wrong_translation(
-                word_id, 
-                current_difficulty, 
-                translation_language_id, 
-                count=3
-            )
-            
-            # Собираем все варианты для ответа и перемешиваем
-            options = [correct_translation] + wrong_translations
-            random.shuffle(options)
+        if categories_count["Stretch+1"] > 0:
+            words.extend(stretch_words[:categories_count["Stretch+1"]])
+        if categories_count["Patch-1"] > 0:
+            words.extend(patch_words[:categories_count["Patch-1"]])
             
-            # Формируем итоговый объект слова
-            word_result = {
-                "wordId": word_id,
-                "text": word['text'],
-                "correctTranslation": correct_translation,
-                "options": options
-            }
-            
-            result_words.append(word_result)
-        
-        # Проверяем, что у нас действительно 10 слов
-        if len(result_words) != CONFIG["SESSION_SIZE"]:
-            logger.error(f"Final word count is {len(result_words)}, expected {CONFIG['SESSION_SIZE']}")
-            # Если не хватает слов с переводами, дополним дублями (лучше так, чем меньше 10)
-            while len(result_words) < CONFIG["SESSION_SIZE"] and len(result_words) > 0:
-                # Клонируем первое слово
-                clone = result_words[0].copy()
-                result_words.append(clone)
-            # Если все еще больше 10, обрежем
-            if len(result_words) > CONFIG["SESSION_SIZE"]:
-                result_words = result_words[:CONFIG["SESSION_SIZE"]]
+        words.extend(fallback_words)
+    else:
+        # Формируем итоговый список слов без fallback
+        words.extend(weak_words[:weak_to_include])
+        words.extend(review_words[:review_to_include])
+        words.extend(new_words[:new_to_include])
         
-        # Логирование количества слов по категориям
-        logger.info(f"Selected words by category: {categories_count}")
-        logger.info(f"Final word count: {len(result_words)}")
+        if categories_count["Stretch+1"] > 0:
+            words.extend(stretch_words[:categories_count["Stretch+1"]])
+        if categories_count["Patch-1"] > 0:
+            words.extend(patch_words[:categories_count["Patch-1"]])
+    
+    # В любом случае должно получиться ровно 10 слов или пополнить fallback
+    if len(words) < CONFIG["SESSION_SIZE"]:
+        missing_count = CONFIG["SESSION_SIZE"] - len(words)
+        logger.warning("Still missing %s words after all selection, using emergency fallback", missing_count)
+        PICKER_FALLBACK_TIERS.labels("Fallback", "emergency").inc()
         
-        return result_words
+        # Получаем все ID выбранных слов (и выданных в предыдущих сессиях пакета)
+        selected_ids = [w.id for w in words]
         
+        # Берем любые слова, которых еще нет в списке
+        with start_span("picker.emergency_fallback", timing="fallback") as stage_span:
+            cur.execute(queries.WORDS_ANY_EXCLUDING, (
+                exclude_ids + selected_ids,
+                target_language_id,
+                missing_count
+            ))
+            words.extend(fetch_all(cur, WordRow))
+            stage_span.set_attribute("found", len(words))
+    
+    # Если вдруг получилось больше 10 слов, обрезаем
+    if len(words) > CONFIG["SESSION_SIZE"]:
+        logger.warning("Too many words selected: %s, trimming to %s", len(words), CONFIG['SESSION_SIZE'])
+        words = words[:CONFIG["SESSION_SIZE"]]
+
+    # Перемешиваем слова перед выдачей
+    random.shuffle(words)
+    return words, categories_count
+
+
+def _with_options(words: List[WordRow], translations: Dict[int, str], difficulty: int,
+                  translation_language_id: int) -> List[Dict[str, Any]]:
+    """Добавляет к словам сессии правильный перевод и варианты ответа."""
+    result_words = []
+    for word in words:
+        word_id = word.id
+
+        # Правильный перевод - из общего для сессий словаря переводов
+        correct_translation = translations.get(word_id, "")
+
+        # Получаем неправильные варианты
+        wrong_translations = get_wrong_translation(
+            word_id,
+            difficulty,
+            translation_language_id,
+            count=3
+        )
+
+        # Собираем все варианты для ответа и перемешиваем
+        options = [correct_translation] + wrong_translations
+        random.shuffle(options)
+
+        # Формируем итоговый объект слова
+        result_words.append({
+            "wordId": word_id,
+            "text": word.text,
+            "correctTranslation": correct_translation,
+            "options": options
+        })
+
+    # Проверяем, что у нас действительно 10 слов
+    if len(result_words) != CONFIG["SESSION_SIZE"]:
+        logger.error("Final word count is %s, expected %s", len(result_words), CONFIG['SESSION_SIZE'])
+        # Если не хватает слов с переводами, дополним дублями (лучше так, чем меньше 10)
+        if len(result_words) < CONFIG["SESSION_SIZE"]:
+            PICKER_FALLBACK_TIERS.labels("Fallback", "duplicates").inc()
+        while len(result_words) < CONFIG["SESSION_SIZE"] and len(result_words) > 0:
+            # Клонируем первое слово
+            clone = result_words[0].copy()
+            result_words.append(clone)
+        # Если все еще больше 10, обрежем
+        if len(result_words) > CONFIG["SESSION_SIZE"]:
+            result_words = result_words[:CONFIG["SESSION_SIZE"]]
+    return result_words
+
+
+def _select_sessions(user_id: int, target_language_id: int, user_language_id: int, level: str,
+                     translation_language_id: int, count: int, exclude_ids: List[int],
+                     use_snapshot: bool) -> List[List[Dict[str, Any]]]:
+    """
+    Подбирает count сессий подряд. Прогресс (снимок или карта виденных слов),
+    лимиты и переводы загружаются один раз на все сессии; слова, выданные в
+    предыдущих сессиях и в exclude_ids, в следующие не попадают.
+    """
+    logger.info("Selecting %s session(s) for user %s, level %s", count, user_id, level)
+
+    # Подготовка параметров
+    current_difficulty = LEVEL_TO_DIFFICULTY[level]
+    stretch_difficulty = current_difficulty + 1 if level != "C2" else None
+    patch_difficulty = current_difficulty - 1 if level != "A1" else None
+
+    # Получаем recent_success_rate для Adaptive и блокировки новых слов
+    # (в режиме снимка - по самому снимку, без отдельного запроса)
+    recent_success_rate = max_new_words_limit = None
+    if not use_snapshot:
+        with start_span("picker.recent_success_rate", timing="recent-rate"):
+            recent_success_rate = get_recent_success_rate(user_language_id, num_answers=20)
+        max_new_words_limit = _new_words_limit(recent_success_rate)
+
+    conn = get_db_connection()
+    issued = list(exclude_ids)
+    sessions = []
+
+    try:
+        with conn:
+            with conn.cursor() as cur, tuple_cursor(conn) as rows_cur:
+                # Есть ли колонка increase_patch (проверяется раз на процесс, db/schema.py)
+                has_increase_patch = schema.has(cur, "increase_patch")
+
+                # Динамически настраиваем лимит patch-слов
+                patch_limit = 0
+                if patch_difficulty is not None:
+                    patch_limit = 1  # По умолчанию макс. 1 patch-слово
+
+                    # Если у нас есть колонка increase_patch, проверяем её значение
+                    if has_increase_patch:
+                        cur.execute(queries.USER_LANGUAGE_INCREASE_PATCH, (user_language_id,))
+                        result = cur.fetchone()
+                        if result and result['increase_patch']:
+                            patch_limit = 3  # Увеличиваем до 3 patch-слов при возвращении
+
+                # Основная логика подбора слов
+                snapshot = seen = None
+                if use_snapshot:
+                    # Весь прогресс одним запросом, категории - в памяти
+                    with start_span("picker.snapshot", timing="snapshot") as span:
+                        snapshot = snapshot_picker.load_snapshot(conn, user_language_id, target_language_id)
+                        span.set_attribute("rows", len(snapshot))
+                    recent_success_rate = snapshot.recent_success_rate()
+                    max_new_words_limit = _new_words_limit(recent_success_rate)
+                elif vocabulary.ENABLED and seen_words.ENABLED:
+                    # Незнакомые слова - по каталогу словаря и карте виденных слов ученика
+                    with start_span("picker.seen_words", timing="seen-words") as span:
+                        vocabulary.ensure_words(conn)
+                        seen = seen_words.load(cur, user_language_id)
+                        span.set_attribute("bytes", len(seen))
+                logger.info("User recent_success_rate: %s%%, max_new_words_limit: %s", recent_success_rate, max_new_words_limit)
+
+                for _ in range(count):
+                    # 1. Предварительно соберем слова по категориям
+                    if snapshot is not None:
+                        with start_span("picker.snapshot_candidates", timing="candidates"):
+                            candidates = _collect_candidates_snapshot(
+                                snapshot, current_difficulty, stretch_difficulty, patch_difficulty,
+                                max_new_words_limit, patch_limit, issued
+                            )
+                    else:
+                        candidates = _collect_candidates(
+                            rows_cur, user_language_id, target_language_id, current_difficulty, stretch_difficulty, patch_difficulty,
+                            max_new_words_limit, patch_limit, seen, issued
+                        )
+                    words, categories_count = _compose_session(
+                        rows_cur, user_language_id, target_language_id, candidates, max_new_words_limit, issued
+                    )
+                    issued.extend(w.id for w in words)
+                    sessions.append((words, categories_count))
+    finally:
+        close_db_connection(conn)
+
+    # Добавляем к каждому слову необходимые переводы: правильные - одним запросом на все сессии
+    result = []
+    with start_span("picker.translations", timing="translations", words=len(issued) - len(exclude_ids)):
+        translations = get_word_translations(issued[len(exclude_ids):], translation_language_id)
+        for words, categories_count in sessions:
+            result.append(_with_options(words, translations, current_difficulty, translation_language_id))
+
+            # Логирование количества слов по категориям
+            logger.info("Selected words by category: %s", categories_count)
+            record_picker_categories(categories_count)
+    logger.info("Final word count: %s", sum(len(words) for words in result))
+    return result
+
+
+@traced("picker.select_words")
+def select_words(user_id: int, target_language_id: int, user_language_id: int, level: str, translation_language_id: int = 2) -> List[Dict[str, Any]]:
+    """
+    Выбирает 10 слов для сессии, возвращает список с переводами. Ошибка доступности
+    базы пробрасывается: сессию соберёт деградированный подбор (services/degraded_picker.py).
+    """
+    try:
+        return _select_sessions(
+            user_id, target_language_id, user_language_id, level, translation_language_id,
+            1, [], snapshot_picker.ENABLED
+        )[0]
+    except Exception as e:
+        if breaker.is_outage(e):
+            raise
+        logger.error("Error selecting words: %s", str(e))
+        return []
+
+
+@traced("picker.select_session_batch")
+def select_session_batch(user_id: int, target_language_id: int, user_language_id: int, level: str,
+                         count: int, translation_language_id: int = 2,
+                         exclude_ids: Optional[List[int]] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Выбирает count сессий подряд для офлайн-клиента: без повторов слов между
+    сессиями и мимо exclude_ids. Весь пакет подбирается по одному снимку
+    прогресса (PICKER_ENGINE=snapshot) или запросами с картой виденных слов
+    в одной транзакции.
+    """
+    try:
+        return _select_sessions(
+            user_id, target_language_id, user_language_id, level, translation_language_id,
+            count, list(exclude_ids or []), snapshot_picker.ENABLED
+        )
     except Exception as e:
-        logger.error(f"Error selecting words: {str(e)}")
-        return [] 
\ No newline at end of file
+        logger.error("Error selecting session batch: %s", str(e))
+        return []
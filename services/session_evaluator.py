@@ -1,274 +1,208 @@
 import logging
-from datetime import datetime, timedelta
-from db.database import get_db_connection, close_db_connection
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from db.database import get_db_connection, close_db_connection, tuple_cursor
+from db import queries, routing
+from db.rows import EvaluatorInputRow, LearnerLevelRow, RecentSessionRow, ReevaluationLearnerRow, fetch_all
 from models.config import CONFIG, LEVEL_ORDER
+from core.tracing import traced
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Сколько сессий подряд выше (ниже) порога нужно для смены уровня
+LEVEL_CHANGE_STREAK = 3
+
+# Из скольких последних сессий считается WSR (LIMIT 3 в evaluator.inputs)
+WSR_SESSIONS = 3
+
+# Сколько последних сессий нужно переоценке: LEVEL_CHANGE_STREAK сессий и WSR каждой из них
+REEVALUATION_SESSIONS = LEVEL_CHANGE_STREAK + WSR_SESSIONS - 1
+
+# Из скольких последних ответов журнала (db/answer_events.py) собираются итоги
+# последних сессий: втрое больше, чем ответов в трёх сессиях по SESSION_SIZE слов
+SESSION_EVENTS_WINDOW = 10 * CONFIG["SESSION_SIZE"]
+
+# Результат оценки - в порядке параметров reevaluation.apply
+# (id, level, level_up_streak, level_down_streak, increase_patch)
+Evaluation = Tuple[int, str, int, int, bool]
+
+
+# Правила оценки без обращений к базе: ими пользуются и SessionEvaluator на каждой
+# сессии, и пакетная переоценка (services/level_reevaluation.py), поэтому WSR и
+# пороги у них одни и те же.
+
+def weighted_success_rate(sessions: Sequence[RecentSessionRow], weights: List[int]) -> float:
+    """WSR (%) по последним сессиям, от новой к старой; 50.0, если оценивать нечего."""
+    total_weight = 0
+    weighted_sum = 0
+
+    for i, session in enumerate(sessions):
+        weight = weights[i] if i < len(weights) else 1
+        if session.repeats > 0:
+            success_rate = (session.successes / session.repeats) * 100
+            weighted_sum += success_rate * weight
+            total_weight += weight
+
+    if total_weight == 0:
+        return 50.0  # Значение по умолчанию
+    return weighted_sum / total_weight
+
+
+def next_streaks(wsr: float, level_up_streak: Optional[int], level_down_streak: Optional[int],
+                 level_up_threshold: float, level_down_threshold: float) -> Tuple[int, int, int]:
+    """
+    Счётчики порогов после сессии с успеваемостью wsr и изменение уровня:
+    1 - повышение, -1 - понижение, 0 - без изменений. Сработавший счётчик сбрасывается.
+    """
+    level_up_streak = level_up_streak or 0
+    level_down_streak = level_down_streak or 0
+
+    if wsr >= level_up_threshold:
+        level_up_streak += 1
+        level_down_streak = 0
+    elif wsr < level_down_threshold:
+        level_down_streak += 1
+        level_up_streak = 0
+    else:
+        level_up_streak = 0
+        level_down_streak = 0
+
+    if level_up_streak >= LEVEL_CHANGE_STREAK:
+        return 0, level_down_streak, 1
+    if level_down_streak >= LEVEL_CHANGE_STREAK:
+        return level_up_streak, 0, -1
+    return level_up_streak, level_down_streak, 0
+
+
+def change_level(current_level: str, change: int) -> str:
+    """Возвращает новый уровень после повышения/понижения."""
+    try:
+        current_index = LEVEL_ORDER.index(current_level)
+    except ValueError as e:
+        logger.error("Error changing level: %s", e)
+        return current_level
+
+    # Ограничиваем индекс допустимыми значениями
+    new_index = min(max(current_index + change, 0), len(LEVEL_ORDER) - 1)
+    return LEVEL_ORDER[new_index]
+
+
+def needs_increased_patch(last_seen: Optional[datetime], now: datetime, long_break_days: int) -> bool:
+    """Был ли у ученика длинный перерыв: тогда в подборе больше patch-слов."""
+    return bool(last_seen) and (now - last_seen).days >= long_break_days
+
+
+def evaluate_learner(learner: LearnerLevelRow, sessions: Sequence[RecentSessionRow], now: datetime) -> Evaluation:
+    """Оценка следующей сессии ученика по его последним сессиям (новые первыми)."""
+    wsr = weighted_success_rate(sessions, CONFIG["WSR_WEIGHTS"])
+    level_up_streak, level_down_streak, level_change = next_streaks(
+        wsr, learner.level_up_streak, learner.level_down_streak,
+        CONFIG["LEVEL_UP_THRESHOLD"], CONFIG["LEVEL_DOWN_THRESHOLD"]
+    )
+    level = change_level(learner.level, level_change) if level_change else learner.level
+    last_seen = sessions[0].last_seen if sessions else None
+    increase_patch = needs_increased_patch(last_seen, now, CONFIG["LONG_BREAK_DAYS"])
+    return learner.id, level, level_up_streak, level_down_streak, increase_patch
+
+
+def replay_learner(learner: ReevaluationLearnerRow, sessions: Sequence[RecentSessionRow],
+                   now: datetime) -> Evaluation:
+    """
+    Переоценка без новой сессии (services/level_reevaluation.py) по последним
+    REEVALUATION_SESSIONS сессиям (новые первыми): счётчики порогов заново считаются
+    по последним LEVEL_CHANGE_STREAK сессиям после смены уровня, WSR каждой - по ней и
+    предыдущим, как при её оценке. Сохранённые счётчики не используются, поэтому
+    результат зависит только от истории и порогов, и повторный запуск ничего не меняет.
+    """
+    evaluated = 0
+    for session in sessions[:LEVEL_CHANGE_STREAK]:
+        if learner.level_changed_at is not None and session.last_seen <= learner.level_changed_at:
+            break
+        evaluated += 1
+
+    level_up_streak = level_down_streak = level_change = 0
+    for i in reversed(range(evaluated)):
+        wsr = weighted_success_rate(sessions[i:i + WSR_SESSIONS], CONFIG["WSR_WEIGHTS"])
+        level_up_streak, level_down_streak, level_change = next_streaks(
+            wsr, level_up_streak, level_down_streak,
+            CONFIG["LEVEL_UP_THRESHOLD"], CONFIG["LEVEL_DOWN_THRESHOLD"]
+        )
+    level = change_level(learner.level, level_change) if level_change else learner.level
+    last_seen = sessions[0].last_seen if sessions else None
+    increase_patch = needs_increased_patch(last_seen, now, CONFIG["LONG_BREAK_DAYS"])
+    return learner.id, level, level_up_streak, level_down_streak, increase_patch
+
+
 class SessionEvaluator:
-    """Оценивает сессию и рассчитывает WSR для повышения/понижения уровня."""
-    
-    def __init__(self):
-        self.level_up_threshold = CONFIG["LEVEL_UP_THRESHOLD"]
-        self.level_down_threshold = CONFIG["LEVEL_DOWN_THRESHOLD"]
-        self.wsr_weights = CONFIG["WSR_WEIGHTS"]
-        self.long_break_days = CONFIG["LONG_BREAK_DAYS"]
-    
-    def evaluate_session(self, user_id: int, user_language_id: int, current_level: str) -> bool:
+    """
+    Оценивает сессию: WSR по последним сессиям, счётчики порогов, смена уровня и
+    increase_patch. Оценка - одна транзакция из двух запросов: evaluator.inputs
+    блокирует строку ученика и читает всё нужное, evaluator.apply пишет результат.
+    Параллельные завершения сессий одного ученика поэтому оцениваются по очереди,
+    и каждое видит результат предыдущего.
+    """
+
+    def evaluate_session(self, user_id: int, user_language_id: int) -> Tuple[bool, Optional[str]]:
         """
-        Оценивает сессию, рассчитывает средневзвешенную успеваемость (WSR) 
+        Оценивает сессию, рассчитывает средневзвешенную успеваемость (WSR)
         и при необходимости изменяет уровень пользователя.
-        Возвращает True если необходимо увеличить количество patch-слов.
+        Возвращает (increase_patch, уровень после оценки): increase_patch - True,
+        если необходимо увеличить количество patch-слов; при ошибке уровень - None.
         """
         try:
-            logger.info(f"Evaluating session for user {user_id}, user_language_id {user_language_id}, level {current_level}")
-            
-            increase_patch = False
-            
-            # Получаем последние сессии пользователя
-            conn = get_db_connection()
-            
-            # Проверяем наличие длинного перерыва
-            with conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT NOW() - MAX(last_seen) as inactive_period
-                        FROM user_progress
-                        WHERE user_language_id = %s
-                        """, (user_language_id,))
-                    result = cur.fetchone()
-                    
-                    if result and result['inactive_period']:
-                        inactive_days = result['inactive_period'].days
-                        if inactive_days >= self.long_break_days:
-                            logger.info(f"User inactive for {inactive_days} days, suggesting increased patch words")
-                            increase_patch = True
-            
-            # Рассчитываем WSR
-            wsr = self._calculate_wsr(user_language_id, conn)
-            logger.info(f"Calculated WSR: {wsr:.2f}%")
-            
-            # Обновляем счетчики достижения порогов повышения/понижения
-            level_change = self._update_threshold_counters(user_language_id, wsr, conn)
-            
-            # Если нужно изменить уровень
-            if level_change != 0:
-                new_level = self._change_level(current_level, level_change)
-                
-                if new_level != current_level:
-                    self._update_user_level(user_language_id, new_level, conn)
-                    logger.info(f"Level changed from {current_level} to {new_level}")
-            
-            # Проверим наличие колонки increase_patch перед обновлением
-            with conn:
-                with conn.cursor() as cur:
-                    # Проверяем существование колонки increase_patch
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.columns
-                            WHERE table_name = 'user_languages' AND column_name = 'increase_patch'
-                        )
-                    """)
-                    column_exists = cur.fetchone()['exists']
-                    
-                    if column_exists:
-                        # Колонка существует, обновляем её
-                        cur.execute("""
-                            UPDATE user_languages 
-                            SET increase_patch = %s 
-                            WHERE id = %s
-                        """, (increase_patch, user_language_id))
-            
-            return increase_patch
-            
+            return self.evaluate(user_id, user_language_id)
         except Exception as e:
-            logger.error(f"Error evaluating session: {e}")
-            return False
-        finally:
-            if conn:
-                close_db_connection(conn)
-    
-    def _calculate_wsr(self, user_language_id: int, conn) -> float:
+            logger.error("Error evaluating session: %s", e)
+            return False, None
+
+    def evaluate(self, user_id: int, user_language_id: int) -> Tuple[bool, Optional[str]]:
         """
-        Рассчитывает средневзвешенную успеваемость (WSR) на основе 
-        последних сессий пользователя.
+        То же, что evaluate_session, но ошибка соединения или записи пробрасывается:
+        очередь оценок (services/evaluation_queue.py) по ней повторяет оценку.
         """
+        conn = get_db_connection()
         try:
-            with conn.cursor() as cur:
-                # Получаем результаты последних сессий в точности как в оригинале
-                cur.execute("""
-                    SELECT 
-                        session_id, 
-                        SUM(successes) as successes, 
-                        SUM(repeats) as repeats
-                    FROM user_progress
-                    WHERE user_language_id = %s
-                    GROUP BY session_id
-                    ORDER BY MAX(last_seen) DESC 
-                    LIMIT 3
-                """, (user_language_id,))
-                sessions = cur.fetchall()
-                
-                if not sessions:
-                    return 50.0  # Значение по умолчанию
-                
-                # Рассчитываем WSR с учетом весов
-                total_weight = 0
-                weighted_sum = 0
-                
-                for i, session in enumerate(sessions):
-                    if i < len(self.wsr_weights):
-                        weight = self.wsr_weights[i]
-                    else:
-                        weight = 1
-                    
-                    repeats = session['repeats']
-                    successes = session['successes']
-                    
-                    if repeats > 0:
-                        success_rate = (successes / repeats) * 100
-                        weighted_sum += success_rate * weight
-                        total_weight += weight
-                
-                if total_weight == 0:
-                    return 50.0  # Значение по умолчанию
-                
-                return weighted_sum / total_weight
-                
-        except Exception as e:
-            logger.error(f"Error calculating WSR: {e}")
-            return 50.0  # Значение по умолчанию
-    
-    def _update_threshold_counters(self, user_language_id: int, wsr: float, conn) -> int:
+            with conn:
+                result = self.apply(conn, user_id, user_language_id)
+        finally:
+            close_db_connection(conn)
+
+        # Следующий подбор должен увидеть новый уровень и increase_patch - читаем с основной базы
+        routing.note_write(user_language_id)
+        return result
+
+    @traced("evaluator.evaluate_session", timing="evaluate")
+    def apply(self, conn, user_id: int, user_language_id: int,
+              finished_at: Optional[datetime] = None) -> Tuple[bool, Optional[str]]:
         """
-        Обновляет счетчики достижения порогов повышения/понижения уровня.
-        Возвращает: 1 для повышения, -1 для понижения, 0 без изменений.
+        Оценка в транзакции вызывающего: очередь оценок удаляет свою строку в той же
+        транзакции. Строка ученика заблокирована до её конца. finished_at - когда
+        завершена оцениваемая сессия (по умолчанию - сейчас): более поздние ответы в
+        оценку не входят. Возвращает (increase_patch, уровень после оценки); уровень -
+        None, если ученика нет.
         """
-        try:
-            with conn.cursor() as cur:
-                # Проверяем существование колонок
-                cur.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'user_languages' AND column_name = 'level_up_streak'
-                    ) as has_level_up_streak,
-                    EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'user_languages' AND column_name = 'level_down_streak'
-                    ) as has_level_down_streak
-                """)
-                result = cur.fetchone()
-                
-                if not result or not result['has_level_up_streak'] or not result['has_level_down_streak']:
-                    # Колонки не существуют - добавляем их
-                    cur.execute("""
-                        ALTER TABLE user_languages 
-                        ADD COLUMN IF NOT EXISTS level_up_streak INTEGER DEFAULT 0,
-                        ADD COLUMN IF NOT EXISTS level_down_streak INTEGER DEFAULT 0
-                    """)
-                
-                # Получаем текущие счетчики
-                cur.execute("""
-                    SELECT level_up_streak, level_down_streak
-                    FROM user_languages
-                    WHERE id = %s
-                """, (user_language_id,))
-                result = cur.fetchone()
-                
-                if not result:
-                    return 0
-                
-                level_up_streak = result['level_up_streak'] if result['level_up_streak'] is not None else 0
-                level_down_streak = result['level_down_streak'] if result['level_down_streak'] is not None else 0
-                
-                # Обновляем счетчики на основе WSR
-                if wsr >= self.level_up_threshold:
-                    level_up_streak += 1
-                    level_down_streak = 0
-                elif wsr < self.level_down_threshold:
-                    level_down_streak += 1
-                    level_up_streak = 0
-                else:
-                    level_up_streak = 0
-                    level_down_streak = 0
-                
-                # Обновляем счетчики в БД
-                cur.execute("""
-                    UPDATE user_languages
-                    SET level_up_streak = %s, level_down_streak = %s
-                    WHERE id = %s
-                """, (level_up_streak, level_down_streak, user_language_id))
-                
-                # Проверяем достижение порогов
-                if level_up_streak >= 3:
-                    # Сбрасываем счетчик
-                    cur.execute("""
-                        UPDATE user_languages
-                        SET level_up_streak = 0
-                        WHERE id = %s
-                    """, (user_language_id,))
-                    return 1
-                
-                if level_down_streak >= 3:
-                    # Сбрасываем счетчик
-                    cur.execute("""
-                        UPDATE user_languages
-                        SET level_down_streak = 0
-                        WHERE id = %s
-                    """, (user_language_id,))
-                    return -1
-                
-                return 0
-                
-        except Exception as e:
-            logger.error(f"Error updating threshold counters: {e}")
-            return 0
-    
-    def _change_level(self, current_level: str, change: int) -> str:
-        """Возвращает новый уровень после повышения/понижения."""
-        try:
-            current_index = LEVEL_ORDER.index(current_level)
-            new_index = current_index + change
-            
-            # Ограничиваем индекс допустимыми значениями
-            if new_index < 0:
-                new_index = 0
-            elif new_index >= len(LEVEL_ORDER):
-                new_index = len(LEVEL_ORDER) - 1
-            
-            return LEVEL_ORDER[new_index]
-            
-        except (ValueError, IndexError) as e:
-            logger.error(f"Error changing level: {e}")
-            return current_level
-    
-    def _update_user_level(self, user_language_id: int, new_level: str, conn) -> None:
-        """Обновляет уровень пользователя в БД."""
-        try:
-            with conn.cursor() as cur:
-                # Проверяем существование колонки level_changed_at
-                cur.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'user_languages' AND column_name = 'level_changed_at'
-                    )
-                """)
-                column_exists = cur.fetchone()['exists']
-                
-                if column_exists:
-                    cur.execute("""
-                        UPDATE user_languages
-                        SET level = %s, level_changed_at = NOW()
-                        WHERE id = %s
-                    """, (new_level, user_language_id))
-                else:
-                    cur.execute("""
-                        UPDATE user_languages
-                        SET level = %s
-                        WHERE id = %s
-                    """, (new_level, user_language_id))
-                
-        except Exception as e:
-            logger.error(f"Error updating user level: {e}") 
\ No newline at end of file
+        finished_at = finished_at or datetime.now()
+        with tuple_cursor(conn) as cur:
+            cur.execute(queries.EVALUATOR_INPUTS, (user_language_id, finished_at, SESSION_EVENTS_WINDOW, finished_at))
+            rows = fetch_all(cur, EvaluatorInputRow)
+            if not rows:
+                logger.warning("No user_language %s to evaluate", user_language_id)
+                return False, None
+
+            learner = LearnerLevelRow._make(rows[0][:len(LearnerLevelRow._fields)])
+            sessions = [
+                RecentSessionRow(row.id, row.session_id, row.successes, row.repeats, row.last_seen)
+                for row in rows if row.repeats is not None
+            ]
+            _, level, level_up_streak, level_down_streak, increase_patch = evaluate_learner(
+                learner, sessions, finished_at
+            )
+            cur.execute(queries.EVALUATOR_APPLY, (
+                level, level_up_streak, level_down_streak, increase_patch, level, user_language_id
+            ))
+
+        logger.info("Evaluated session for user %s, user_language_id %s: level %s -> %s, streaks %s/%s",
+                    user_id, user_language_id, learner.level, level, level_up_streak, level_down_streak)
+        if increase_patch:
+            logger.info("User inactive since %s, suggesting increased patch words", sessions[0].last_seen)
+        return increase_patch, level
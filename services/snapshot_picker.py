@@ -0,0 +1,249 @@
+"""
+Снимок прогресса пользователя в памяти для подборщика (PICKER_ENGINE=snapshot).
+
+Вместо серии запросов по категориям весь прогресс пользователя загружается
+одним запросом по индексу (user_language_id, word_id) и раскладывается в
+массивы NumPy. Столбцы приходят одной строкой (числа через запятую), поэтому
+на запись прогресса не создаётся ни одного объекта Python. Сложность и тексты
+слов берутся из каталога кеша словаря (db/vocabulary.py), который загружается
+один раз на процесс, - так снимку не нужно соединение с words. С файлом словаря
+(VOCABULARY_FILE) столбцы каталога - массивы NumPy прямо поверх отображённого
+файла, без копии в воркере.
+
+Очередь повторений, незнакомые и давно не виденные слова выбираются векторными
+операциями по всем записям сразу, а квоты категорий заполняет общий код
+services.picker - поэтому категории и квоты те же, что у подбора запросами.
+
+Без NumPy режим недоступен: подборщик работает запросами, как раньше.
+
+Последние PICKER_SNAPSHOT_CACHE снимков (по ученику) остаются в памяти процесса: по
+ним деградированный режим (services/degraded_picker.py) подбирает сессию с очередью
+повторений, пока база недоступна. Снимок весит около 30 байт на слово прогресса.
+"""
+import os
+import random
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него подбор идёт запросами
+    np = None
+
+from db import queries, vocabulary
+from db.rows import DueWordRow, WordRow
+from db.vocabulary_file import VocabularyFile
+
+logger = logging.getLogger(__name__)
+
+ENGINE = os.environ.get("PICKER_ENGINE", "sql")
+ENABLED = ENGINE == "snapshot" and np is not None
+if ENGINE == "snapshot" and np is None:
+    logger.warning("PICKER_ENGINE=snapshot requires numpy, falling back to SQL picker")
+
+# Время в снимке - мс от эпохи; наивные даты считаются в одной шкале с базой
+_EPOCH = datetime(1970, 1, 1)
+
+# Сколько последних снимков учеников держать в памяти для деградированного режима
+SNAPSHOT_CACHE_SIZE = int(os.environ.get("PICKER_SNAPSHOT_CACHE", "1000"))
+
+_catalog: Optional["Catalog"] = None
+_lock = threading.Lock()
+
+# user_language_id -> последний загруженный снимок; в конце - недавно загруженные
+_snapshots: "OrderedDict[int, ProgressSnapshot]" = OrderedDict()
+
+
+def _to_ms(value: datetime) -> int:
+    return int((value - _EPOCH).total_seconds() * 1000)
+
+
+def _from_ms(value: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=int(value))
+
+
+def _column(row: Dict[str, Any], name: str, dtype) -> "np.ndarray":
+    # Столбец приходит строкой чисел через запятую - разбор в C без объектов Python на запись
+    return np.fromstring(row[name] or "", dtype=dtype, sep=",")
+
+
+class Catalog:
+    """Все слова словаря: id по возрастанию, язык, сложность и тексты."""
+    __slots__ = ("ids", "language", "difficulty", "source", "_text_at", "_ids_by_level")
+
+    def __init__(self, ids: "np.ndarray", language: "np.ndarray", difficulty: "np.ndarray",
+                 text_at: Callable[[int], str], source: Optional[VocabularyFile] = None):
+        self.ids = ids
+        self.language = language
+        self.difficulty = difficulty
+        # source - файл словаря, из которого построен каталог (None - из запросов)
+        self.source = source
+        self._text_at = text_at
+        self._ids_by_level = {}
+
+    @classmethod
+    def from_levels(cls, words_by_level: Dict[Tuple[int, int], List[Tuple[int, str]]]) -> "Catalog":
+        """Каталог из vocabulary.load_words."""
+        rows = sorted(
+            (word_id, text, language_id, difficulty)
+            for (language_id, difficulty), words in words_by_level.items() if difficulty is not None
+            for word_id, text in words
+        )
+        texts = [row[1] for row in rows]
+        return cls(
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((row[2] for row in rows), dtype=np.int32, count=len(rows)),
+            np.fromiter((row[3] for row in rows), dtype=np.int16, count=len(rows)),
+            texts.__getitem__,
+        )
+
+    @classmethod
+    def from_file(cls, vocabulary_file: VocabularyFile) -> "Catalog":
+        """Каталог поверх отображённого файла словаря; слова без сложности в нём -1."""
+        return cls(
+            np.frombuffer(vocabulary_file.word_ids, dtype=np.int32),
+            np.frombuffer(vocabulary_file.word_language, dtype=np.int32),
+            np.frombuffer(vocabulary_file.word_difficulty, dtype=np.int32),
+            vocabulary_file.text_at,
+            vocabulary_file,
+        )
+
+    def ids_at(self, language_id: int, difficulty: int) -> "np.ndarray":
+        """id всех слов языка language_id сложности difficulty."""
+        key = (language_id, difficulty)
+        ids = self._ids_by_level.get(key)
+        if ids is None:
+            ids = self._ids_by_level[key] = self.ids[(self.language == language_id) & (self.difficulty == difficulty)]
+        return ids
+
+    def difficulty_of(self, word_ids: "np.ndarray", language_id: int) -> "np.ndarray":
+        """
+        Сложность слов; -1 для слов другого языка и тех, которых нет в каталоге
+        (добавлены после загрузки), - такие слова не попадают ни в один уровень.
+        """
+        if not len(self.ids):
+            return np.full(len(word_ids), -1, dtype=np.int16)
+        positions = np.minimum(np.searchsorted(self.ids, word_ids), len(self.ids) - 1)
+        known = (self.ids[positions] == word_ids) & (self.language[positions] == language_id)
+        return np.where(known, self.difficulty[positions], -1)
+
+    def texts_of(self, word_ids) -> List[str]:
+        return [self._text_at(int(i)) for i in np.searchsorted(self.ids, word_ids)]
+
+
+class ProgressSnapshot:
+    """Прогресс пользователя по всем словам в виде столбцов NumPy."""
+    __slots__ = ("catalog", "language_id", "word_ids", "difficulty", "repeats", "successes",
+                 "last_answer_wrong", "last_seen", "next_review_at", "recent_answers", "recent_success")
+
+    def __init__(self, row: Dict[str, Any], catalog: Catalog, language_id: int, recent_answers: int = 20):
+        self.catalog = catalog
+        self.language_id = language_id
+        # Доля верных последних recent_answers ответов по журналу; None - событий нет
+        self.recent_answers = recent_answers
+        self.recent_success = float(row["recent_success"]) if row["recent_success"] is not None else None
+        self.word_ids = _column(row, "word_ids", np.int64)
+        self.difficulty = catalog.difficulty_of(self.word_ids, language_id)
+        self.repeats = _column(row, "repeats", np.int32)
+        self.successes = _column(row, "successes", np.int32)
+        self.last_answer_wrong = _column(row, "last_answer_wrong", np.int8).astype(bool)
+        self.last_seen = _column(row, "last_seen", np.int64)
+        # -1 - срок повторения не назначен
+        self.next_review_at = _column(row, "next_review_at", np.int64)
+
+    def __len__(self) -> int:
+        return len(self.word_ids)
+
+    def recent_success_rate(self) -> float:
+        """Доля верных последних ответов (%), как progress.recent_success_rate."""
+        if self.recent_success is not None:
+            return self.recent_success
+        if not len(self):
+            return 50.0
+        recent = np.argsort(self.last_seen, kind="stable")[-self.recent_answers:]
+        return float((~self.last_answer_wrong[recent]).mean() * 100)
+
+    def due_window(self, difficulty: int, limit: int) -> List[DueWordRow]:
+        """Ближайшие по сроку повторения записи сложности difficulty - то же, что picker.due."""
+        candidates = np.flatnonzero((self.difficulty == difficulty) & (self.next_review_at >= 0))
+        order = candidates[np.argsort(self.next_review_at[candidates], kind="stable")[:limit]]
+        texts = self.catalog.texts_of(self.word_ids[order])
+        return [
+            DueWordRow(
+                int(self.word_ids[i]), text, int(self.repeats[i]), int(self.successes[i]),
+                bool(self.last_answer_wrong[i]), _from_ms(self.next_review_at[i])
+            )
+            for i, text in zip(order, texts)
+        ]
+
+    def sample_words(self, difficulty: int, exclude_ids: List[int], limit: int,
+                     seen_before: Optional[datetime] = None) -> List[WordRow]:
+        """
+        Случайные слова сложности difficulty, которых пользователь не видел, а
+        если задан seen_before - ещё и виденные раньше этого момента. То же, что
+        picker.new (без seen_before), picker.stretch и picker.patch.
+        """
+        if limit <= 0:
+            return []
+        excluded = np.asarray(exclude_ids, dtype=np.int64)
+        catalog_ids = self.catalog.ids_at(self.language_id, difficulty)
+
+        candidates = catalog_ids[~np.isin(catalog_ids, self.word_ids) & ~np.isin(catalog_ids, excluded)]
+        if seen_before is not None:
+            stale = self.word_ids[
+                (self.difficulty == difficulty)
+                & (self.last_seen < _to_ms(seen_before))
+                & ~np.isin(self.word_ids, excluded)
+            ]
+            candidates = np.concatenate([candidates, stale])
+
+        picked = candidates[random.sample(range(len(candidates)), min(limit, len(candidates)))]
+        return [WordRow(int(word_id), text) for word_id, text in zip(picked, self.catalog.texts_of(picked))]
+
+
+def load_catalog(conn) -> Catalog:
+    """Загружает (или берёт из памяти) каталог всех слов; после подмены файла словаря - заново."""
+    global _catalog
+    catalog = _catalog
+    vocabulary_file = vocabulary.mapped()
+    if catalog is None or catalog.source is not vocabulary_file:
+        if vocabulary_file is not None:
+            catalog = Catalog.from_file(vocabulary_file)
+        else:
+            catalog = Catalog.from_levels(vocabulary.load_words(conn))
+        with _lock:
+            _catalog = catalog
+        logger.info("Picker catalog loaded: %s words", len(catalog.ids))
+    return catalog
+
+
+def load_snapshot(conn, user_language_id: int, language_id: int, recent_answers: int = 20) -> ProgressSnapshot:
+    """Загружает прогресс пользователя по языку language_id одним запросом."""
+    catalog = load_catalog(conn)
+    with conn.cursor() as cur:
+        cur.execute(queries.PICKER_SNAPSHOT, (user_language_id, recent_answers, user_language_id))
+        snapshot = ProgressSnapshot(cur.fetchone(), catalog, language_id, recent_answers)
+    if SNAPSHOT_CACHE_SIZE > 0:
+        with _lock:
+            _snapshots[user_language_id] = snapshot
+            _snapshots.move_to_end(user_language_id)
+            while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+                _snapshots.popitem(last=False)
+    return snapshot
+
+
+def last_snapshot(user_language_id: int) -> Optional[ProgressSnapshot]:
+    """Последний загруженный в процессе снимок ученика или None."""
+    with _lock:
+        return _snapshots.get(user_language_id)
+
+
+def clear() -> None:
+    """Сбрасывает каталог слов и снимки, например после импорта словаря."""
+    global _catalog
+    with _lock:
+        _catalog = None
+        _snapshots.clear()
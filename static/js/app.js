@@ -1,3 +1,16 @@
+// Запрос с повтором, если сервер его отклонил (429 - частота, 503 - перегрузка):
+// отклонённый запрос не выполнен, повторяем не раньше Retry-After
+async function fetchWithRetry(url, options, attempts = 3) {
+    for (let attempt = 1; ; attempt++) {
+        const response = await fetch(url, options);
+        if ((response.status !== 429 && response.status !== 503) || attempt >= attempts) {
+            return response;
+        }
+        const retryAfter = Number(response.headers.get('Retry-After')) || 1;
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+    }
+}
+
 // Класс для управления сессией изучения слов
 class LearningSession {
     constructor() {
@@ -40,7 +53,7 @@ class LearningSession {
         const currentWord = this.words[this.currentWordIndex];
 
         try {
-            const response = await fetch('/api/words/submit-answer', {
+            const response = await fetchWithRetry('/api/words/submit-answer', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -87,7 +100,7 @@ class LearningSession {
     async loadNextBatch() {
         try {
             if (this.sessionId) {
-                await fetch('/api/words/finish-session', {
+                const response = await fetchWithRetry('/api/words/finish-session', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json'
@@ -96,6 +109,9 @@ class LearningSession {
                         sessionId: this.sessionId
                     })
                 });
+                if (!response.ok) {
+                    console.error('Не удалось завершить сессию:', response.status);
+                }
             }
 
             return await this.start();
@@ -0,0 +1,135 @@
+"""
+Очередь оценки сессий: оценка, выполненная с опозданием, считает только ответы до
+завершения своей сессии; settle() дожидается оценки, которую применяет другой
+обработчик; неудачная оценка ждёт повтора. Запускается на SQLite во временной базе:
+    python -m pytest -q tests
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import database
+from db.migrations import apply_migrations
+from services import evaluation_queue
+
+SESSION_SIZE = 10
+
+
+@pytest.fixture
+def learner(tmp_path):
+    backend, path = database.DB_BACKEND, database.SQLITE_PATH
+    database.configure_backend("sqlite", str(tmp_path / "queue.db"))
+    apply_migrations()
+    user_id = database.get_or_create_user("queue-test")
+    user_language_id, _ = database.get_or_create_user_language(user_id, 1)
+    yield user_id, user_language_id
+    database.configure_backend(backend, path)
+
+
+def _answer_session(user_language_id: int, session_id: str, first_word_id: int, correct: bool,
+                    started_at: datetime) -> datetime:
+    """Ответы одной сессии; возвращает время последнего ответа."""
+    answered_at = started_at
+    for i in range(SESSION_SIZE):
+        answered_at = started_at + timedelta(seconds=i)
+        database.update_user_progress(user_language_id, first_word_id + i, correct, session_id,
+                                      answered_at=answered_at)
+    return answered_at
+
+
+def _streaks(user_language_id: int):
+    conn = database.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT level_up_streak, level_down_streak FROM user_languages WHERE id = %s",
+                        (user_language_id,))
+            row = cur.fetchone()
+        conn.rollback()
+    finally:
+        database.close_db_connection(conn)
+    return row['level_up_streak'], row['level_down_streak']
+
+
+def test_late_evaluations_score_their_own_sessions(learner):
+    user_id, user_language_id = learner
+    started = datetime.now() - timedelta(hours=2)
+
+    # Обе сессии завершены до того, как очередь дошла до первой оценки
+    first_finished = _answer_session(user_language_id, "first", 1000, True, started)
+    evaluation_queue.enqueue(user_id, user_language_id, "first", finished_at=first_finished)
+    second_finished = _answer_session(user_language_id, "second", 2000, False, started + timedelta(hours=1))
+    evaluation_queue.enqueue(user_id, user_language_id, "second", finished_at=second_finished)
+
+    applied, busy = evaluation_queue.process(user_language_id)
+
+    assert (applied, busy) == (2, False)
+    # Первая оценка видит только первую сессию (WSR 100 - счётчик повышения 1),
+    # вторая - обе (WSR 40 - понижение 1). Если бы обе оценки видели обе сессии,
+    # счётчик понижения вырос бы дважды за одни и те же ответы.
+    assert _streaks(user_language_id) == (0, 1)
+
+
+def _pending(user_language_id: int):
+    conn = database.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT attempts, retry_at FROM session_evaluations WHERE user_language_id = %s",
+                        (user_language_id,))
+            rows = cur.fetchall()
+        conn.rollback()
+    finally:
+        database.close_db_connection(conn)
+    return rows
+
+
+def test_settle_waits_for_evaluation_in_progress(learner, monkeypatch):
+    user_id, user_language_id = learner
+    started = datetime.now() - timedelta(hours=2)
+    first_finished = _answer_session(user_language_id, "first", 1000, True, started)
+    evaluation_queue.enqueue(user_id, user_language_id, "first", finished_at=first_finished)
+    second_finished = _answer_session(user_language_id, "second", 2000, False, started + timedelta(hours=1))
+    evaluation_queue.enqueue(user_id, user_language_id, "second", finished_at=second_finished)
+
+    # Первую оценку применяет другой обработчик и не успевает закоммитить
+    apply = evaluation_queue.evaluator.apply
+    in_progress, release = threading.Event(), threading.Event()
+
+    def slow_apply(conn, *args):
+        result = apply(conn, *args)
+        if threading.current_thread() is not threading.main_thread() and not in_progress.is_set():
+            in_progress.set()
+            release.wait(5)
+        return result
+
+    monkeypatch.setattr(evaluation_queue.evaluator, "apply", slow_apply)
+    worker = threading.Thread(target=evaluation_queue._apply_next, args=(user_language_id,))
+    worker.start()
+    assert in_progress.wait(5)
+    threading.Timer(0.2, release.set).start()
+
+    assert evaluation_queue.settle(user_language_id)
+    worker.join(5)
+
+    # settle дождался первой оценки и применил вторую сам
+    assert _pending(user_language_id) == []
+    assert _streaks(user_language_id) == (0, 1)
+
+
+def test_failed_evaluation_waits_for_retry(learner, monkeypatch):
+    user_id, user_language_id = learner
+    finished = _answer_session(user_language_id, "first", 1000, True, datetime.now() - timedelta(hours=1))
+    evaluation_queue.enqueue(user_id, user_language_id, "first", finished_at=finished)
+
+    def failing_apply(conn, *args):
+        raise RuntimeError("evaluation failed")
+
+    monkeypatch.setattr(evaluation_queue.evaluator, "apply", failing_apply)
+
+    assert evaluation_queue.process(user_language_id) == (0, False)
+    [pending] = _pending(user_language_id)
+    assert pending['attempts'] == 1 and pending['retry_at'] is not None
+    # До времени повтора оценка не применяется и занятой не считается
+    monkeypatch.undo()
+    assert evaluation_queue.settle(user_language_id) is False
+    assert _streaks(user_language_id) == (0, 0)